@@ -0,0 +1,55 @@
+"""Measure the time it takes to make N client calls to a local server that
+takes 10ms to answer each call, sequentially with the synchronous client and
+concurrently with the async client.
+
+Usage: python bench/bench_async_client.py [number_of_calls]
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import YAML, Handler, Server  # noqa: E402
+from pymacaron_core.swagger.api import API  # noqa: E402
+
+
+class SlowHandler(Handler):
+
+    def do_GET(self):
+        time.sleep(0.01)
+        super(SlowHandler, self).do_GET()
+
+
+def measure(name, f, calls):
+    """Call f once and print the average time per call"""
+    t0 = time.time()
+    f()
+    t1 = time.time()
+    print("  %-40s %8.1f ms total, %8.1f us/call" % (name, (t1 - t0) * 1000, (t1 - t0) * 1000000 / calls))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    server = Server(('127.0.0.1', 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = API('bench', yaml_str=YAML, port=server.server_address[1], pool_size=10)
+
+    def sync_calls():
+        for _ in range(calls):
+            api.client.get_item()
+
+    def async_calls():
+        async def run():
+            await asyncio.gather(*[api.async_client.get_item() for _ in range(calls)])
+            await api.close_async_client()
+        asyncio.run(run())
+
+    print("%s calls:" % calls)
+    measure("sync client, sequential", sync_calls, calls)
+    measure("async client, asyncio.gather", async_calls, calls)
+
+
+if __name__ == '__main__':
+    main()
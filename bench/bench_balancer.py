@@ -0,0 +1,87 @@
+"""Measure the latency of client calls made from several threads to three
+local servers, one of which is slow, when picking a server at random for each
+call and with the least outstanding requests and power of two choices
+strategies, then with one of the servers down.
+
+Usage: python bench/bench_balancer.py [number_of_calls] [threads]
+"""
+import os
+import sys
+import time
+import random
+import socket
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import YAML, Handler, Server  # noqa: E402
+from pymacaron_core.swagger.api import API  # noqa: E402
+
+
+class FastHandler(Handler):
+    def do_GET(self):
+        time.sleep(0.002)
+        Handler.do_GET(self)
+
+
+class SlowHandler(Handler):
+    def do_GET(self):
+        time.sleep(0.05)
+        Handler.do_GET(self)
+
+
+def start(handler):
+    server = Server(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return '127.0.0.1:%s' % server.server_address[1]
+
+
+def measure(name, get_item, calls, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def run():
+        for _ in range(calls // threads):
+            t0 = time.time()
+            get_item()
+            with lock:
+                latencies.append(time.time() - t0)
+
+    t0 = time.time()
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    t1 = time.time()
+
+    latencies.sort()
+    p50, p99 = [latencies[int(len(latencies) * p / 100)] * 1000 for p in (50, 99)]
+    print("  %-30s p50 %6.1f ms  p99 %6.1f ms  %6.0f calls/s" % (name, p50, p99, len(latencies) / (t1 - t0)))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    random.seed(0)
+
+    hosts = [start(FastHandler), start(FastHandler), start(SlowHandler)]
+
+    print("%s calls from %s threads to 2 fast servers and a slow one:" % (calls, threads))
+    singles = [API('bench', yaml_str=YAML, host=h.split(':')[0], port=int(h.split(':')[1]), pool_size=threads) for h in hosts]
+    measure("random server", lambda: random.choice(singles).client.get_item(), calls, threads)
+    for strategy in ('least_outstanding', 'power_of_two'):
+        api = API('bench', yaml_str=YAML, host=hosts, pool_size=threads, load_balancing={'strategy': strategy})
+        measure(strategy, api.client.get_item, calls, threads)
+
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    dead = '127.0.0.1:%s' % s.getsockname()[1]
+    s.close()
+
+    print("with the slow server down:")
+    api = API('bench', yaml_str=YAML, host=hosts[:2] + [dead], pool_size=threads)
+    measure("least_outstanding", api.client.get_item, calls, threads)
+    print("balancer stats: %s" % api.get_balancer_stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Measure the time it takes an aggregation endpoint to make N client calls to
+a local server that takes 10ms to answer each call: one after the other, with
+ApiPool.gather, and with client.<method>.map at various concurrencies.
+
+Usage: python bench/bench_fanout.py [number_of_calls]
+"""
+import os
+import sys
+import time
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import YAML, Server  # noqa: E402
+from bench_async_client import SlowHandler  # noqa: E402
+from pymacaron_core.swagger.apipool import ApiPool  # noqa: E402
+
+
+def measure(name, f):
+    """Call f once and print how long it took"""
+    t0 = time.time()
+    f()
+    t1 = time.time()
+    print("  %-40s %8.1f ms" % (name, (t1 - t0) * 1000))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+
+    server = Server(('127.0.0.1', 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = ApiPool.add('bench', yaml_str=YAML, port=server.server_address[1], pool_size=32)
+    get_item = api.client.get_item
+
+    print("%s calls:" % calls)
+    measure("one after the other", lambda: [get_item() for _ in range(calls)])
+    measure("ApiPool.gather", lambda: ApiPool.gather(*[get_item for _ in range(calls)]))
+    for concurrency in (5, 10):
+        measure("map, concurrency=%s" % concurrency, lambda: get_item.map([{}] * calls, concurrency=concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Measure the latency percentiles of GET client calls to a local server that
+answers most requests in 5ms but 1 in 20 in 200ms, with and without hedging,
+and how many extra requests hedging sends.
+
+Usage: python bench/bench_hedge.py [number_of_calls]
+"""
+import os
+import sys
+import time
+import random
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import YAML, Handler, Server  # noqa: E402
+from pymacaron_core.swagger.api import API  # noqa: E402
+
+
+class SlowReplicaHandler(Handler):
+    count = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with SlowReplicaHandler.lock:
+            SlowReplicaHandler.count += 1
+        time.sleep(0.2 if random.random() < 0.05 else 0.005)
+        Handler.do_GET(self)
+
+
+def measure(name, api, calls):
+    SlowReplicaHandler.count = 0
+    latencies = []
+    for _ in range(calls):
+        t0 = time.time()
+        api.client.get_item()
+        latencies.append(time.time() - t0)
+    latencies.sort()
+    p50, p95, p99 = [latencies[int(len(latencies) * p / 100)] * 1000 for p in (50, 95, 99)]
+    print("  %-30s p50 %6.1f ms  p95 %6.1f ms  p99 %6.1f ms  %5s requests" % (name, p50, p95, p99, SlowReplicaHandler.count))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    random.seed(0)
+
+    server = Server(('127.0.0.1', 0), SlowReplicaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    print("%s calls:" % calls)
+    measure("no hedging", API('bench', yaml_str=YAML, port=port, pool_size=4), calls)
+    measure("hedging after 20ms", API('bench', yaml_str=YAML, port=port, pool_size=4, hedge={'delay': 0.02}), calls)
+    hedged = API('bench', yaml_str=YAML, port=port, pool_size=4, hedge={'percentile': 90})
+    measure("hedging after p90", hedged, calls)
+    print("hedge stats: %s" % hedged.get_hedge_stats())
+
+
+if __name__ == '__main__':
+    main()
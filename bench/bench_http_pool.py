@@ -0,0 +1,106 @@
+"""Measure the latency of client calls to a local HTTP/1.1 server, with a new
+connection per call and with connections pooled by the api, sequentially and
+from several threads at once.
+
+Usage: python bench/bench_http_pool.py [number_of_calls] [threads]
+"""
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from pymacaron_core.swagger.api import API
+
+
+YAML = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: 127.0.0.1
+schemes:
+  - http
+produces:
+  - application/json
+paths:
+  /v1/item:
+    get:
+      produces:
+        - application/json
+      x-bind-server: pymacaron_core.test.return_token
+      x-bind-client: get_item
+      responses:
+        '200':
+          description: result
+          schema:
+            $ref: '#/definitions/Item'
+definitions:
+  Item:
+    type: object
+    properties:
+      id:
+        type: string
+"""
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one packet, to avoid delayed ACKs on kept alive
+    # connections
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({'id': 'item_1'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def measure(name, api, calls, threads):
+    """Make calls client calls from threads threads and print the average time
+    per call"""
+    def work():
+        for _ in range(calls // threads):
+            api.client.get_item()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    t0 = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    t1 = time.time()
+    print("  %-40s %8.1f us/call" % (name, (t1 - t0) * 1000000 / calls))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    plain = API('bench', yaml_str=YAML, port=port)
+    pooled = API('bench', yaml_str=YAML, port=port, pool_size=threads)
+
+    print("%s calls:" % calls)
+    for n in (1, threads):
+        measure("new connection per call, %s threads" % n, plain, calls, n)
+        measure("pooled connections, %s threads" % n, pooled, calls, n)
+    print("pool stats: %s" % pooled.get_pool_stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compare the json codecs available to PyMacaron APIs, and flask's jsonify, at
+encoding and decoding payloads shaped like typical API bodies: a small object,
+an object with nested arrays of objects, and a large array of objects.
+
+Usage: python bench/bench_json_codec.py [number_of_items]
+"""
+import sys
+import time
+import json
+from flask import Flask, jsonify
+from pymacaron_core.codec import get_json_codec
+import pymacaron_core.codec
+
+
+def measure(name, f, rounds):
+    """Call f rounds times and print the average time per call"""
+    t0 = time.time()
+    for _ in range(rounds):
+        f()
+    t1 = time.time()
+    print("  %-30s %10.1f us" % (name, (t1 - t0) * 1000000 / rounds))
+
+
+def new_item(i):
+    return {
+        'id': 'item_%s' % i,
+        'name': 'Some item named élan %s' % i,
+        'tags': ['a', 'b', 'c'],
+        'price': {'amount': i * 1.5, 'currency': 'SEK'},
+        'in_stock': i % 2 == 0,
+        'created': '2020-01-01T12:00:00+00:00',
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    payloads = [
+        ('small object', new_item(0), 10000),
+        ('object with 100 nested items', {'name': 'catalog', 'items': [new_item(i) for i in range(100)]}, 500),
+        ('array of %s items' % count, [new_item(i) for i in range(count)], 10),
+    ]
+
+    codecs = [get_json_codec(name) for name in ('json', 'orjson', 'ujson') if getattr(pymacaron_core.codec, name)]
+    app = Flask('bench')
+
+    for name, payload, rounds in payloads:
+        print("%s (%s bytes):" % (name, len(json.dumps(payload))))
+        with app.app_context():
+            measure("jsonify", lambda: jsonify(payload).get_data(), rounds)
+        for codec in codecs:
+            measure("%s.dumps" % codec.name, lambda: codec.dumps(payload), rounds)
+        b = codecs[0].dumps(payload)
+        for codec in codecs:
+            measure("%s.loads" % codec.name, lambda: codec.loads(b), rounds)
+
+
+if __name__ == '__main__':
+    main()
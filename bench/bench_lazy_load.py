@@ -0,0 +1,48 @@
+"""Measure the time it takes to add 5 APIs with N models and 2*N endpoints each
+to the ApiPool and use one model and one client method of one of them, with
+and without lazy loading, and with a warm spec cache.
+
+Usage: python bench/bench_lazy_load.py [number_of_models]
+"""
+import os
+import sys
+import time
+import tempfile
+import yaml
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_spec_cache import generate_swagger_dict  # noqa: E402
+from pymacaron_core.swagger.apipool import ApiPool  # noqa: E402
+
+
+def measure(name, f):
+    """Call f once and print how long it took"""
+    t0 = time.time()
+    f()
+    t1 = time.time()
+    print("%-50s %8.1f ms" % (name, (t1 - t0) * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    yaml_strs = [yaml.dump(generate_swagger_dict(count)).replace("title: bench", "title: bench%s" % i) for i in range(5)]
+    print("5 swagger files with %s models each:" % count)
+
+    def use(**kwargs):
+        for i, yaml_str in enumerate(yaml_strs):
+            ApiPool.add('bench%s' % i, yaml_str=yaml_str, **kwargs)
+        ApiPool.bench0.model.M1(p0='a')
+        ApiPool.bench0.client.get_m1
+
+    measure("eager", lambda: use())
+    measure("lazy", lambda: use(lazy_load=True))
+    measure("lazy, then preload", lambda: (use(lazy_load=True), ApiPool.preload()))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        use(spec_cache_dir=cache_dir)
+        measure("eager, warm spec cache", lambda: use(spec_cache_dir=cache_dir))
+        measure("lazy, warm spec cache", lambda: use(spec_cache_dir=cache_dir, lazy_load=True))
+
+
+if __name__ == '__main__':
+    main()
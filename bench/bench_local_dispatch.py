@@ -0,0 +1,80 @@
+"""Measure the latency of local client calls to an api served by the same
+flask app, through flask's test_client and with the handler called directly,
+validating parameters as over http or only against their schema.
+
+Usage: python bench/bench_local_dispatch.py [number_of_calls]
+"""
+import os
+import sys
+import time
+from flask import Flask
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pymacaron_core.swagger.api import API  # noqa: E402
+
+
+YAML = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: 127.0.0.1
+schemes:
+  - http
+produces:
+  - application/json
+paths:
+  /v1/item:
+    post:
+      parameters:
+        - in: body
+          name: body
+          required: true
+          schema:
+            $ref: '#/definitions/Item'
+      produces:
+        - application/json
+      x-bind-server: bench_local_dispatch.echo_item
+      x-bind-client: echo_item
+      responses:
+        '200':
+          description: result
+          schema:
+            $ref: '#/definitions/Item'
+definitions:
+  Item:
+    type: object
+    properties:
+      id:
+        type: string
+      tags:
+        type: array
+        items:
+          type: string
+"""
+
+
+def echo_item(item):
+    return item
+
+
+def measure(name, calls, **kwargs):
+    api = API('bench', yaml_str=YAML, local=True, **kwargs)
+    api.spawn_api(Flask('bench'))
+    item = api.model.Item(id='item_1', tags=['tag_%s' % i for i in range(20)])
+
+    t0 = time.time()
+    for _ in range(calls):
+        api.client.echo_item(item)
+    t1 = time.time()
+    print("  %-30s %8.1f us/call" % (name, (t1 - t0) * 1000000 / calls))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print("%s local calls:" % calls)
+    measure("flask test_client", calls)
+    measure("direct", calls, local_dispatch=True)
+    measure("direct, schema only", calls, local_dispatch='schema')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Measure the latency of GET client calls to a local server without metrics,
+with metrics, and with metrics forwarded to a hook, and print the metrics
+recorded in prometheus' text format.
+
+Usage: python bench/bench_metrics.py [number_of_calls]
+"""
+import os
+import sys
+import time
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import YAML, Handler, Server  # noqa: E402
+from pymacaron_core.swagger.api import API  # noqa: E402
+from pymacaron_core.swagger.metrics import add_metrics_hook, remove_metrics_hook, format_prometheus  # noqa: E402
+
+
+def measure(name, api, calls):
+    api.client.get_item()
+    t0 = time.time()
+    for _ in range(calls):
+        api.client.get_item()
+    t1 = time.time()
+    print("  %-30s %8.1f us/call" % (name, (t1 - t0) * 1000000 / calls))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    print("%s calls:" % calls)
+    measure("no metrics", API('bench', yaml_str=YAML, port=port, pool_size=4), calls)
+    metered = API('bench', yaml_str=YAML, port=port, pool_size=4, metrics=True)
+    measure("metrics", metered, calls)
+
+    records = []
+    add_metrics_hook(records.append)
+    measure("metrics and hook", metered, calls)
+    remove_metrics_hook(records.append)
+
+    print()
+    print(format_prometheus({'bench': metered.get_client_metrics()}))
+
+
+if __name__ == '__main__':
+    main()
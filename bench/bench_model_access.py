@@ -0,0 +1,62 @@
+"""Measure attribute access on the instances of a wide PyMacaron model: get,
+set and hasattr on properties, hasattr on missing attributes, item access and
+to_json(keep_datetime=True), with both storage modes.
+
+Usage: python bench/bench_model_access.py [number_of_properties] [number_of_loops]
+"""
+import sys
+import timeit
+from pymacaron_core.swagger.api import API
+
+
+def generate_yaml(width):
+    """Return a swagger spec with one model having width string properties"""
+    lines = [
+        "swagger: '2.0'",
+        "info:",
+        "  version: '0.0.1'",
+        "host: some.server.com",
+        "schemes:",
+        "  - http",
+        "produces:",
+        "  - application/json",
+        "definitions:",
+        "  Wide:",
+        "    type: object",
+        "    properties:",
+    ]
+    for i in range(width):
+        lines.append("      p%s:" % i)
+        lines.append("        type: string")
+    return '\n'.join(lines) + '\n'
+
+
+def measure(name, stmt, loops, **env):
+    t = timeit.timeit(stmt, globals=env, number=loops)
+    print("%-40s %8.1f ns/op" % (name, t * 1e9 / loops))
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    loops = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+    yaml_str = generate_yaml(width)
+    last = 'p%s' % (width - 1)
+
+    for slots in (False, True):
+        api = API('bench', yaml_str=yaml_str, slots=slots)
+        o = api.model.Wide(**{'p%s' % i: 'v%s' % i for i in range(width)})
+
+        print("Model with %s properties, slots=%s:" % (width, slots))
+        measure("get first property", "o.p0", loops, o=o)
+        measure("get last property", "o.%s" % last, loops, o=o)
+        measure("set last property", "o.%s = 'x'" % last, loops, o=o)
+        measure("hasattr(o, <property>)", "hasattr(o, '%s')" % last, loops, o=o)
+        measure("hasattr(o, <missing>)", "hasattr(o, 'missing')", loops, o=o)
+        measure("o[<property>]", "o['%s']" % last, loops, o=o)
+        measure("o[<property>] = v", "o['%s'] = 'x'" % last, loops, o=o)
+        measure("to_json(keep_datetime=True)", "o.to_json(keep_datetime=True)", max(1, loops // width), o=o)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare marshalling, unmarshalling and validating lists of models one item at
+a time with the bulk to_json_many/from_json_many/json_to_models methods.
+
+Usage: python bench/bench_model_bulk.py [number_of_items ...]
+"""
+import sys
+import time
+from pymacaron_core.swagger.api import API
+
+
+yaml_str = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: some.server.com
+schemes:
+  - http
+produces:
+  - application/json
+definitions:
+
+  Item:
+    type: object
+    required:
+      - id
+    properties:
+      id:
+        type: string
+      name:
+        type: string
+      created:
+        type: string
+        format: date-time
+      tags:
+        type: array
+        items:
+          type: string
+      price:
+        $ref: '#/definitions/Price'
+
+  Price:
+    type: object
+    properties:
+      amount:
+        type: number
+      currency:
+        type: string
+"""
+
+
+def measure(name, f):
+    t0 = time.time()
+    f()
+    t1 = time.time()
+    print("  %-45s %9.1f ms" % (name, (t1 - t0) * 1000))
+
+
+def main():
+    counts = [int(c) for c in sys.argv[1:]] or [1000, 10000, 100000]
+
+    api = API('bench', yaml_str=yaml_str)
+    Item = api.model.Item
+
+    for count in counts:
+        js = [
+            {
+                'id': 'item_%s' % i,
+                'name': 'Item %s' % i,
+                'created': '2020-01-01T00:00:00+00:00',
+                'tags': ['a', 'b'],
+                'price': {'amount': i, 'currency': 'SEK'},
+            }
+            for i in range(count)
+        ]
+        items = Item.from_json_many(js)
+
+        print("%s items:" % count)
+        measure("[o.to_json() for o in items]", lambda: [o.to_json() for o in items])
+        measure("Item.to_json_many(items)", lambda: Item.to_json_many(items))
+        measure("[Item.from_json(j) for j in js]", lambda: [Item.from_json(j) for j in js])
+        measure("Item.from_json_many(js)", lambda: Item.from_json_many(js))
+        measure("[api.json_to_model(.., validate=True)]", lambda: [api.json_to_model('Item', j, validate=True) for j in js])
+        measure("api.json_to_models(.., validate=True)", lambda: api.json_to_models('Item', js, validate=True))
+
+
+if __name__ == '__main__':
+    main()
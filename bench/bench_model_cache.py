@@ -0,0 +1,94 @@
+"""Measure the time it takes to marshal the same large tree of PyMacaron models
+to json repeatedly, with and without caching its json representation, and
+after modifying a nested model.
+
+Usage: python bench/bench_model_cache.py [number_of_items]
+"""
+import sys
+import time
+from pymacaron_core.swagger.api import API
+
+
+yaml_str = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: some.server.com
+schemes:
+  - http
+produces:
+  - application/json
+definitions:
+
+  Catalog:
+    type: object
+    properties:
+      name:
+        type: string
+      items:
+        type: array
+        items:
+          $ref: '#/definitions/Item'
+
+  Item:
+    type: object
+    properties:
+      id:
+        type: string
+      tags:
+        type: array
+        items:
+          type: string
+      price:
+        $ref: '#/definitions/Price'
+
+  Price:
+    type: object
+    properties:
+      amount:
+        type: number
+      currency:
+        type: string
+"""
+
+
+def measure(name, f, rounds=100):
+    """Call f rounds times and print the average time per call"""
+    t0 = time.time()
+    for _ in range(rounds):
+        f()
+    t1 = time.time()
+    print("%-45s %10.3f ms" % (name, (t1 - t0) * 1000 / rounds))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    for cache_json in (False, True):
+        api = API('bench', yaml_str=yaml_str, cache_json=cache_json)
+        Catalog, Item, Price = api.model.Catalog, api.model.Item, api.model.Price
+
+        catalog = Catalog(
+            name='catalog',
+            items=[
+                Item(
+                    id='item_%s' % i,
+                    tags=['a', 'b', 'c'],
+                    price=Price(amount=i, currency='SEK'),
+                )
+                for i in range(count)
+            ],
+        )
+        price = catalog.items[0].price
+
+        def modify_and_marshal():
+            price.amount += 1
+            catalog.to_json()
+
+        print("Catalog with %s nested items, cache_json=%s:" % (count, cache_json))
+        measure("to_json()", lambda: catalog.to_json())
+        measure("modify a nested model + to_json()", modify_and_marshal)
+
+
+if __name__ == '__main__':
+    main()
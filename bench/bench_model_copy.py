@@ -0,0 +1,99 @@
+"""Measure the time and memory it takes to cast a large tree of PyMacaron models
+to and from bravado-core models, with and without copying it, and to clone it.
+
+Usage: python bench/bench_model_copy.py [number_of_items]
+"""
+import sys
+import time
+import tracemalloc
+from pymacaron_core.swagger.api import API
+
+
+yaml_str = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: some.server.com
+schemes:
+  - http
+produces:
+  - application/json
+definitions:
+
+  Catalog:
+    type: object
+    properties:
+      name:
+        type: string
+      items:
+        type: array
+        items:
+          $ref: '#/definitions/Item'
+
+  Item:
+    type: object
+    properties:
+      id:
+        type: string
+      tags:
+        type: array
+        items:
+          type: string
+      price:
+        $ref: '#/definitions/Price'
+
+  Price:
+    type: object
+    properties:
+      amount:
+        type: number
+      currency:
+        type: string
+"""
+
+
+def measure(name, f):
+    """Call f once and print how long it took and how much memory it allocated"""
+    tracemalloc.start()
+    t0 = time.time()
+    f()
+    t1 = time.time()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-45s %8.1f ms %10.1f KiB" % (name, (t1 - t0) * 1000, peak / 1024))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    api = API('bench', yaml_str=yaml_str)
+    Catalog, Item, Price = api.model.Catalog, api.model.Item, api.model.Price
+
+    catalog = Catalog(
+        name='catalog',
+        items=[
+            Item(
+                id='item_%s' % i,
+                tags=['a', 'b', 'c'],
+                price=Price(amount=i, currency='SEK'),
+            )
+            for i in range(count)
+        ],
+    )
+    b = catalog.to_bravado()
+    b_owned = catalog.to_bravado()
+
+    print("Catalog with %s nested items:" % count)
+    measure("to_bravado()", lambda: catalog.to_bravado())
+    measure("to_bravado(copy=False)", lambda: catalog.to_bravado(copy=False))
+    measure("from_bravado(b)", lambda: Catalog.from_bravado(b))
+    measure("from_bravado(b, copy=False)", lambda: Catalog.from_bravado(b_owned, copy=False))
+    measure("to_json()", lambda: catalog.to_json())
+    measure("from_json(to_json())", lambda: Catalog.from_json(catalog.to_json()))
+    measure("clone()", lambda: catalog.clone())
+    measure("clone(copy_on_write=True)", lambda: catalog.clone(copy_on_write=True))
+    measure("clone(copy_on_write=True) + 1 write", lambda: setattr(catalog.clone(copy_on_write=True).items[0], 'id', 'x'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Measure the time it takes to validate and unmarshal a large json document
+into PyMacaron models, eagerly and lazily, then read a top-level property and
+marshal it back to json.
+
+Usage: python bench/bench_model_lazy.py [number_of_items]
+"""
+import sys
+import time
+from pymacaron_core.swagger.api import API
+from pymacaron_core.models import get_lazy_unmarshaller
+
+
+yaml_str = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: some.server.com
+schemes:
+  - http
+produces:
+  - application/json
+definitions:
+
+  Catalog:
+    type: object
+    properties:
+      name:
+        type: string
+      items:
+        type: array
+        items:
+          $ref: '#/definitions/Item'
+
+  Item:
+    type: object
+    properties:
+      id:
+        type: string
+      tags:
+        type: array
+        items:
+          type: string
+      price:
+        $ref: '#/definitions/Price'
+
+  Price:
+    type: object
+    properties:
+      amount:
+        type: number
+      currency:
+        type: string
+"""
+
+
+def measure(name, f, rounds=5):
+    """Call f rounds times and print the best time"""
+    best = None
+    for _ in range(rounds):
+        t0 = time.time()
+        f()
+        t = time.time() - t0
+        best = t if best is None else min(best, t)
+    print("%-45s %8.1f ms" % (name, best * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    api = API('bench', yaml_str=yaml_str)
+    Catalog = api.model.Catalog
+    j = {
+        'name': 'catalog',
+        'items': [
+            {'id': 'item_%s' % i, 'tags': ['a', 'b', 'c'], 'price': {'amount': i, 'currency': 'SEK'}}
+            for i in range(count)
+        ],
+    }
+    lazy_unmarshaller = get_lazy_unmarshaller(api.api_spec.spec, api.api_spec.swagger_dict['definitions']['Catalog'])
+
+    def eager():
+        api.api_spec.validate('Catalog', j)
+        return Catalog.from_json(j)
+
+    def read_and_marshal(o):
+        assert o.name == 'catalog'
+        return o.to_json()
+
+    print("Catalog with %s nested items:" % count)
+    measure("validate + from_json()", eager)
+    measure("lazy", lambda: lazy_unmarshaller(j))
+    measure("validate + from_json() + read + to_json()", lambda: read_and_marshal(eager()))
+    measure("lazy + read + to_json()", lambda: read_and_marshal(lazy_unmarshaller(j)))
+    measure("lazy + access items", lambda: lazy_unmarshaller(j).items)
+
+
+if __name__ == '__main__':
+    main()
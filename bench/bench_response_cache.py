@@ -0,0 +1,104 @@
+"""Measure the latency of GET client calls returning a catalog of N items from
+a local server: without caching, revalidating cached results with ETags, and
+hitting the client cache.
+
+Usage: python bench/bench_response_cache.py [number_of_calls] [number_of_items]
+"""
+import os
+import sys
+import json
+import time
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import Handler, Server  # noqa: E402
+from pymacaron_core.swagger.api import API  # noqa: E402
+
+
+YAML = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: 127.0.0.1
+schemes:
+  - http
+produces:
+  - application/json
+paths:
+  /v1/catalog:
+    get:
+      produces:
+        - application/json
+      x-bind-server: pymacaron_core.test.return_token
+      x-bind-client: get_catalog
+      responses:
+        '200':
+          description: result
+          schema:
+            $ref: '#/definitions/Catalog'
+definitions:
+  Catalog:
+    type: object
+    properties:
+      items:
+        type: array
+        items:
+          $ref: '#/definitions/Item'
+  Item:
+    type: object
+    properties:
+      id:
+        type: string
+      name:
+        type: string
+      price:
+        type: integer
+"""
+
+
+class CatalogHandler(Handler):
+    items = 100
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        catalog = {'items': [{'id': str(i), 'name': 'item %s' % i, 'price': i} for i in range(CatalogHandler.items)]}
+        body = json.dumps(catalog).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def measure(name, api, calls):
+    api.client.get_catalog()
+    t0 = time.time()
+    for _ in range(calls):
+        api.client.get_catalog()
+    t1 = time.time()
+    print("  %-40s %8.1f us/call" % (name, (t1 - t0) * 1000000 / calls))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    CatalogHandler.items = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    server = Server(('127.0.0.1', 0), CatalogHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    print("%s calls returning %s items:" % (calls, CatalogHandler.items))
+    measure("no cache", API('bench', yaml_str=YAML, port=port, pool_size=1), calls)
+    measure("cache, revalidated with ETag", API('bench', yaml_str=YAML, port=port, pool_size=1, client_cache={'ttl': 0}), calls)
+    cached = API('bench', yaml_str=YAML, port=port, pool_size=1, client_cache={'ttl': 60})
+    measure("cache hits", cached, calls)
+    print("cache stats: %s" % cached.get_cache_stats())
+
+
+if __name__ == '__main__':
+    main()
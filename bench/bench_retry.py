@@ -0,0 +1,69 @@
+"""Count the requests that a downstream server, slowed down to the point where
+every call times out, gets from N client calls made from several threads:
+without a retry policy, and with retry policies of various budgets.
+
+Usage: python bench/bench_retry.py [number_of_calls] [threads]
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import YAML, Handler, Server  # noqa: E402
+from pymacaron_core.swagger.api import API  # noqa: E402
+from pymacaron_core.swagger.retry import reset_circuit_breakers  # noqa: E402
+
+
+class OverloadedHandler(Handler):
+    """Answer after 100ms, and count requests"""
+    count = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with OverloadedHandler.lock:
+            OverloadedHandler.count += 1
+        time.sleep(0.1)
+        Handler.do_GET(self)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(name, api, calls, threads):
+    def call(_):
+        try:
+            api.client.get_item(read_timeout=0.05)
+        except Exception:
+            pass
+
+    reset_circuit_breakers()
+    OverloadedHandler.count = 0
+    t0 = time.time()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(call, range(calls)))
+    t1 = time.time()
+    print("  %-45s %5s requests %8.1f ms" % (name, OverloadedHandler.count, (t1 - t0) * 1000))
+
+
+def main():
+    logging.disable(logging.WARNING)
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    server = Server(('127.0.0.1', 0), OverloadedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    print("%s calls from %s threads, all timing out:" % (calls, threads))
+    measure("no retry policy", API('bench', yaml_str=YAML, port=port), calls, threads)
+    for budget in (0.2, 0.1):
+        policy = {'backoff_base': 0.01, 'retry_budget': budget, 'failure_threshold': None}
+        measure("retry budget %s" % budget, API('bench', yaml_str=YAML, port=port, retry_policy=policy), calls, threads)
+    policy = {'backoff_base': 0.01, 'failure_threshold': 20, 'reset_timeout': 60}
+    measure("retry budget 0.2, circuit breaker", API('bench', yaml_str=YAML, port=port, retry_policy=policy), calls, threads)
+
+
+if __name__ == '__main__':
+    main()
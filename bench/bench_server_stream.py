@@ -0,0 +1,102 @@
+"""Compare the peak memory used by the Flask server to send an array of models
+returned by an endpoint as a list (buffered) or as a generator (streamed).
+
+Usage: python bench/bench_server_stream.py [number_of_items ...]
+"""
+import sys
+import time
+import tracemalloc
+from flask import Flask
+from pymacaron_core.swagger.api import API
+
+
+yaml_str = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: some.server.com
+schemes:
+  - http
+produces:
+  - application/json
+paths:
+  /items:
+    get:
+      produces:
+        - application/json
+      x-bind-server: bench_server_stream.list_items
+      responses:
+        200:
+          description: items
+          schema:
+            type: array
+            items:
+              $ref: '#/definitions/Item'
+definitions:
+  Item:
+    type: object
+    properties:
+      id:
+        type: string
+      name:
+        type: string
+      tags:
+        type: array
+        items:
+          type: string
+"""
+
+
+# Set by main() before each request
+count = 0
+streamed = False
+
+
+def generate_items():
+    from pymacaron_core.models import get_model
+    Item = get_model('Item')
+    for i in range(count):
+        yield Item(id='item_%s' % i, name='Item number %s' % i, tags=['a', 'b', 'c'])
+
+
+def list_items():
+    if streamed:
+        return generate_items()
+    return list(generate_items())
+
+
+def measure(app, name):
+    tracemalloc.start()
+    t0 = time.time()
+    size = 0
+    with app.test_client() as c:
+        r = c.get('/items', buffered=False)
+        for chunk in r.response:
+            size += len(chunk)
+        r.close()
+    t1 = time.time()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("  %-12s %8.1f ms %10.1f KiB peak  (%s bytes sent)" % (name, (t1 - t0) * 1000, peak / 1024, size))
+
+
+def main():
+    global count, streamed
+
+    # Make this module importable as 'bench_server_stream' by x-bind-server
+    sys.modules['bench_server_stream'] = sys.modules[__name__]
+
+    api = API('bench', yaml_str=yaml_str)
+    app = Flask('bench')
+    api.spawn_api(app)
+
+    for count in [int(c) for c in sys.argv[1:]] or [10000, 100000]:
+        print("%s items:" % count)
+        streamed = False
+        measure(app, 'list')
+        streamed = True
+        measure(app, 'generator')
+
+
+if __name__ == '__main__':
+    main()
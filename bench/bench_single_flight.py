@@ -0,0 +1,53 @@
+"""Count the requests that a server taking 20ms to answer gets from bursts of
+identical GET calls made by N threads at once, and measure how long the
+bursts take, with and without coalescing of identical calls.
+
+Usage: python bench/bench_single_flight.py [threads] [bursts]
+"""
+import os
+import sys
+import time
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_http_pool import YAML, Handler, Server  # noqa: E402
+from pymacaron_core.swagger.api import API  # noqa: E402
+from pymacaron_core.swagger.fanout import gather  # noqa: E402
+
+
+class CountingHandler(Handler):
+    count = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with CountingHandler.lock:
+            CountingHandler.count += 1
+        time.sleep(0.02)
+        Handler.do_GET(self)
+
+
+def measure(name, api, threads, bursts):
+    CountingHandler.count = 0
+    t0 = time.time()
+    for _ in range(bursts):
+        gather(*[api.client.get_item for _ in range(threads)])
+    t1 = time.time()
+    print("  %-30s %6s requests %8.1f ms/burst" % (name, CountingHandler.count, (t1 - t0) * 1000 / bursts))
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    bursts = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    server = Server(('127.0.0.1', 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    print("%s bursts of %s identical calls:" % (bursts, threads))
+    measure("no coalescing", API('bench', yaml_str=YAML, port=port, pool_size=threads), threads, bursts)
+    coalesced = API('bench', yaml_str=YAML, port=port, pool_size=threads, coalesce=True)
+    measure("coalescing", coalesced, threads, bursts)
+    print("coalesce stats: %s" % coalesced.get_coalesce_stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Measure the time it takes to load an API from a swagger file with N models
+and 2*N endpoints: parsing yaml, building the bravado-core spec, and the whole
+API, with and without an on-disk spec cache.
+
+Usage: python bench/bench_spec_cache.py [number_of_models]
+"""
+import sys
+import time
+import tempfile
+import yaml
+from bravado_core.spec import Spec
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger.spec import get_bravado_config
+
+
+def generate_swagger_dict(count):
+    """Return a swagger dict with count models referencing each other, and a
+    GET and a POST endpoint per model"""
+    d = {
+        'swagger': '2.0',
+        'info': {'version': '0.0.1', 'title': 'bench'},
+        'host': 'some.server.com',
+        'schemes': ['http'],
+        'produces': ['application/json'],
+        'paths': {},
+        'definitions': {},
+    }
+    for i in range(count):
+        properties = {'p%s' % j: {'type': 'string'} for j in range(10)}
+        properties['dt'] = {'type': 'string', 'format': 'date-time'}
+        properties['o'] = {'$ref': '#/definitions/M%s' % (i // 2)}
+        properties['lo'] = {'type': 'array', 'items': {'$ref': '#/definitions/M%s' % (i // 3)}}
+        d['definitions']['M%s' % i] = {'type': 'object', 'properties': properties}
+
+        ref = {'$ref': '#/definitions/M%s' % i}
+        path_param = {'in': 'path', 'name': 'id', 'type': 'string', 'required': True}
+        d['paths']['/v1/m%s/{id}' % i] = {
+            'get': {
+                'produces': ['application/json'],
+                'x-bind-server': 'pymacaron_core.test.return_token',
+                'x-bind-client': 'get_m%s' % i,
+                'parameters': [path_param],
+                'responses': {'200': {'description': 'ok', 'schema': ref}},
+            },
+            'post': {
+                'produces': ['application/json'],
+                'x-bind-server': 'pymacaron_core.test.return_token',
+                'x-bind-client': 'post_m%s' % i,
+                'parameters': [path_param, {'in': 'body', 'name': 'body', 'schema': ref, 'required': True}],
+                'responses': {'200': {'description': 'ok', 'schema': ref}},
+            },
+        }
+    return d
+
+
+def measure(name, f):
+    """Call f once and print how long it took"""
+    t0 = time.time()
+    f()
+    t1 = time.time()
+    print("%-45s %8.1f ms" % (name, (t1 - t0) * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    yaml_str = yaml.dump(generate_swagger_dict(count))
+    print("Swagger file with %s models (%s bytes):" % (count, len(yaml_str)))
+    measure("yaml.load with FullLoader", lambda: yaml.load(yaml_str, Loader=yaml.FullLoader))
+    if hasattr(yaml, 'CFullLoader'):
+        measure("yaml.load with CFullLoader", lambda: yaml.load(yaml_str, Loader=yaml.CFullLoader))
+    swagger_dict = yaml.load(yaml_str, Loader=yaml.FullLoader)
+    measure("Spec.from_dict", lambda: Spec.from_dict(swagger_dict, config=get_bravado_config()))
+
+    measure("API, no cache", lambda: API('bench', yaml_str=yaml_str))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        measure("API, cold cache", lambda: API('bench', yaml_str=yaml_str, spec_cache_dir=cache_dir))
+        measure("API, warm cache", lambda: API('bench', yaml_str=yaml_str, spec_cache_dir=cache_dir))
+
+
+if __name__ == '__main__':
+    main()
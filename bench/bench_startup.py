@@ -0,0 +1,83 @@
+"""Measure the startup time of a process using PyMacaron: importing
+pymacaron_core then adding N APIs to the ApiPool, for APIs of various sizes,
+with and without lazy loading and a warm spec cache. Each measure is the
+median of several runs, each in a fresh python interpreter.
+
+Usage: python bench/bench_startup.py [number_of_apis] [models_per_api,...] [runs]
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+import yaml
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_spec_cache import generate_swagger_dict  # noqa: E402
+
+
+CHILD = """
+import sys
+import time
+import json
+t0 = time.perf_counter()
+from pymacaron_core.swagger.apipool import ApiPool
+t1 = time.perf_counter()
+kwargs = json.loads(sys.argv[1])
+for i, path in enumerate(sys.argv[2:]):
+    ApiPool.add('api%s' % i, yaml_path=path, **kwargs)
+t2 = time.perf_counter()
+print(json.dumps({
+    'import': (t1 - t0) * 1000,
+    'add': (t2 - t1) * 1000,
+    'flask': 'flask' in sys.modules,
+}))
+"""
+
+
+def run(paths, kwargs, runs):
+    """Return the median import and ApiPool.add times over runs fresh
+    interpreters, and whether flask got imported"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.getcwd(), env.get('PYTHONPATH', '')])
+    results = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', CHILD, json.dumps(kwargs)] + paths, env=env)
+        results.append(json.loads(out.decode('utf-8').strip().splitlines()[-1]))
+    return (
+        statistics.median(r['import'] for r in results),
+        statistics.median(r['add'] for r in results),
+        results[0]['flask'],
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sizes = [int(s) for s in sys.argv[2].split(',')] if len(sys.argv) > 2 else [10, 100, 300]
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        print("%-35s %10s %10s %6s" % ("%s apis of" % count, "import", "add", "flask"))
+        for size in sizes:
+            paths = []
+            for i in range(count):
+                path = os.path.join(tmp_dir, 'api_%s_%s.yaml' % (size, i))
+                with open(path, 'w') as f:
+                    f.write(yaml.dump(generate_swagger_dict(size)).replace('title: bench', 'title: bench%s' % i))
+                paths.append(path)
+
+            # Warm the spec cache
+            run(paths, {'spec_cache_dir': cache_dir}, 1)
+
+            for name, kwargs in (
+                ('eager', {}),
+                ('lazy_load', {'lazy_load': True}),
+                ('eager, warm spec cache', {'spec_cache_dir': cache_dir}),
+            ):
+                t_import, t_add, flask = run(paths, kwargs, runs)
+                print("%-35s %8.1f ms %8.1f ms %6s" % ("%s models, %s" % (size, name), t_import, t_add, flask))
+
+
+if __name__ == '__main__':
+    main()
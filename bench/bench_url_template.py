@@ -0,0 +1,69 @@
+"""Measure the time to build the url of a client call with path and query
+parameters, by replacing each parameter in the path and letting requests
+encode the query, and with a precompiled UrlTemplate, with and without the
+time requests then takes to prepare the url.
+
+Usage: python bench/bench_url_template.py [number_of_calls]
+"""
+import sys
+import time
+import requests
+from pymacaron_core.swagger.urltemplate import UrlTemplate
+
+
+URL = "http://127.0.0.1:8080/v1/shop/<shop_id>/item/<item_id>"
+
+
+class Param():
+    location = 'query'
+    required = False
+
+    def __init__(self, name):
+        self.name = name
+
+
+def format_by_replace(url, kwargs):
+    """How client callers used to format urls, leaving the query parameters
+    to requests"""
+    kwargs = dict(kwargs)
+    for name, value in list(kwargs.items()):
+        if "<%s>" % name in url:
+            url = url.replace("<%s>" % name, str(value))
+            del kwargs[name]
+    if '<' in url:
+        raise Exception("Missing some arguments to format url: %s" % url)
+    return url, kwargs
+
+
+def format_by_replace_and_requests(url, kwargs):
+    url, params = format_by_replace(url, kwargs)
+    return requests.Request('GET', url, params=params).prepare().url
+
+
+def format_by_template(template, kwargs):
+    return requests.Request('GET', template.format(kwargs)).prepare().url
+
+
+def measure(name, f, calls):
+    kwargs = {'shop_id': 'shop_1', 'item_id': 'item 2', 'page': 3, 'lang': 'fr', 'q': 'blue shoes'}
+    t0 = time.time()
+    for _ in range(calls):
+        f(kwargs)
+    t1 = time.time()
+    print("  %-30s %8.1f us/call" % (name, (t1 - t0) * 1000000 / calls))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    template = UrlTemplate(URL, [Param('page'), Param('lang'), Param('q')])
+
+    print("%s urls with 2 path and 3 query parameters:" % calls)
+    measure("replace", lambda kwargs: format_by_replace(URL, kwargs), calls)
+    measure("template", template.format, calls)
+    print("including requests' preparation of the url:")
+    measure("replace + requests params", lambda kwargs: format_by_replace_and_requests(URL, kwargs), calls)
+    measure("template + requests", lambda kwargs: format_by_template(template, kwargs), calls)
+
+
+if __name__ == '__main__':
+    main()
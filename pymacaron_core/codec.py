@@ -0,0 +1,106 @@
+import json
+import logging
+from pymacaron_core.exceptions import PyMacaronCoreException
+
+
+log = logging.getLogger(__name__)
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec():
+    """Encode json values into utf-8 bytes and decode them back. Subclass it to
+    plug in another json library."""
+
+    name = None
+
+    def dumps(self, o):
+        """Return the compact utf-8 encoded json representation of o, as bytes"""
+        raise NotImplementedError()
+
+    def loads(self, s):
+        """Decode a json document given as bytes or str"""
+        raise NotImplementedError()
+
+
+class StdlibJsonCodec(JsonCodec):
+    """The python standard library's json encoder"""
+
+    name = 'json'
+
+    def dumps(self, o):
+        return json.dumps(o, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def loads(self, s):
+        return json.loads(s)
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson, which encodes straight into bytes. Values it does not support
+    (decimals, integers over 64 bits...) are encoded by the standard library"""
+
+    name = 'orjson'
+
+    def dumps(self, o):
+        try:
+            return orjson.dumps(o)
+        except TypeError:
+            return _stdlib_codec.dumps(o)
+
+    def loads(self, s):
+        return orjson.loads(s)
+
+
+class UjsonCodec(JsonCodec):
+    """ujson. Values it does not support are encoded by the standard library"""
+
+    name = 'ujson'
+
+    def dumps(self, o):
+        try:
+            return ujson.dumps(o, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+        except (TypeError, OverflowError):
+            return _stdlib_codec.dumps(o)
+
+    def loads(self, s):
+        return ujson.loads(s)
+
+
+_stdlib_codec = StdlibJsonCodec()
+
+# Codecs by name, fastest first
+_codec_classes = [
+    (OrjsonCodec, orjson),
+    (UjsonCodec, ujson),
+    (StdlibJsonCodec, json),
+]
+
+
+def get_json_codec(codec):
+    """Return the JsonCodec named codec ('orjson', 'ujson' or 'json'), or the
+    fastest one installed if codec is 'auto'. Instances of JsonCodec are
+    returned as is."""
+
+    if isinstance(codec, JsonCodec):
+        return codec
+
+    for cls, module in _codec_classes:
+        if codec not in (cls.name, 'auto'):
+            continue
+        if module is None:
+            if codec == 'auto':
+                continue
+            raise PyMacaronCoreException("Cannot use json codec %s: package %s is not installed" % (codec, codec))
+        log.debug("Using json codec %s" % cls.name)
+        return cls()
+
+    raise PyMacaronCoreException("Unknown json codec %s. Should be one of 'auto', 'orjson', 'ujson' or 'json'" % codec)
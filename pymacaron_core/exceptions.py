@@ -1,5 +1,4 @@
 import logging
-from flask import jsonify
 
 
 log = logging.getLogger(__name__)
@@ -27,6 +26,8 @@ class PyMacaronModelException(PyMacaronCoreException):
 def add_error_handlers(app):
     """Add custom error handlers for PyMacaronCoreExceptions to the app"""
 
+    from flask import jsonify
+
     def handle_validation_error(error):
         response = jsonify({'message': str(error)})
         response.status_code = error.status_code
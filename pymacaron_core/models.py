@@ -1,7 +1,20 @@
 import logging
+import keyword
+import threading
 from copy import deepcopy
+import weakref
+from datetime import date, datetime
+from decimal import Decimal
+from bravado_core.exception import SwaggerMappingError
+from bravado_core.formatter import DEFAULT_FORMATS
 from bravado_core.marshal import marshal_schema_object
+from bravado_core.schema import SWAGGER_PRIMITIVES
+from bravado_core.schema import get_type_from_schema
+from bravado_core.schema import is_dict_like
+from bravado_core.schema import is_list_like
 from bravado_core.unmarshal import unmarshal_model
+from bravado_core.unmarshal import unmarshal_schema_object
+from bravado_core.validate import validate_schema_object
 import bravado_core.model
 from pymacaron_core.exceptions import ValidationError
 from pymacaron_core.utils import get_function
@@ -10,11 +23,67 @@ from pymacaron_core.utils import get_function
 log = logging.getLogger(__name__)
 
 
-class Models():
+class _ModelsMeta(type):
+    """Metaclass of Models, generating on first access the model classes of
+    apis loaded lazily (see ApiPool.add)"""
+
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        with models_lock:
+            # Another thread may have generated it while we waited
+            if name in cls.__dict__:
+                return cls.__dict__[name]
+            # Register the models of apis whose spec is not loaded yet
+            while name not in _model_factories and _model_loaders:
+                _model_loaders.pop(0)()
+            factory = _model_factories.get(name)
+            if not factory:
+                raise AttributeError("Swagger spec has no definition for model %s" % name)
+            # The factory is only removed once its model class is registered
+            cls = factory()
+            _model_factories.pop(name, None)
+            return cls
+
+
+class Models(metaclass=_ModelsMeta):
     """Class holding all generated models"""
     pass
 
 
+# Functions generating model classes, by model name, and functions registering
+# more such functions, all called on first access to a model
+_model_factories = {}
+_model_loaders = []
+
+# Lock held while loading specs lazily and generating model classes, so that
+# threads accessing a model at once all get the same class. Reentrant, since
+# loading a spec or a model may access other models.
+models_lock = threading.RLock()
+
+
+def register_model_factory(name, factory):
+    """Make the next access to Models.<name> return the model class generated
+    by calling factory"""
+    with models_lock:
+        if name in Models.__dict__:
+            delattr(Models, name)
+        _model_factories[name] = factory
+
+
+def register_model_loader(loader):
+    """Call loader, a function registering model factories, on the first access
+    to a model class that does not exist yet"""
+    with models_lock:
+        _model_loaders.append(loader)
+
+
+def unregister_model_loader(loader):
+    with models_lock:
+        if loader in _model_loaders:
+            _model_loaders.remove(loader)
+
+
 def get_model(model_name):
     if hasattr(Models, model_name):
         return getattr(Models, model_name)
@@ -36,51 +105,49 @@ class PyMacaronModel(object):
     __swagger_dict = None
     __swagger_spec = None
 
+    # Class variables: marshalling and unmarshalling functions compiled from the
+    # model's schema, or None if the model is (un)marshalled by bravado-core
+    __marshaller = None
+    __unmarshaller = None
+
     #
-    # Delegate getter/setter/etc to Bravado model
+    # Delegate getter/setter/etc to Bravado model. Properties are accessed as
+    # attributes through the _ModelProperty descriptors installed on the
+    # model's class by generate_model_class, so __getattr__ is only called for
+    # attributes that do not exist
     #
 
-    def __setattr__(self, k, v):
-        if k in getattr(self, '__property_names'):
-            setattr(getattr(self, '__bravado_instance'), k, v)
-        else:
-            super().__setattr__(k, v)
-
-
     def __getattr__(self, k):
-        # NOTE: overriding __getattr__ is tricky since we need __property_names early,
-        # and getattr() is used by hasattr() to check if an attribute exists
-        if k.endswith('__property_names'):
-            return getattr(self, '__property_names')
-        elif k in getattr(self, '__property_names'):
-            return getattr(getattr(self, '__bravado_instance'), k)
-        elif k not in dir(self):
-            raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
-        else:
-            return getattr(self, k)
+        raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
 
 
-    def __delattr__(self, k):
-        if k in getattr(self, '__property_names'):
-            delattr(getattr(self, '__bravado_instance'), k)
-        else:
-            super().__delattr__(k)
+    def __dir__(self):
+        # Properties are not attributes of the PyMacaron instance
+        cls = type(self)
+        return [k for k in super().__dir__() if not isinstance(getattr(cls, k, None), _ModelProperty)]
 
 
     def __getitem__(self, k):
-        if k not in getattr(self, '__property_names'):
+        if k not in getattr(self, '__property_set'):
             raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
-        return getattr(getattr(self, '__bravado_instance'), k)
+        d = getattr(self, '__bravado_instance')._Model__dict
+        try:
+            v = d[k]
+        except KeyError:
+            raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
+        if isinstance(v, _Pending):
+            v = d[k] = v.resolve()
+        return v
 
 
     def __setitem__(self, k, v):
-        if k not in getattr(self, '__property_names'):
+        if k not in getattr(self, '__property_set'):
             raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
-        setattr(getattr(self, '__bravado_instance'), k, v)
+        getattr(self, '__bravado_instance')._Model__dict[k] = v
 
 
     def __delitem__(self, k):
-        if k not in getattr(self, '__property_names'):
+        if k not in getattr(self, '__property_set'):
             raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
         delattr(getattr(self, '__bravado_instance'), k)
 
@@ -88,6 +155,8 @@ class PyMacaronModel(object):
     def __eq__(self, other):
         if type(self) is not type(other):
             return False
+        if '__pending' in self.__dict__ or '__pending' in other.__dict__:
+            return dict(self._pym_items()) == dict(other._pym_items())
         return getattr(self, '__bravado_instance') == getattr(other, '__bravado_instance')
 
 
@@ -117,10 +186,42 @@ class PyMacaronModel(object):
                 setattr(getattr(self, '__bravado_instance'), k, v)
 
 
-    def clone(self):
-        """Return a clone of self"""
-        j = self.to_json()
-        return self.__class__.from_json(j)
+    def clone(self, copy_on_write=False):
+        """Return a clone of self.
+
+        Nested models, lists and dicts are copied, while immutable values
+        (strings, numbers, dates...) are shared between self and the clone.
+
+        If copy_on_write is True, nested models, lists and dicts are not copied
+        right away but shared between self and the clone until either of them
+        accesses them, at which point it gets its own copy. Cloning a large
+        model of which only a few parts are then modified is much cheaper this
+        way.
+        """
+        if not copy_on_write:
+            values = {}
+            for k, v in self._pym_items(lazy=True):
+                values[k] = v if type(v) in _IMMUTABLE_TYPES else _clone_value(v)
+            o = type(self)._pym_from_values(values)
+            if '__pending' in self.__dict__:
+                setattr(o, '__pending', True)
+            return o
+
+        # Replace the mutable values of self with placeholders that the clone
+        # shares
+        d = getattr(self, '__bravado_instance')._Model__dict
+        values = {}
+        for k, v in d.items():
+            if type(v) not in _IMMUTABLE_TYPES:
+                if type(v) is not _Shared:
+                    v = d[k] = _Shared(v)
+                v.holders += 1
+            values[k] = v
+
+        o = type(self)._pym_from_values(values)
+        setattr(self, '__pending', True)
+        setattr(o, '__pending', True)
+        return o
 
     #
     # JSON marshal/unmarshal
@@ -134,23 +235,37 @@ class PyMacaronModel(object):
         log.debug("Marshalling %s into json" % getattr(self, '__model_name'))
         datetimes = {}
         if keep_datetime:
-            for k in self.__property_names:
-                if hasattr(self, k) and getattr(self, k).__class__.__name__ in ('datetime', 'DatetimeWithNanoseconds'):
-                    datetimes[k] = getattr(self, k)
-        j = marshal_schema_object(
-            getattr(self, '__swagger_spec'),
-            getattr(self, '__swagger_dict'),
-            self.to_bravado(),
-        )
+            for k, v in self._pym_items(lazy=True):
+                if v.__class__.__name__ in ('datetime', 'DatetimeWithNanoseconds'):
+                    datetimes[k] = v
+        marshaller = getattr(self, '__marshaller')
+        if marshaller:
+            j = marshaller(self)
+        else:
+            j = marshal_schema_object(
+                getattr(self, '__swagger_spec'),
+                getattr(self, '__swagger_dict'),
+                self.to_bravado(copy=False),
+            )
         if datetimes:
             j.update(datetimes)
         return j
 
 
     @classmethod
-    def from_json(cls, j, keep_datetime=False):
-        """Take a json dictionary and return a model instance"""
+    def from_json(cls, j, keep_datetime=False, lazy=False):
+        """Take a json dictionary and return a model instance.
+
+        If lazy is True, nested objects and arrays are kept as raw json until
+        first accessed, at which point they are validated against their schema
+        and unmarshalled. to_json() returns the raw json of those never
+        accessed as is.
+        """
         log.debug("Unmarshalling json into %s" % getattr(cls, '__model_name'))
+        unmarshaller = getattr(cls, '__unmarshaller')
+        if unmarshaller and is_dict_like(j):
+            return unmarshaller(j, keep_datetime, lazy)
+
         datetimes = {}
         if keep_datetime:
             for k in list(j.keys()):
@@ -168,66 +283,952 @@ class PyMacaronModel(object):
             for k in datetimes:
                 setattr(m, k, datetimes[k])
 
-        return cls.from_bravado(m)
+        return cls.from_bravado(m, copy=False)
+
+
+    @classmethod
+    def to_json_many(cls, objects, keep_datetime=False):
+        """Take an iterable of instances of this model and return a list of
+        their json representations. Schema lookups are done once for the whole
+        batch, and instances of other models fall back to their own to_json()."""
+        log.debug("Marshalling many %s into json" % getattr(cls, '__model_name'))
+        marshaller = getattr(cls, '__marshaller')
+        if not marshaller or keep_datetime:
+            return [o.to_json(keep_datetime=keep_datetime) for o in objects]
+        return [marshaller(o) if type(o) is cls else o.to_json() for o in objects]
+
+
+    @classmethod
+    def from_json_many(cls, js, keep_datetime=False, lazy=False):
+        """Take a list of json dictionaries and return a list of model instances"""
+        log.debug("Unmarshalling many json into %s" % getattr(cls, '__model_name'))
+        unmarshaller = getattr(cls, '__unmarshaller')
+        if not unmarshaller:
+            return [cls.from_json(j, keep_datetime=keep_datetime) for j in js]
+        return [
+            unmarshaller(j, keep_datetime, lazy) if type(j) is dict else cls.from_json(j, keep_datetime=keep_datetime)
+            for j in js
+        ]
 
 
     def get_model_name(self):
         """Return the name of the OpenAPI schema object describing this PyMacaron Model instance"""
         return getattr(self, '__model_name')
 
+    #
+    # Access to the storage of property values, which by default is the
+    # encapsulated bravado instance (see _SlotsStorage for the alternative)
+    #
+
+    def _pym_items(self, lazy=False):
+        """Return the (name, value) pairs of all properties held by self, in the
+        order in which they are marshalled. Values may be shared with other
+        models and should be treated as read-only. If lazy is True, values not
+        unmarshalled yet are returned as _Lazy placeholders."""
+        items = _get_bravado_items(getattr(self, '__bravado_instance'))
+        if '__pending' not in self.__dict__:
+            return items
+
+        d = getattr(self, '__bravado_instance')._Model__dict
+        values = []
+        for k, v in list(items):
+            if type(v) is _Shared:
+                v = v.value
+            elif type(v) is _Lazy and not lazy:
+                v = d[k] = v.resolve()
+            values.append((k, v))
+        return values
+
+
+    @classmethod
+    def _pym_from_values(cls, values):
+        """Return an instance of this model holding the property values in the
+        dict values, without copying them"""
+        o = cls.__new__(cls)
+        setattr(o, '__bravado_instance', _new_bravado_instance(getattr(cls, '__bravado_class'), values))
+        return o
+
     #
     # Methods to cast a PyMacaron Model to/from a Bravado Model
     #
 
-    def to_bravado(self):
-        """Return a pure Bravado Model representing self"""
+    def to_bravado(self, copy=True):
+        """Return a pure Bravado Model representing self.
+
+        By default, the returned instance is a deep copy of self that the caller
+        may modify at will. If copy is False, no copy is made: the encapsulated
+        bravado instance is handed out as is, or, if it contains nested PyMacaron
+        models, a shallow copy of it holding their bravado equivalents. Either
+        way, the returned instance shares its values with self and should be
+        treated as read-only, or self be discarded.
+        """
 
-        # Get internal Bravado instance and clone it
         o = getattr(self, '__bravado_instance')
-        o = deepcopy(o)
 
-        # Do the same recursively with every nested PyMacaron Model
-        for k in getattr(self, '__property_names'):
-            v = getattr(o, k)
-            if isinstance(v, PyMacaronModel):
-                setattr(o, k, v.to_bravado())
-            elif type(v) is list:
-                for i in range(len(v)):
-                    if isinstance(v[i], PyMacaronModel):
-                        v[i] = v[i].to_bravado()
+        # Cast nested PyMacaron Models to bravado, recursively, without copying
+        # anything else. Values pending resolution are never handed out.
+        items = self._pym_items()
+        values = dict(items) if '__pending' in self.__dict__ else None
+        for k, v in items:
+            w = _to_bravado_value(v)
+            if w is v:
+                continue
+            if values is None:
+                values = dict(items)
+            values[k] = w
+
+        if values is not None:
+            o = _new_bravado_instance(type(o), values)
+
+        if copy:
+            o = deepcopy(o)
         return o
 
 
     @classmethod
-    def from_bravado(cls, o):
-        """Take a bravado Model instance and return a PyMacaron Model instance"""
+    def from_bravado(cls, o, copy=True):
+        """Take a bravado Model instance and return a PyMacaron Model instance.
 
-        # Clone bravado instance and inject it into a matching PyMacaron model instance
-        o = deepcopy(o)
-        p = cls()
+        By default, the PyMacaron instance is built from a deep copy of o. If
+        copy is False, ownership of o moves into the returned PyMacaron instance:
+        o and its nested bravado models are converted in place and should not be
+        used by the caller anymore.
+        """
+
+        if copy:
+            o = deepcopy(o)
+
+        # Inject the bravado instance into a matching PyMacaron model instance
+        p = cls.__new__(cls)
         setattr(p, '__bravado_instance', o)
 
-        # Now cast from bravado to pymacaron models all the attributes of this model
-        for k in getattr(p, '__property_names'):
-            v = getattr(o, k)
-            if isinstance(v, bravado_core.model.Model):
-                cls = get_model(v.__class__.__name__)
-                setattr(o, k, cls.from_bravado(v))
-            elif type(v) is list:
-                for i in range(len(v)):
-                    if isinstance(v[i], bravado_core.model.Model):
-                        cls = get_model(v[i].__class__.__name__)
-                        v[i] = cls.from_bravado(v[i])
+        # Now cast from bravado to pymacaron models all the attributes of this
+        # model, in place
+        for k, v in list(_get_bravado_items(o)):
+            if _is_bravado_model(v) or type(v) is list:
+                o[k] = _from_bravado_value(v)
         return p
 
 
-def generate_model_class(name=None, bravado_class=None, swagger_dict=None, swagger_spec=None, parent_name=None, persist=None, properties={}):
+class _SlotsStorage(object):
+    """Mixin making a generated PyMacaron model store its property values in
+    __slots__ on the instance itself, instead of in an encapsulated bravado
+    instance. Bravado instances are then only created when calling to_bravado().
+
+    Additional properties (not defined in the model's schema but allowed by
+    bravado-core) are kept in a dict in the '_pym_additional' slot.
+    """
+
+    __slots__ = ()
+
+    __setattr__ = object.__setattr__
+
+
+    def __getattr__(self, k):
+        # Only called for attributes that are neither properties nor local
+        raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
+
+
+    def __delattr__(self, k):
+        # Like bravado-core: deleting a property sets it to None
+        if k in getattr(self, '__property_set'):
+            object.__setattr__(self, k, None)
+        else:
+            object.__delattr__(self, k)
+
+
+    def __getitem__(self, k):
+        if k not in getattr(self, '__property_set'):
+            raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
+        return object.__getattribute__(self, k)
+
+
+    def __setitem__(self, k, v):
+        if k not in getattr(self, '__property_set'):
+            raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
+        object.__setattr__(self, k, v)
+
+
+    def __delitem__(self, k):
+        if k not in getattr(self, '__property_set'):
+            raise AttributeError("Model '%s' has no attribute %s" % (getattr(self, '__model_name'), k))
+        object.__setattr__(self, k, None)
+
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return False
+        return dict(self._pym_items()) == dict(other._pym_items())
+
+
+    def __repr__(self):
+        # Same format as with a bravado instance
+        return 'PyMacaron:%s:%s(%s)' % (
+            getattr(self, '__model_name'),
+            getattr(self, '__model_name'),
+            ', '.join(['%s=%r' % (k, v) for k, v in sorted(self._pym_items())]),
+        )
+
+
+    def update_from_dict(self, d, ignore_none=False):
+        property_set = getattr(self, '__property_set')
+        for k, v in d.items():
+            if v is None and ignore_none:
+                pass
+            elif k in property_set:
+                object.__setattr__(self, k, v)
+            elif v is None:
+                if self._pym_additional:
+                    self._pym_additional.pop(k, None)
+            else:
+                if self._pym_additional is None:
+                    self._pym_additional = {}
+                self._pym_additional[k] = v
+
+
+    def _pym_items(self, lazy=False):
+        items = [(k, object.__getattribute__(self, k)) for k in getattr(self, '__property_names')]
+        if self._pym_additional:
+            items.extend(self._pym_additional.items())
+        return items
+
+
+    @classmethod
+    def _pym_from_values(cls, values):
+        o = cls.__new__(cls)
+        _set_slots(o, values)
+        return o
+
+
+    def clone(self, copy_on_write=False):
+        # Reads from slots cannot be intercepted to resolve shared values: always
+        # copy right away
+        return super().clone()
+
+
+    def to_bravado(self, copy=True):
+        values = {k: _to_bravado_value(v) for k, v in self._pym_items()}
+        o = _new_bravado_instance(getattr(self, '__bravado_class'), values)
+        if copy:
+            o = deepcopy(o)
+        return o
+
+
+    @classmethod
+    def from_bravado(cls, o, copy=True):
+        if copy:
+            o = deepcopy(o)
+        values = {}
+        for k, v in _get_bravado_items(o):
+            if _is_bravado_model(v) or type(v) is list:
+                v = _from_bravado_value(v)
+            values[k] = v
+        return cls._pym_from_values(values)
+
+
+class _ModelProperty(object):
+    """Data descriptor giving access to one property of a PyMacaron model whose
+    values are stored in an encapsulated bravado instance"""
+
+    __slots__ = ('name', )
+
+    def __init__(self, name):
+        self.name = name
+
+
+    def __get__(self, o, cls=None):
+        if o is None:
+            return self
+        try:
+            d = o.__dict__['__bravado_instance']._Model__dict
+            v = d[self.name]
+        except KeyError:
+            raise AttributeError("Model '%s' has no attribute %s" % (getattr(o, '__model_name'), self.name))
+        if isinstance(v, _Pending):
+            v = d[self.name] = v.resolve()
+        return v
+
+
+    def __set__(self, o, v):
+        o.__dict__['__bravado_instance']._Model__dict[self.name] = v
+
+
+    def __delete__(self, o):
+        # Like bravado-core: deleting a property sets it to None
+        o.__dict__['__bravado_instance']._Model__dict[self.name] = None
+
+
+class _ShadowedProperties(object):
+    """Mixin for generated PyMacaron models having properties with the same
+    name as an attribute of their parent classes (a method, typically). Those
+    properties get no descriptor: reading them as attributes returns the parent
+    class's attribute, but setting them still updates the bravado instance.
+    """
+
+    def __setattr__(self, k, v):
+        if k in getattr(self, '__shadowed_properties'):
+            setattr(getattr(self, '__bravado_instance'), k, v)
+        else:
+            super().__setattr__(k, v)
+
+
+    def __delattr__(self, k):
+        if k in getattr(self, '__shadowed_properties'):
+            delattr(getattr(self, '__bravado_instance'), k)
+        else:
+            super().__delattr__(k)
+
+
+class _CachedModelProperty(_ModelProperty):
+    """Data descriptor for properties of models caching their json: reading a
+    list, a dict or a value pending resolution hands out a value that the
+    caller may modify in place, so it invalidates the cached json"""
+
+    __slots__ = ()
+
+    def __get__(self, o, cls=None):
+        if o is None:
+            return self
+        try:
+            d = o.__dict__['__bravado_instance']._Model__dict
+            v = d[self.name]
+        except KeyError:
+            raise AttributeError("Model '%s' has no attribute %s" % (getattr(o, '__model_name'), self.name))
+        if type(v) in _MUTABLE_TYPES or isinstance(v, _Pending):
+            o._pym_invalidate_json()
+            if isinstance(v, _Pending):
+                v = d[self.name] = v.resolve()
+        return v
+
+
+class _CachedJson(object):
+    """Mixin for generated PyMacaron models caching the json returned by
+    to_json() until they, or one of their nested models, are modified.
+
+    Nested models are linked to the models holding them when those cache their
+    json, so that modifying a nested model invalidates the json cached by all
+    the models above it. Lists and dicts cannot tell when they are modified in
+    place: reading one out of a model invalidates that model's json instead.
+    """
+
+    def __setattr__(self, k, v):
+        if k in getattr(self, '__property_set'):
+            self._pym_invalidate_json()
+        super().__setattr__(k, v)
+
+
+    def __delattr__(self, k):
+        if k in getattr(self, '__property_set'):
+            self._pym_invalidate_json()
+        super().__delattr__(k)
+
+
+    def __getitem__(self, k):
+        if k in getattr(self, '__property_set'):
+            v = getattr(self, '__bravado_instance')._Model__dict.get(k)
+            if type(v) in _MUTABLE_TYPES or isinstance(v, _Pending):
+                self._pym_invalidate_json()
+        return super().__getitem__(k)
+
+
+    def __setitem__(self, k, v):
+        self._pym_invalidate_json()
+        super().__setitem__(k, v)
+
+
+    def __delitem__(self, k):
+        self._pym_invalidate_json()
+        super().__delitem__(k)
+
+
+    def __getstate__(self):
+        # Copies get neither the cached json nor the links to the models
+        # holding the original
+        d = dict(self.__dict__)
+        d.pop('__json', None)
+        d.pop('__json_holders', None)
+        return d
+
+
+    def update_from_dict(self, d, ignore_none=False):
+        self._pym_invalidate_json()
+        super().update_from_dict(d, ignore_none=ignore_none)
+
+
+    def to_json(self, keep_datetime=False):
+        if keep_datetime:
+            return super().to_json(keep_datetime=True)
+        d = self.__dict__
+        j = d.get('__json')
+        if j is None:
+            j = super().to_json()
+            if self._pym_link_nested():
+                d['__json'] = j
+        return j
+
+
+    def _pym_items(self, lazy=False):
+        if not lazy and '__pending' in self.__dict__:
+            # Values pending resolution are about to be replaced
+            self._pym_invalidate_json()
+        return super()._pym_items(lazy=lazy)
+
+
+    def _pym_link_nested(self):
+        """Link all the models nested in self to their holders, recursively, and
+        return True, or False if some of them cannot tell when they change"""
+        for _, v in self._pym_items(lazy=True):
+            if isinstance(v, PyMacaronModel):
+                if not _link_to_holder(v, self):
+                    return False
+            elif type(v) is list:
+                for i in v:
+                    if isinstance(i, PyMacaronModel) and not _link_to_holder(i, self):
+                        return False
+        return True
+
+
+    def _pym_invalidate_json(self):
+        """Drop the json cached by self and by the models holding it"""
+        d = self.__dict__
+        if '__json' not in d and '__json_holders' not in d:
+            return
+        d.pop('__json', None)
+        holders = d.pop('__json_holders', None)
+        if holders:
+            for r in holders:
+                o = r()
+                if o is not None:
+                    o._pym_invalidate_json()
+
+
+def _link_to_holder(o, holder):
+    """Register holder as a model to invalidate when the nested model o changes"""
+    if not isinstance(o, _CachedJson):
+        return False
+    holders = o.__dict__.get('__json_holders')
+    if holders is None:
+        o.__dict__['__json_holders'] = [weakref.ref(holder)]
+    else:
+        for r in holders:
+            if r() is holder:
+                # o and its nested models are unchanged since linked
+                return True
+        if len(holders) >= 8:
+            holders[:] = [r for r in holders if r() is not None]
+        holders.append(weakref.ref(holder))
+    return o._pym_link_nested()
+
+
+class _Pending(object):
+    """Base class of the placeholders for property values that are resolved when
+    first accessed, and then replace the placeholder in the model's storage"""
+
+    __slots__ = ()
+
+    def resolve(self):
+        raise NotImplementedError()
+
+
+class _Shared(_Pending):
+    """Placeholder for a nested model, list or dict shared by 'holders' models
+    after a copy-on-write clone. Each of them replaces the placeholder with the
+    value returned by resolve() when accessing it: all get a copy of the value,
+    except the last one, which gets the value itself."""
+
+    __slots__ = ('value', 'holders')
+
+    def __init__(self, value):
+        self.value = value
+        self.holders = 1
+
+
+    def resolve(self):
+        if self.holders > 1:
+            self.holders -= 1
+            return _clone_value(self.value, copy_on_write=True)
+        return self.value
+
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+class _Lazy(_Pending):
+    """Placeholder for the raw json of a nested object or array, validated and
+    unmarshalled on first access. The raw json is never modified, so the
+    placeholder may be shared by clones."""
+
+    __slots__ = ('raw', 'unmarshaller', 'swagger_spec', 'schema')
+
+    def __init__(self, raw, unmarshaller, swagger_spec, schema):
+        self.raw = raw
+        self.unmarshaller = unmarshaller
+        self.swagger_spec = swagger_spec
+        self.schema = schema
+
+
+    def resolve(self):
+        validate_schema_object(self.swagger_spec, self.schema, self.raw)
+        return self.unmarshaller(self.raw, True)
+
+
+    def __repr__(self):
+        return repr(self.raw)
+
+
+# Types of the property values that clones can share
+_IMMUTABLE_TYPES = frozenset([type(None), str, int, float, bool, bytes, Decimal, date, datetime, _Lazy])
+
+# Types of the property values that may be modified in place
+_MUTABLE_TYPES = frozenset([list, dict])
+
+
+def _clone_value(v, copy_on_write=False):
+    """Return a copy of a property value, sharing its immutable parts"""
+    t = type(v)
+    if t in _IMMUTABLE_TYPES:
+        return v
+    if t is list:
+        return [i if type(i) in _IMMUTABLE_TYPES else _clone_value(i, copy_on_write) for i in v]
+    if t is dict:
+        return {k: _clone_value(i, copy_on_write) for k, i in v.items()}
+    if isinstance(v, PyMacaronModel):
+        return v.clone(copy_on_write=copy_on_write)
+    return deepcopy(v)
+
+
+def _set_slots(o, values):
+    """Set the slots of a model instance using _SlotsStorage to the values in
+    the dict values, consuming it. Missing properties are set to None."""
+    for k in getattr(o, '__property_names'):
+        object.__setattr__(o, k, values.pop(k, None))
+
+    if values:
+        swagger_dict = getattr(o, '__swagger_dict')
+        if swagger_dict and swagger_dict.get('additionalProperties') is False:
+            raise AttributeError("Model {0} does not have attributes for: {1}".format(type(o), list(values)))
+    o._pym_additional = values or None
+
+
+def _can_use_slots(property_names, parents):
+    """Tell if all the properties of a model can be stored in slots, without
+    shadowing attributes of its parent classes"""
+    for k in property_names:
+        if not k.isidentifier() or keyword.iskeyword(k) or k.startswith('__') or k == '_pym_additional':
+            return False
+        if any(hasattr(p, k) for p in parents):
+            return False
+    return True
+
+
+#
+# Compiled marshalling: instead of letting bravado-core interpret the model's
+# schema on every call, walk it once when generating the model class and
+# build a function that only knows how to marshal that model
+#
+
+# Markers used by compiled marshallers
+_SKIP = object()
+_REQUIRED = object()
+_DEFAULT = object()
+_FALLBACK = object()
+
+
+def _get_bravado_items(o):
+    """Return the (name, value) pairs of the properties set on a bravado model instance"""
+    # bravado-core keeps property values in a name-mangled dict slot
+    return o._Model__dict.items()
+
+
+def _is_bravado_model(v):
+    """Tell if v is a bravado model instance"""
+    # Much faster than isinstance(v, Model), which goes through bravado-core's
+    # custom ModelMeta.__instancecheck__
+    return isinstance(type(v), bravado_core.model.ModelMeta)
+
+
+def _new_bravado_instance(bravado_class, values):
+    """Return an instance of bravado_class holding the dict values, without copying it"""
+    o = object.__new__(bravado_class)
+    object.__setattr__(o, '_Model__dict', values)
+    return o
+
+
+def _from_bravado_value(v):
+    """Take ownership of a bravado model, or a list of them, and cast it into its
+    PyMacaron equivalent"""
+    if _is_bravado_model(v):
+        return get_model(v.__class__.__name__).from_bravado(v, copy=False)
+    elif type(v) is list:
+        for i in range(len(v)):
+            if _is_bravado_model(v[i]):
+                v[i] = get_model(v[i].__class__.__name__).from_bravado(v[i], copy=False)
+    return v
+
+
+def _to_bravado_value(v):
+    """Return a read-only bravado equivalent of a PyMacaron Model, or a list of
+    them, without copying it"""
+    if isinstance(v, PyMacaronModel):
+        return v.to_bravado(copy=False)
+    elif type(v) is list and any(isinstance(i, PyMacaronModel) for i in v):
+        return [i.to_bravado(copy=False) if isinstance(i, PyMacaronModel) else i for i in v]
+    return v
+
+
+def _marshal_none(swagger_spec, schema, required):
+    """Return what bravado-core marshals a None property value of that schema
+    into: _SKIP if the property is omitted, _REQUIRED if marshalling should fail,
+    or the value to put in the json"""
+    schema = swagger_spec.deref(schema)
+    nullable = schema.get('x-nullable', False)
+    if not required and not nullable:
+        return _SKIP
+    if get_type_from_schema(swagger_spec, schema) is None:
+        return None
+    if 'default' in schema:
+        return schema['default']
+    if not required or nullable:
+        return None
+    return _REQUIRED
+
+
+def _compile_value_marshaller(swagger_spec, schema):
+    """Return a function marshalling a non-None value of the given schema, None
+    if the value is marshalled as is, or _FALLBACK if only bravado-core knows
+    how to marshal it"""
+    schema = swagger_spec.deref(schema)
+    t = get_type_from_schema(swagger_spec, schema)
+
+    if t is None or t == 'file':
+        return None
+
+    if t == 'object':
+        if bravado_core.model.MODEL_MARKER not in schema:
+            return _FALLBACK
+
+        def marshal_model(v):
+            cls = type(v)
+            marshaller = getattr(cls, '__marshaller', None)
+            if marshaller and getattr(cls, '__swagger_dict') is schema:
+                return marshaller(v)
+            return marshal_schema_object(swagger_spec, schema, _to_bravado_value(v))
+
+        return marshal_model
+
+    if t == 'array':
+        if 'items' not in schema:
+            return None
+        item_marshaller = _compile_value_marshaller(swagger_spec, schema['items'])
+        if item_marshaller is _FALLBACK:
+            return _FALLBACK
+        # Array items are nullable: None becomes the items' default, if any
+        item_schema = swagger_spec.deref(schema['items'])
+        item_none = None
+        if get_type_from_schema(swagger_spec, item_schema) is not None:
+            item_none = item_schema.get('default')
+
+        def marshal_array(v):
+            if not is_list_like(v):
+                raise SwaggerMappingError('Expected list like type for {0}:{1}'.format(type(v), v))
+            if item_marshaller is None:
+                return [item_none if i is None else i for i in v]
+            return [item_none if i is None else item_marshaller(i) for i in v]
+
+        return marshal_array
+
+    if t not in SWAGGER_PRIMITIVES:
+        return _FALLBACK
+
+    format_name = schema.get('format')
+    if format_name is None:
+        return None
+
+    swagger_format = swagger_spec.user_defined_formats.get(format_name) or DEFAULT_FORMATS.get(format_name)
+    if swagger_format is None:
+        # Let bravado-core warn about it
+        return _FALLBACK
+
+    def marshal_primitive(v):
+        try:
+            return swagger_format.to_wire(v)
+        except Exception as e:
+            raise SwaggerMappingError(
+                'Error while marshalling value={} to type={}/{}.'.format(v, t, swagger_format.format),
+                e,
+            )
+
+    return marshal_primitive
+
+
+def compile_marshaller(swagger_spec, swagger_dict):
+    """Return a function taking an instance of the PyMacaron model described by
+    swagger_dict and returning its json representation, exactly as bravado-core's
+    marshal_schema_object would, or None if the schema uses constructs (allOf,
+    discriminator, typed additionalProperties) that are left to bravado-core.
+
+    Properties whose schema cannot be compiled are marshalled one by one by
+    bravado-core.
+    """
+
+    if 'allOf' in swagger_dict or 'discriminator' in swagger_dict:
+        return None
+    if swagger_dict.get('additionalProperties', True) not in (True, False, {}):
+        return None
+
+    required = set(swagger_dict.get('required', []))
+    plan = {}
+    for name, schema in swagger_dict.get('properties', {}).items():
+        marshaller = _compile_value_marshaller(swagger_spec, schema)
+        if marshaller is _FALLBACK:
+            marshaller = _generate_fallback_marshaller(swagger_spec, schema)
+        plan[name] = (marshaller, _marshal_none(swagger_spec, schema, name in required), schema)
+
+    def marshal(o):
+        j = {}
+        for k, v in o._pym_items(lazy=True):
+            p = plan.get(k)
+            if p is None:
+                # An additional property
+                j[k] = v
+            elif v is None:
+                v = p[1]
+                if v is _SKIP:
+                    continue
+                if v is _REQUIRED:
+                    raise SwaggerMappingError('Spec {0} is a required value'.format(swagger_spec.deref(p[2])))
+                j[k] = v
+            elif p[0] is None:
+                j[k] = v
+            elif type(v) is _Lazy:
+                # Never accessed since unmarshalled: still valid as is
+                j[k] = v.raw
+            else:
+                j[k] = p[0](v)
+        return j
+
+    return marshal
+
+
+def _generate_fallback_marshaller(swagger_spec, schema):
+    def marshal_with_bravado(v):
+        return marshal_schema_object(swagger_spec, schema, _to_bravado_value(v))
+    return marshal_with_bravado
+
+
+#
+# Compiled unmarshalling: same idea as above, but unmarshalling json straight
+# into PyMacaron models, nested models included
+#
+
+def _unmarshal_none(swagger_spec, schema, nullable):
+    """Return what bravado-core unmarshals a None value of that schema into:
+    _REQUIRED if unmarshalling should fail, _DEFAULT if the schema's default
+    value should be unmarshalled instead, or None"""
+    schema = swagger_spec.deref(schema)
+    if get_type_from_schema(swagger_spec, schema) is None:
+        return None
+    if schema.get('default') is not None:
+        return _DEFAULT
+    if nullable or schema.get('x-nullable', False):
+        return None
+    return _REQUIRED
+
+
+def _compile_value_unmarshaller(swagger_spec, schema):
+    """Return a function unmarshalling a non-None json value of the given schema,
+    None if the value is kept as is, or _FALLBACK if only bravado-core knows how
+    to unmarshal it. Functions unmarshalling objects and arrays take a second
+    argument, lazy, telling whether nested models should be unmarshalled lazily
+    (see PyMacaronModel.from_json)."""
+    schema = swagger_spec.deref(schema)
+    t = get_type_from_schema(swagger_spec, schema)
+
+    if t is None or t == 'file':
+        return None
+
+    if t == 'object':
+        if bravado_core.model.MODEL_MARKER not in schema:
+            return _FALLBACK
+        model_name = schema[bravado_core.model.MODEL_MARKER]
+
+        def unmarshal_model(v, lazy=False):
+            cls = getattr(Models, model_name, None)
+            unmarshaller = getattr(cls, '__unmarshaller', None)
+            if unmarshaller and getattr(cls, '__swagger_dict') is schema and is_dict_like(v):
+                return unmarshaller(v, False, lazy)
+            return _from_bravado_value(unmarshal_schema_object(swagger_spec, schema, v))
+
+        return unmarshal_model
+
+    if t == 'array':
+        if 'items' not in schema:
+            return None
+        item_unmarshaller = _compile_value_unmarshaller(swagger_spec, schema['items'])
+        if item_unmarshaller is _FALLBACK:
+            return _FALLBACK
+        item_default = None
+        if _unmarshal_none(swagger_spec, schema['items'], True) is _DEFAULT:
+            item_default = swagger_spec.deref(schema['items'])['default']
+        item_nested = _is_nested(swagger_spec, schema['items'])
+
+        def unmarshal_array(v, lazy=False):
+            if not is_list_like(v):
+                raise SwaggerMappingError('Expected list like type for {0}:{1}'.format(type(v), v))
+            if item_unmarshaller is None:
+                return [item_default if i is None else i for i in v]
+            if item_nested and lazy:
+                return [
+                    (None if item_default is None else item_unmarshaller(item_default, lazy)) if i is None else item_unmarshaller(i, lazy)
+                    for i in v
+                ]
+            return [
+                (None if item_default is None else item_unmarshaller(item_default)) if i is None else item_unmarshaller(i)
+                for i in v
+            ]
+
+        return unmarshal_array
+
+    if t not in SWAGGER_PRIMITIVES:
+        return _FALLBACK
+
+    format_name = schema.get('format')
+    if format_name is None:
+        return None
+
+    swagger_format = swagger_spec.user_defined_formats.get(format_name) or DEFAULT_FORMATS.get(format_name)
+    if swagger_format is None:
+        return _FALLBACK
+
+    return swagger_format.to_python
+
+
+def _is_nested(swagger_spec, schema):
+    """Tell if values of that schema are json objects or arrays"""
+    return get_type_from_schema(swagger_spec, swagger_spec.deref(schema)) in ('object', 'array')
+
+
+def compile_unmarshaller(swagger_spec, swagger_dict, model_class):
+    """Return a function taking a json dict and returning an instance of
+    model_class, the PyMacaron model described by swagger_dict, with nested
+    models also unmarshalled into PyMacaron models. The result is the same as
+    that of bravado-core's unmarshal_model followed by from_bravado. Return
+    None if the schema uses constructs that are left to bravado-core.
+
+    The function's third argument, lazy, tells whether to leave the values of
+    nested objects and arrays as raw json until first accessed. Models stored
+    in slots cannot intercept reads and are always unmarshalled eagerly.
+
+    Properties whose schema cannot be compiled are unmarshalled one by one by
+    bravado-core.
+    """
+
+    if 'allOf' in swagger_dict or 'discriminator' in swagger_dict:
+        return None
+    if swagger_dict.get('additionalProperties', True) not in (True, False, {}):
+        return None
+
+    required = set(swagger_dict.get('required', []))
+    can_defer = not issubclass(model_class, _SlotsStorage)
+    plan = {}
+    for name, schema in swagger_dict.get('properties', {}).items():
+        unmarshaller = _compile_value_unmarshaller(swagger_spec, schema)
+        if unmarshaller is _FALLBACK:
+            unmarshaller = _generate_fallback_unmarshaller(swagger_spec, schema)
+        nullable = schema.get('x-nullable', False) or name not in required
+        defer = can_defer and unmarshaller is not None and _is_nested(swagger_spec, schema)
+        plan[name] = (unmarshaller, _unmarshal_none(swagger_spec, schema, nullable), schema, defer, swagger_spec.deref(schema))
+
+    # Like bravado-core, set missing properties to None
+    missing = {}
+    if swagger_spec.config['include_missing_properties']:
+        missing = dict.fromkeys(plan.keys())
+
+    def unmarshal(j, keep_datetime=False, lazy=False):
+        values = missing.copy()
+        deferred = False
+        for k, v in j.items():
+            p = plan.get(k)
+            if p is None:
+                # An additional property
+                values[k] = v
+            elif v is None:
+                v = p[1]
+                if v is _REQUIRED:
+                    raise SwaggerMappingError('Spec {0} is a required value'.format(swagger_spec.deref(p[2])))
+                if v is _DEFAULT:
+                    v = swagger_spec.deref(p[2])['default']
+                    if p[0] is not None:
+                        v = p[0](v)
+                values[k] = v
+            elif p[0] is None or (keep_datetime and v.__class__.__name__ in ('datetime', 'DatetimeWithNanoseconds')):
+                values[k] = v
+            elif lazy and p[3]:
+                values[k] = _Lazy(v, p[0], swagger_spec, p[4])
+                deferred = True
+            else:
+                values[k] = p[0](v)
+
+        o = model_class._pym_from_values(values)
+        if deferred:
+            setattr(o, '__pending', True)
+        return o
+
+    return unmarshal
+
+
+def get_lazy_unmarshaller(swagger_spec, schema):
+    """Return a function taking a json value of the given schema, a model or an
+    array of models, validating its top level only, and unmarshalling it into
+    PyMacaron models whose nested objects and arrays are left as raw json, to be
+    validated and unmarshalled on first access. Return None if those models
+    cannot be unmarshalled lazily.
+    """
+    schema = swagger_spec.deref(schema)
+    is_array = get_type_from_schema(swagger_spec, schema) == 'array'
+    if is_array:
+        schema = swagger_spec.deref(schema.get('items', {}))
+
+    cls = getattr(Models, schema.get(bravado_core.model.MODEL_MARKER, ''), None)
+    if not cls or getattr(cls, '__swagger_dict') is not schema or not getattr(cls, '__unmarshaller'):
+        return None
+    if issubclass(cls, _SlotsStorage):
+        return None
+
+    # Validate the model's properties, except nested objects and arrays
+    shallow = dict(schema)
+    shallow['properties'] = {
+        k: {} if _is_nested(swagger_spec, v) else v
+        for k, v in schema.get('properties', {}).items()
+    }
+    if is_array:
+        shallow = {'type': 'array', 'items': shallow}
+
+    def unmarshal_lazily(j):
+        validate_schema_object(swagger_spec, shallow, j)
+        if is_array:
+            return cls.from_json_many(j, lazy=True)
+        return cls.from_json(j, lazy=True)
+
+    return unmarshal_lazily
+
+
+def _generate_fallback_unmarshaller(swagger_spec, schema):
+    def unmarshal_with_bravado(v, lazy=False):
+        return _from_bravado_value(unmarshal_schema_object(swagger_spec, schema, v))
+    return unmarshal_with_bravado
+
+
+def generate_model_class(name=None, bravado_class=None, swagger_dict=None, swagger_spec=None, parent_name=None, persist=None, properties={}, slots=False, cache_json=False):
     """Dynamically generate a pymacaron.models.<model_name> class able to
     instantiate that model.
 
     :name: the model name, as in the swagger spec
     :parent_name: complete name (module path + class name) of a class that this model should inherit from.
     :param persist: name of a package or class that implements the 'load_from_db' and 'save_to_db' methods.
+    :param slots: if true, store property values in __slots__ on the model instances instead of in bravado instances.
+    :param cache_json: if true, instances cache the json returned by to_json() until modified. Ignored if slots is true.
     """
 
     if parent_name:
@@ -248,25 +1249,66 @@ def generate_model_class(name=None, bravado_class=None, swagger_dict=None, swagg
         persistence_class = get_function(persist)
         parents = parents + (persistence_class, )
 
+    # Compile the model's marshalling function
+    marshaller = None
+    if swagger_spec and swagger_dict:
+        marshaller = compile_marshaller(swagger_spec, swagger_dict)
+
     # Generate the instance's constructor
     def init(self, *args, **kwargs):
         self.__bravado_instance = bravado_class(*args, **kwargs)
 
+    attributes = {
+        '__init__': init,
+        '__model_name': name,
+        '__persistence_class__': persist,
+        '__property_names': list(properties.keys()),
+        '__property_set': frozenset(properties.keys()),
+        '__swagger_spec': swagger_spec,
+        '__swagger_dict': swagger_dict,
+        '__bravado_class': bravado_class,
+        '__marshaller': staticmethod(marshaller) if marshaller else None,
+        '__unmarshaller': None,
+    }
+
+    # Should property values be stored in slots?
+    if slots and not _can_use_slots(properties.keys(), parents):
+        log.info("Cannot store the properties of %s in slots: keeping them in a bravado instance" % name)
+        slots = False
+
+    if slots:
+        parents = (_SlotsStorage, ) + parents
+        attributes['__slots__'] = tuple(properties.keys()) + ('_pym_additional', )
+
+        def init_slots(self, **kwargs):
+            _set_slots(self, kwargs)
+
+        attributes['__init__'] = init_slots
+    else:
+        # Give access to each property through a descriptor, unless it would
+        # shadow an attribute of a parent class
+        descriptor_class = _CachedModelProperty if cache_json else _ModelProperty
+        shadowed = frozenset(k for k in properties.keys() if any(hasattr(p, k) for p in parents))
+        for k in properties.keys():
+            if k not in shadowed:
+                attributes[k] = descriptor_class(k)
+        if shadowed:
+            parents = (_ShadowedProperties, ) + parents
+            attributes['__shadowed_properties'] = shadowed
+        if cache_json:
+            parents = (_CachedJson, ) + parents
+
     # And generate the model's class
-    o = type(
-        name,
-        parents,
-        {
-            '__init__': init,
-            '__model_name': name,
-            '__persistence_class__': persist,
-            '__property_names': list(properties.keys()),
-            '__swagger_spec': swagger_spec,
-            '__swagger_dict': swagger_dict,
-        },
-    )
+    o = type(name, parents, attributes)
+
+    # Compile the model's unmarshalling function, now that we have its class
+    if swagger_spec and swagger_dict:
+        unmarshaller = compile_unmarshaller(swagger_spec, swagger_dict, o)
+        if unmarshaller:
+            setattr(o, '__unmarshaller', staticmethod(unmarshaller))
 
     # And remember the mapping between this bravado model and its pymacaron model
     setattr(Models, name, o)
+    _model_factories.pop(name, None)
 
     return o
@@ -1,9 +1,14 @@
-import yaml
+import os
 import logging
-from pymacaron_core.swagger.server import spawn_server_api
 from pymacaron_core.swagger.client import generate_client_callers
 from pymacaron_core.swagger.spec import ApiSpec
+from pymacaron_core.swagger.spec import get_bravado_config
+from pymacaron_core.swagger.metrics import ClientMetrics
+from pymacaron_core.swagger import speccache
 from pymacaron_core.models import get_model
+from pymacaron_core.models import register_model_loader
+from pymacaron_core.models import unregister_model_loader
+from pymacaron_core.models import models_lock
 
 
 log = logging.getLogger(__name__)
@@ -21,6 +26,45 @@ class APIModels():
     pass
 
 
+class LazyAPIClient(APIClient):
+    """APIClient of an api loaded lazily, generating each client method on first
+    access to it. If is_async is true, client methods are coroutines."""
+
+    def __init__(self, api, app=None, is_async=False):
+        self._api = api
+        self._app = app
+        self._is_async = is_async
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._is_async:
+            self._api._generate_async_client_callers(self._app, handler_client=name)
+        else:
+            self._api._generate_client_callers(self._app, handler_client=name)
+        if name not in self.__dict__:
+            raise AttributeError("API %s has no client method %s" % (self._api.name, name))
+        return self.__dict__[name]
+
+
+class LazyAPIModels(APIModels):
+    """APIModels of an api loaded lazily, generating each model class on first
+    access to it"""
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        api_spec = self._api.api_spec
+        if name not in api_spec.definitions:
+            raise AttributeError("API %s has no model %s" % (self._api.name, name))
+        cls = api_spec.get_model_class(name)
+        setattr(self, name, cls)
+        return cls
+
+
 def default_error_callback(e):
     """The default callback for handling exceptions caught in the client and server stubs:
     just raise the exception."""
@@ -42,7 +86,7 @@ class API():
     usage: See apipool.py
     """
 
-    def __init__(self, name, yaml_str=None, yaml_path=None, timeout=10, error_callback=None, formats=None, do_persist=True, host=None, port=None, local=False, proto=None, verify_ssl=True):
+    def __init__(self, name, yaml_str=None, yaml_path=None, timeout=10, error_callback=None, formats=None, do_persist=True, host=None, port=None, local=False, proto=None, verify_ssl=True, slots=False, lazy=False, cache_json=False, json_codec=None, spec_cache_dir=None, lazy_load=False, pool_size=None, pool_max_connections=None, pool_keep_alive=True, retry_policy=None, client_cache=None, coalesce=False, hedge=None, local_dispatch=False, metrics=False, load_balancing=None):
         """An API Specification"""
 
         self.name = name
@@ -53,74 +97,254 @@ class API():
 
         # Callback to handle exceptions
         self.error_callback = default_error_callback
+        if error_callback:
+            self.error_callback = error_callback
 
         # Flag: true if this api has spawned_api
         self.is_server = False
         self.app = None
 
+        self.client_timeout = timeout
+
+        if not yaml_path and not yaml_str:
+            raise Exception("No swagger file specified")
+
+        self._yaml_str = yaml_str
+        self._yaml_path = yaml_path
+        self._spec_options = (formats, host, port, proto, verify_ssl, lazy, json_codec)
+        self._pool_options = {'pool_size': pool_size, 'pool_max_connections': pool_max_connections, 'pool_keep_alive': pool_keep_alive}
+        self._retry_policy = retry_policy
+        self._client_cache = client_cache
+        self._coalesce = coalesce
+        self._hedge = hedge
+        self._local_dispatch = local_dispatch
+        self._load_balancing = load_balancing
+
+        # Registry of the measurements of this api's client calls, if enabled
+        self.metrics = ClientMetrics(name) if metrics else None
+        self._model_options = {'do_persist': do_persist, 'slots': slots, 'cache_json': cache_json}
+        self._spec_cache_dir = spec_cache_dir
+        self._api_spec = None
+
+        # Should the swagger spec only be loaded, and model classes and client
+        # callers only be generated, on first access to them?
+        self.lazy_load = lazy_load
+
+        # Object holding coroutines calling the API, generated on first access
+        # to each of them, so that processes not using them do not pay for them
+        self.async_client = LazyAPIClient(self, is_async=True)
+
+        if lazy_load:
+            self.client = LazyAPIClient(self)
+            self.model = LazyAPIModels(self)
+            # Other apis may need our models before anything accessed this api
+            register_model_loader(self._load_spec)
+            return
+
         # Object holding the client side code to call the API
         self.client = APIClient()
 
         # Object holding constructors for the API's objects
         self.model = APIModels()
 
-        self.client_timeout = timeout
+        self._load_spec()
 
-        # Support versions of PyYAML with and without Loader
-        import pkg_resources
-        v = pkg_resources.get_distribution("PyYAML").version
-        yamlkwargs = {}
-        if v > '3.15':
-            yamlkwargs['Loader'] = yaml.FullLoader
-
-        if yaml_path:
-            log.info("Loading swagger file at %s" % yaml_path)
-            swagger_dict = yaml.load(open(yaml_path), **yamlkwargs)
-        elif yaml_str:
-            swagger_dict = yaml.load(yaml_str, **yamlkwargs)
-        else:
-            raise Exception("No swagger file specified")
+        # Auto-generate client callers, so a developer may write:
+        # 'ApiPool.<api_name>.call.login(param)' to call the login endpoint
+        self._generate_client_callers()
+
+
+    @property
+    def api_spec(self):
+        """The ApiSpec of this API, loaded on first access if the api is loaded lazily"""
+        if not self._api_spec:
+            self._load_spec()
+        return self._api_spec
+
+
+    def _load_spec(self):
+        """Load the swagger spec, once even if several threads need it at once"""
+        with models_lock:
+            unregister_model_loader(self._load_spec)
+            if not self._api_spec:
+                self._do_load_spec()
+
+
+    def _do_load_spec(self):
+        yaml_str = self._yaml_str
+        if self._yaml_path:
+            log.info("Loading swagger file at %s" % self._yaml_path)
+            with open(self._yaml_path) as f:
+                yaml_str = f.read()
+
+        formats = self._spec_options[0]
 
-        self.api_spec = ApiSpec(swagger_dict, formats, host, port, proto, verify_ssl)
+        # Is the parsed and resolved swagger spec cached on disk?
+        spec_cache_dir = self._spec_cache_dir
+        if not spec_cache_dir:
+            spec_cache_dir = os.environ.get('PYM_SPEC_CACHE_DIR', None)
 
-        model_names = self.api_spec.load_models(do_persist=do_persist)
+        swagger_dict, spec, cache_key = None, None, None
+        if spec_cache_dir:
+            cache_key = speccache.get_cache_key(yaml_str, get_bravado_config(formats))
+            swagger_dict, spec = speccache.load_spec(spec_cache_dir, cache_key, get_bravado_config(formats))
+
+        if not spec:
+            swagger_dict = speccache.load_yaml(yaml_str)
+
+        api_spec = ApiSpec(swagger_dict, *self._spec_options, spec=spec, retry_policy=self._retry_policy, client_cache=self._client_cache, coalesce=self._coalesce, hedge=self._hedge, local_dispatch=self._local_dispatch, metrics=self.metrics, load_balancing=self._load_balancing, **self._pool_options)
+
+        if spec_cache_dir and not spec:
+            speccache.save_spec(spec_cache_dir, cache_key, swagger_dict, api_spec.spec)
+
+        # Only expose the spec to other threads once its models are registered
+        model_names = api_spec.load_models(defer=self.lazy_load, **self._model_options)
+        self._api_spec = api_spec
+
+        if self.lazy_load:
+            return
 
         # Add aliases to all models into self.model, so a developer may write:
         # 'ApiPool.<api_name>.model.<model_name>(*args)' to instantiate a model
         for model_name in model_names:
             setattr(self.model, model_name, get_model(model_name))
 
-        if error_callback:
-            self.error_callback = error_callback
 
-        # Auto-generate client callers, so a developer may write:
-        # 'ApiPool.<api_name>.call.login(param)' to call the login endpoint
-        self._generate_client_callers()
+    def _generate_client_callers(self, app=None, handler_client=None):
+        # If app is defined, we are doing local calls
+        if app:
+            callers_dict = generate_client_callers(self.api_spec, self.client_timeout, self.error_callback, True, app, handler_client)
+        else:
+            callers_dict = generate_client_callers(self.api_spec, self.client_timeout, self.error_callback, False, None, handler_client)
+
+        for method, caller in list(callers_dict.items()):
+            setattr(self.client, method, caller)
+
 
+    def _generate_async_client_callers(self, app=None, handler_client=None):
+        # Only processes using async clients need aiohttp
+        from pymacaron_core.swagger.asyncclient import generate_async_client_callers
 
-    def _generate_client_callers(self, app=None):
         # If app is defined, we are doing local calls
         if app:
-            callers_dict = generate_client_callers(self.api_spec, self.client_timeout, self.error_callback, True, app)
+            callers_dict = generate_async_client_callers(self.api_spec, self.client_timeout, self.error_callback, True, app, handler_client)
         else:
-            callers_dict = generate_client_callers(self.api_spec, self.client_timeout, self.error_callback, False, None)
+            callers_dict = generate_async_client_callers(self.api_spec, self.client_timeout, self.error_callback, False, None, handler_client)
 
         for method, caller in list(callers_dict.items()):
-            setattr(self.client, method, caller)
+            setattr(self.async_client, method, caller)
+
+
+    async def close_async_client(self):
+        """Close the connections of the async client opened by the current
+        event loop"""
+        if self._api_spec and self._api_spec.async_http_pool:
+            await self._api_spec.async_http_pool.close()
+
+
+    def preload(self):
+        """Generate all the model classes and client callers of an api loaded
+        lazily, which otherwise happens on first access to each of them"""
+        if not self.lazy_load:
+            return
+        for model_name in self.api_spec.definitions:
+            getattr(self.model, model_name)
+        self._generate_client_callers(self.client._app)
 
 
     def spawn_api(self, app, decorator=None):
         """Auto-generate server endpoints implementing the API into this Flask app"""
+        # Only processes serving apis need flask
+        from pymacaron_core.swagger.server import spawn_server_api
+
         if decorator:
             assert type(decorator).__name__ == 'function'
         self.is_server = True
         self.app = app
 
+        spawn_server_api(self.name, app, self.api_spec, self.error_callback, decorator)
+
         if self.local:
-            # Re-generate client callers, this time as local and passing them the app
-            self._generate_client_callers(app)
+            # Re-generate client callers, this time as local and passing them
+            # the app (and calling the handlers bound above directly, if
+            # local_dispatch is set)
+            if self.lazy_load:
+                self.client = LazyAPIClient(self, app)
+            else:
+                self._generate_client_callers(app)
+            self.async_client = LazyAPIClient(self, app, is_async=True)
+
+
+    def get_pool_stats(self):
+        """Return statistics about the pooled connections of this api's client
+        (see HttpPool.stats), or None if it does not pool connections"""
+        if not self._api_spec or not self._api_spec.http_pool:
+            return None
+        return self._api_spec.http_pool.stats()
+
+
+    def get_retry_stats(self):
+        """Return the counters of the retry policies of this api's client (see
+        RetryPolicy), or None if it has none"""
+        if not self._api_spec:
+            return None
+        return self._api_spec.get_retry_stats()
 
-        return spawn_server_api(self.name, app, self.api_spec, self.error_callback, decorator)
+
+    def get_cache_stats(self):
+        """Return statistics about the cached results of this api's client calls
+        (see ResponseCache.stats), or None if it caches none"""
+        if not self._api_spec or not self._api_spec.response_cache:
+            return None
+        return self._api_spec.response_cache.stats()
+
+
+    def clear_client_cache(self):
+        """Drop all the cached results of this api's client calls"""
+        if self._api_spec and self._api_spec.response_cache:
+            self._api_spec.response_cache.clear()
+
+
+    def get_coalesce_stats(self):
+        """Return the number of client calls and of calls coalesced into
+        identical calls in progress (see SingleFlight), or None if this api
+        coalesces none"""
+        if not self._api_spec or not self._api_spec.single_flight:
+            return None
+        return self._api_spec.single_flight.stats()
+
+
+    def get_hedge_stats(self):
+        """Return a dict mapping the client methods of this api whose requests
+        are hedged to statistics about their hedging (see Hedge), or None if
+        none are"""
+        if not self._api_spec or not self._api_spec.hedges:
+            return None
+        return {name: hedge.stats() for name, hedge in list(self._api_spec.hedges.items())}
+
+
+    def get_balancer_stats(self):
+        """Return a dict mapping the hosts this api's client calls are spread
+        over to statistics about their requests (see LoadBalancer), or None if
+        it calls a single host"""
+        if not self._api_spec or not self._api_spec.balancer:
+            return None
+        return self._api_spec.balancer.stats()
+
+
+    def get_client_metrics(self):
+        """Return a dict mapping the client methods of this api called so far
+        to the measurements of their calls (see ClientMetrics.snapshot), or None
+        if this api records no metrics"""
+        if not self.metrics:
+            return None
+        return self.metrics.snapshot()
+
+
+    def reset_client_metrics(self):
+        """Forget the measurements of this api's client calls so far"""
+        if self.metrics:
+            self.metrics.reset()
 
 
     def get_version(self):
@@ -139,3 +363,16 @@ class API():
             self.api_spec.validate(model_name, j)
         o = getattr(self.model, model_name)
         return o.from_json(j, keep_datetime=keep_datetime)
+
+
+    def models_to_json(self, objects):
+        """Take a list of model instances and return a list of json structs"""
+        return self.api_spec.models_to_json(objects)
+
+
+    def json_to_models(self, model_name, js, validate=False, keep_datetime=False):
+        """Take a list of json structs and a model name, and return a list of model instances"""
+        if validate:
+            self.api_spec.validate_many(model_name, js)
+        o = getattr(self.model, model_name)
+        return o.from_json_many(js, keep_datetime=keep_datetime)
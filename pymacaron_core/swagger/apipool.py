@@ -2,6 +2,8 @@ import pprint
 import logging
 import copy
 from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger.fanout import gather
+from pymacaron_core.swagger.metrics import format_prometheus
 from pymacaron_core.exceptions import MergeApisException
 
 
@@ -37,6 +39,54 @@ class ApiPool():
     Where result is an instance of the model returned by the endpoint
     bound to 'server_method' according to the 'x-bind-client' key in
     the YAML file.
+
+    To defer loading the YAML spec until the api is first used, and generating
+    each model class and client method until it is first accessed:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', lazy_load=True)
+
+    And to generate them all at once, for example before forking workers:
+      ApiPool.preload()
+
+    To make client calls concurrently:
+      users = ApiPool.gather(lambda: api.client.get_user(id='1'), lambda: api.client.get_user(id='2'))
+      users = api.client.get_user.map([{'id': '1'}, {'id': '2'}], concurrency=2)
+
+    To keep up to 20 connections per host alive between client calls:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', pool_size=20)
+      stats = ApiPool.get_pool_stats()
+
+    To retry failed client calls with exponential backoff, within a retry
+    budget, and stop calling hosts that keep failing:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', retry_policy={'max_attempts': 4})
+      stats = ApiPool.get_retry_stats()
+
+    To cache the results of GET calls for 30 seconds:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', client_cache={'ttl': 30})
+      stats = ApiPool.get_cache_stats()
+
+    To have concurrent identical GET calls share one call:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', coalesce=True)
+      stats = ApiPool.get_coalesce_stats()
+
+    To send GET requests a second time if not answered after the 95th
+    percentile of their latency, and use whichever response comes first:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', hedge={'percentile': 95})
+      stats = ApiPool.get_hedge_stats()
+
+    To have local client calls to an api served by the same flask app call its
+    handlers directly, without encoding anything to json:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', local=True, local_dispatch=True)
+
+    To record the timing, status codes, retries and payload sizes of client
+    calls, and export them in prometheus' text format:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', metrics=True)
+      metrics = ApiPool.get_client_metrics()
+      text = ApiPool.format_client_metrics()
+
+    To spread client calls over several hosts, sending each to the host with
+    the fewest calls in progress, and stop calling hosts that keep failing:
+      api = ApiPool.add('myapi', yaml_path='my-api.yaml', host=['10.0.0.1', '10.0.0.2:8080'])
+      stats = ApiPool.get_balancer_stats()
     """
 
     @classmethod
@@ -47,6 +97,102 @@ class ApiPool():
         setattr(ApiPool, name, api)
         return api
 
+    @classmethod
+    def preload(self):
+        """Load the specs, model classes and client callers of all apis added
+        with lazy_load=True"""
+        for api in list(apis.values()):
+            api.preload()
+
+    @classmethod
+    def gather(self, *calls, concurrency=None, return_exceptions=False):
+        """Make client calls concurrently and return their results (see
+        fanout.gather)"""
+        return gather(*calls, concurrency=concurrency, return_exceptions=return_exceptions)
+
+    @classmethod
+    def get_pool_stats(self):
+        """Return a dict mapping the names of apis whose client pools connections
+        to statistics about their pools"""
+        stats = {}
+        for name, api in list(apis.items()):
+            s = api.get_pool_stats()
+            if s:
+                stats[name] = s
+        return stats
+
+    @classmethod
+    def get_retry_stats(self):
+        """Return a dict mapping the names of apis with a retry policy to the
+        counters of their policies"""
+        stats = {}
+        for name, api in list(apis.items()):
+            s = api.get_retry_stats()
+            if s:
+                stats[name] = s
+        return stats
+
+    @classmethod
+    def get_cache_stats(self):
+        """Return a dict mapping the names of apis caching the results of client
+        calls to statistics about their caches"""
+        stats = {}
+        for name, api in list(apis.items()):
+            s = api.get_cache_stats()
+            if s:
+                stats[name] = s
+        return stats
+
+    @classmethod
+    def get_coalesce_stats(self):
+        """Return a dict mapping the names of apis coalescing identical client
+        calls to their numbers of calls and coalesced calls"""
+        stats = {}
+        for name, api in list(apis.items()):
+            s = api.get_coalesce_stats()
+            if s:
+                stats[name] = s
+        return stats
+
+    @classmethod
+    def get_hedge_stats(self):
+        """Return a dict mapping the names of apis hedging requests to
+        statistics about the hedging of each of their client methods"""
+        stats = {}
+        for name, api in list(apis.items()):
+            s = api.get_hedge_stats()
+            if s:
+                stats[name] = s
+        return stats
+
+    @classmethod
+    def get_balancer_stats(self):
+        """Return a dict mapping the names of apis spreading client calls over
+        several hosts to statistics about the requests to each host"""
+        stats = {}
+        for name, api in list(apis.items()):
+            s = api.get_balancer_stats()
+            if s:
+                stats[name] = s
+        return stats
+
+    @classmethod
+    def get_client_metrics(self):
+        """Return a dict mapping the names of apis recording metrics to the
+        measurements of the calls of each of their client methods"""
+        metrics = {}
+        for name, api in list(apis.items()):
+            m = api.get_client_metrics()
+            if m is not None:
+                metrics[name] = m
+        return metrics
+
+    @classmethod
+    def format_client_metrics(self):
+        """Return the metrics of all apis recording them, in prometheus' text
+        format, to serve to a scraper"""
+        return format_prometheus(self.get_client_metrics())
+
     @property
     def current_server_name(self):
         names = []
@@ -0,0 +1,298 @@
+import json
+import time
+import asyncio
+import logging
+import weakref
+from datetime import timedelta
+from pymacaron_core.exceptions import PyMacaronCoreException, ValidationError
+from pymacaron_core.utils import get_function
+from pymacaron_core.models import get_lazy_unmarshaller
+from pymacaron_core.models import models_lock
+from pymacaron_core.swagger.client import _generate_client_caller
+from pymacaron_core.swagger.client import BaseClientCaller
+from pymacaron_core.swagger.client import _SEND, _SLEEP, _REFRESH
+from pymacaron_core.swagger.client import copy_call_context
+from pymacaron_core.swagger.client import set_call_context
+from pymacaron_core.swagger.client import _generate_request_arguments
+from pymacaron_core.swagger.urltemplate import UrlTemplate
+
+
+log = logging.getLogger(__name__)
+
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def generate_async_client_callers(spec, timeout, error_callback, local, app, handler_client=None):
+    """Return a dict mapping method names to coroutine functions that will
+    call the server's endpoint of the corresponding name, as the functions
+    returned by generate_client_callers do. If handler_client is set, only
+    generate the function of that name."""
+
+    callers_dict = {}
+
+    def mycallback(endpoint):
+        if not endpoint.handler_client:
+            return
+
+        callers_dict[endpoint.handler_client] = _generate_async_client_caller(spec, endpoint, timeout, error_callback, local, app)
+
+    spec.call_on_each_endpoint(mycallback, handler_client=handler_client)
+
+    return callers_dict
+
+
+def _generate_async_client_caller(spec, endpoint, timeout, error_callback, local, app):
+
+    # Local calls go through flask's test_client, which is synchronous
+    if local:
+        local_client = _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
+
+        # The executor's threads are not in the flask app context of this
+        # thread: pass them its call ID and call path
+        def run_local_client(context, args, kwargs):
+            set_call_context(context)
+            try:
+                return local_client(*args, **kwargs)
+            finally:
+                set_call_context(None)
+
+        async def async_local_client(*args, **kwargs):
+            context = copy_call_context()
+            return await asyncio.get_event_loop().run_in_executor(None, run_local_client, context, args, kwargs)
+
+        return async_local_client
+
+    url = "%s://%s:%s/%s" % (
+        spec.protocol,
+        spec.host,
+        spec.port,
+        endpoint.path.lstrip('/')
+    )
+
+    url_template = UrlTemplate(url, endpoint.operation.params.values())
+
+    method = endpoint.method.lower()
+    if method not in ('get', 'post', 'patch', 'put', 'delete'):
+        raise PyMacaronCoreException("BUG: method %s for %s is not supported. Only get and post are." %
+                                     (endpoint.method, endpoint.path))
+
+    lazy_unmarshaller = None
+    if endpoint.response_schema:
+        lazy_unmarshaller = get_lazy_unmarshaller(spec.spec, endpoint.response_schema)
+
+    if not spec.async_http_pool:
+        # Async callers may be generated by several threads at once, and
+        # must share the api's pool and its connection limits
+        with models_lock:
+            if not spec.async_http_pool:
+                spec.async_http_pool = AsyncHttpPool(spec.http_pool)
+
+    # The decorator receives a coroutine function with the signature of
+    # requests.<method>, and should return the result of calling it
+    requests_method = spec.async_http_pool.get_method(method)
+    if endpoint.decorate_request:
+        requests_method = get_function(endpoint.decorate_request)(requests_method)
+
+    retry_policy = spec.get_retry_policy(endpoint)
+    breaker = retry_policy.get_circuit_breaker("%s:%s" % (spec.host, spec.port)) if retry_policy and not spec.balancer else None
+    endpoint_cache = spec.get_endpoint_cache(endpoint)
+    single_flight = spec.get_single_flight(endpoint)
+    hedge = spec.get_hedge(endpoint)
+    metrics = spec.metrics
+
+    async def async_client(*args, **kwargs):
+        """Call the server endpoint and handle marshaling/unmarshaling of
+        parameters/result, as the synchronous client does"""
+
+        # Extract custom parameters from **kwargs
+        headers = {'Content-Type': 'application/json'}
+        max_attempts = kwargs.pop('max_attempts', None)
+        read_timeout = kwargs.pop('read_timeout', timeout)
+        connect_timeout = kwargs.pop('connect_timeout', timeout)
+        headers.update(kwargs.pop('request_headers', {}))
+        lazy = kwargs.pop('lazy', spec.lazy)
+
+        try:
+            if endpoint.decorate_request:
+                # Decorators get the query parameters in params, as requests
+                # methods do
+                custom_url, params = url_template.format_with_params(kwargs)
+            else:
+                custom_url, params = url_template.format(kwargs), None
+        except ValidationError as e:
+            # Some arguments were missing, or unknown
+            return error_callback(e)
+        data, headers = _generate_request_arguments(spec, endpoint, headers, args)
+
+        caller = AsyncClientCaller(requests_method, custom_url, data, params, headers, read_timeout, connect_timeout, endpoint.operation, endpoint.method, error_callback, max_attempts, spec.verify_ssl, lazy_unmarshaller if lazy else None, spec.codec, retry_policy, breaker, hedge, spec.balancer)
+        if metrics:
+            caller.record = metrics.start(endpoint.handler_client, endpoint.method)
+            return await metrics.measure_async(caller.record, lambda: _call(caller, single_flight, endpoint_cache, lazy))
+        return await _call(caller, single_flight, endpoint_cache, lazy)
+
+    return async_client
+
+
+async def _call(caller, single_flight, endpoint_cache, lazy):
+    """Same as client._call"""
+    def call():
+        return caller.run(caller.plan_call(endpoint_cache, lazy))
+    if single_flight:
+        return await single_flight.call_async(caller.get_flight_key(single_flight, lazy), call)
+    return await call()
+
+
+# Background refreshes of cached results in progress
+_refreshes = set()
+
+
+class ReadResponse():
+    """The status, headers and body of an aiohttp response, read in full and
+    exposed like those of a requests response"""
+
+    def __init__(self, status_code, headers, content, encoding, elapsed=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        # Time taken to get the response's headers, as in requests responses
+        self.elapsed = elapsed
+        self.text = content.decode(encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncHttpPool():
+    """The aiohttp sessions of an api, one per event loop, each keeping
+    connections to the server alive between calls. Honors the limits of the
+    api's HttpPool, if any."""
+
+    def __init__(self, http_pool=None):
+        self.http_pool = http_pool
+        self._sessions = weakref.WeakKeyDictionary()
+
+
+    def _get_session(self, loop):
+        session = self._sessions.get(loop)
+        if not session or session.closed:
+            if not aiohttp:
+                raise PyMacaronCoreException("Async clients require aiohttp (pip install aiohttp)")
+            pool = self.http_pool
+            connector = aiohttp.TCPConnector(
+                limit=0,
+                limit_per_host=(pool.max_connections or 0) if pool else 0,
+                force_close=bool(pool and not pool.keep_alive),
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = session
+        return session
+
+
+    async def request(self, method, url, data=None, params=None, headers=None, timeout=None, verify=True):
+        """Send a request and read its response, taking the arguments of
+        requests.request"""
+        session = self._get_session(asyncio.get_event_loop())
+
+        if params:
+            # Encode query parameters as requests does
+            query = []
+            for k, v in params.items():
+                for vv in (v if isinstance(v, (list, tuple)) else [v]):
+                    query.append((k, vv if isinstance(vv, str) else str(vv)))
+            params = query
+
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        t0 = time.perf_counter()
+        async with session.request(
+            method,
+            url,
+            data=data,
+            params=params,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            ssl=None if verify else False,
+        ) as response:
+            elapsed = timedelta(seconds=time.perf_counter() - t0)
+            content = await response.read()
+            return ReadResponse(response.status, response.headers, content, response.charset, elapsed)
+
+
+    def get_method(self, method):
+        """Return a coroutine function with the signature of requests.<method>"""
+        method = method.upper()
+
+        async def pooled_method(url, **kwargs):
+            return await self.request(method, url, **kwargs)
+
+        return pooled_method
+
+
+    async def close(self):
+        """Close the session of the current event loop"""
+        session = self._sessions.pop(asyncio.get_event_loop(), None)
+        if session:
+            await session.close()
+
+
+def _is_connect_timeout(e):
+    if isinstance(e, getattr(aiohttp, 'ConnectionTimeoutError', ())):
+        return True
+    return isinstance(e, aiohttp.ClientConnectorError) and isinstance(getattr(e, 'os_error', None), asyncio.TimeoutError)
+
+
+class AsyncClientCaller(BaseClientCaller):
+    """Make client calls with aiohttp, as ClientCaller does with requests"""
+
+    def _is_connect_timeout(self, e):
+        return _is_connect_timeout(e)
+
+    def _is_read_timeout(self, e):
+        return isinstance(e, asyncio.TimeoutError)
+
+    def _is_connection_error(self, e):
+        return isinstance(e, aiohttp.ClientConnectionError)
+
+    async def _send_once(self):
+        u, url = self._pick_host()
+        try:
+            response = await self._request(url)
+        except BaseException as e:
+            self._release_host(u, e)
+            raise
+        self._release_host(u, response)
+        return response
+
+    async def _send(self):
+        """Same as ClientCaller._send"""
+        return await (self.hedge.call_async(self._send_once) if self.hedge else self._send_once())
+
+    async def run(self, plan):
+        """Same as ClientCaller.run, refreshing cached results in a task"""
+        value, error = None, None
+        while True:
+            try:
+                action, arg = plan.throw(error) if error is not None else plan.send(value)
+            except StopIteration as e:
+                return e.value
+            value, error = None, None
+            try:
+                if action == _SEND:
+                    value = await self._send()
+                elif action == _SLEEP:
+                    await asyncio.sleep(arg)
+                elif action == _REFRESH:
+                    task = asyncio.ensure_future(self.run(arg))
+                    _refreshes.add(task)
+                    task.add_done_callback(_refreshes.discard)
+            except Exception as e:
+                error = e
+            except BaseException:
+                plan.close()
+                raise
+
+    async def call(self, force_retry=False):
+        return await self.run(self.plan_call(force_retry=force_retry))
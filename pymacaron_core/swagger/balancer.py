@@ -0,0 +1,182 @@
+import time
+import random
+import logging
+import threading
+from pymacaron_core.exceptions import PyMacaronCoreException
+
+
+log = logging.getLogger(__name__)
+
+
+class Upstream():
+    """One of the hosts of a load balanced api, and the state of the requests
+    sent to it"""
+
+    def __init__(self, host, port, protocol):
+        self.host = host
+        self.port = port
+        self.address = '%s:%s' % (host, port)
+        self.base_url = '%s://%s:%s' % (protocol, host, port)
+
+        # Requests sent and not answered yet
+        self.outstanding = 0
+
+        # Consecutive failed requests
+        self.failures = 0
+
+        # When the host may be probed again, if it is ejected, and whether a
+        # probe is in progress
+        self.ejected_until = 0
+        self.probing = False
+
+        self.counters = {
+            'requests': 0,
+            'failures': 0,
+            'ejections': 0,
+        }
+
+
+def is_host_list(host):
+    """Return True if host is a list of hosts, and not a single (host, port)
+    tuple: either a list, or a tuple of 'host', 'host:port' or (host, port)
+    entries"""
+    if isinstance(host, list):
+        return True
+    if not isinstance(host, tuple):
+        return False
+    return all(isinstance(h, str) or (isinstance(h, (list, tuple)) and len(h) == 2) for h in host)
+
+
+def parse_host(host, port):
+    """Return (host, port) given 'host', 'host:port' or a (host, port) tuple,
+    using port if the host has none"""
+    if isinstance(host, (list, tuple)):
+        host, port = host
+    elif ':' in host:
+        host, p = host.rsplit(':', 1)
+        port = int(p)
+    return host, int(port)
+
+
+class LoadBalancer():
+    """Spread the requests of an api over several hosts, and stop sending any
+    to hosts that keep failing:
+
+    - strategy: 'least_outstanding' sends each request to the host with the
+      fewest requests in progress, 'power_of_two' to the one with fewer
+      requests in progress of two hosts picked at random
+    - max_failures, eject_time: a host is ejected after that many consecutive
+      failed requests (connection errors, timeouts and 5xx responses), then
+      sent the first request made every eject_time seconds, until one succeeds
+
+    When all hosts are ejected, requests are spread over all of them anyway.
+    """
+
+    STRATEGIES = ('least_outstanding', 'power_of_two')
+
+    def __init__(self, hosts, port, protocol, strategy='least_outstanding', max_failures=5, eject_time=10):
+        if strategy not in self.STRATEGIES:
+            raise PyMacaronCoreException("Invalid load balancing strategy '%s' (should be one of %s)" % (strategy, ', '.join(self.STRATEGIES)))
+        if not hosts:
+            raise PyMacaronCoreException("No hosts to balance calls between")
+        assert max_failures >= 1
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.upstreams = [Upstream(h, p, protocol) for h, p in [parse_host(host, port) for host in hosts]]
+
+        # Urls are formatted with the first host, and moved to the host picked
+        # for each request (see get_url)
+        self.base_url = self.upstreams[0].base_url
+        self._lock = threading.Lock()
+
+
+    def _choose(self, candidates):
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == 'power_of_two':
+            a, b = random.sample(candidates, 2)
+            return b if b.outstanding < a.outstanding else a
+        least = min(u.outstanding for u in candidates)
+        return random.choice([u for u in candidates if u.outstanding == least])
+
+
+    def acquire(self, exclude=()):
+        """Pick the host of a request, preferring hosts not in exclude, as the
+        ones already tried by the call, and count the request as outstanding"""
+        now = time.time()
+        with self._lock:
+            available, tried = [], []
+            for u in self.upstreams:
+                if u.ejected_until and (u.probing or now < u.ejected_until):
+                    continue
+                (tried if u in exclude else available).append(u)
+
+            candidates = available or tried
+            if candidates:
+                # Hosts whose ejection is over are probed first
+                probes = [u for u in candidates if u.ejected_until]
+                u = self._choose(probes or candidates)
+                if u.ejected_until:
+                    # Let this request probe whether the host is back
+                    u.probing = True
+            else:
+                u = self._choose(self.upstreams)
+            u.outstanding += 1
+            u.counters['requests'] += 1
+            return u
+
+
+    def release(self, u, success):
+        """Record the end of a request to host u, successful or not, or None if
+        it was cancelled"""
+        with self._lock:
+            u.outstanding -= 1
+            if success is None:
+                u.probing = False
+                return
+
+            if success:
+                u.failures = 0
+                if u.ejected_until:
+                    log.info("Host %s is back: sending it requests again" % u.address)
+                    u.ejected_until = 0
+                    u.probing = False
+                return
+
+            u.failures += 1
+            u.counters['failures'] += 1
+            if u.probing or (not u.ejected_until and u.failures >= self.max_failures):
+                if not u.probing:
+                    log.warn("Ejecting host %s after %s failed requests" % (u.address, u.failures))
+                    u.counters['ejections'] += 1
+                u.ejected_until = time.time() + self.eject_time
+                u.probing = False
+
+
+    def get_url(self, u, url):
+        """Return url, formatted for the first host, moved to host u"""
+        if u.base_url == self.base_url:
+            return url
+        return u.base_url + url[len(self.base_url):]
+
+
+    def stats(self):
+        """Return a dict mapping the hosts to their numbers of outstanding
+        requests, requests, failed requests and ejections, and whether they are
+        ejected"""
+        with self._lock:
+            stats = {}
+            for u in self.upstreams:
+                s = dict(u.counters)
+                s['outstanding'] = u.outstanding
+                s['ejected'] = bool(u.ejected_until)
+                stats[u.address] = s
+            return stats
+
+
+def get_load_balancer(hosts, port, protocol, options=None):
+    """Return a LoadBalancer between hosts, given a dict of its options"""
+    if options is not None and not isinstance(options, dict):
+        raise PyMacaronCoreException("Invalid load balancing options: %s" % options)
+    return LoadBalancer(hosts, port, protocol, **(options or {}))
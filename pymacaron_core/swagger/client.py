@@ -2,30 +2,88 @@ import requests
 import pprint
 import jsonschema
 import json
+import sys
 import logging
+import functools
+import threading
 import time
+import types
 import urllib.request
 import urllib.parse
 import urllib.error
 from requests.exceptions import ReadTimeout, ConnectTimeout
 from pymacaron_core.exceptions import PyMacaronCoreException, ValidationError
 from pymacaron_core.utils import get_function
+from pymacaron_core.models import get_model
+from pymacaron_core.models import get_lazy_unmarshaller
+from pymacaron_core.swagger.urltemplate import UrlTemplate
 from bravado_core.response import unmarshal_response
+from bravado_core.response import IncomingResponse
+import bravado_core.model
 
 
 log = logging.getLogger(__name__)
 
 
-try:
-    from flask import _app_ctx_stack as stack
-except ImportError:
-    from flask import _request_ctx_stack as stack
+# Flask's stack of app contexts, imported on first use
+stack = None
 
 
-def generate_client_callers(spec, timeout, error_callback, local, app):
+def _get_flask_context():
+    """Return the current flask app context, or None. Client-only processes
+    never import flask, and are then never in a flask app context"""
+    global stack
+    if not stack:
+        if 'flask' not in sys.modules:
+            return None
+        try:
+            from flask import _app_ctx_stack as stack
+        except ImportError:
+            from flask import _request_ctx_stack as stack
+    return stack.top
+
+
+# Call ID and call path passed to threads making calls on behalf of a flask
+# request (see fanout.py)
+_thread_context = threading.local()
+
+
+def get_call_context():
+    """Return the object whose call_id and call_path attributes, if any, are
+    sent along client calls made by the current thread"""
+    context = getattr(_thread_context, 'context', None)
+    if context is not None:
+        return context
+    return _get_flask_context()
+
+
+def set_call_context(context):
+    """Make client calls of the current thread send the call_id and call_path
+    of context, instead of those of the current flask app context"""
+    _thread_context.context = context
+
+
+def copy_call_context():
+    """Return a copy of the call ID and call path of the current thread, to be
+    passed to set_call_context in another thread, or None if there are none"""
+    current = get_call_context()
+    if not hasattr(current, 'call_id') and not hasattr(current, 'call_path'):
+        return None
+    context = types.SimpleNamespace()
+    for k in ('call_id', 'call_path'):
+        if hasattr(current, k):
+            setattr(context, k, getattr(current, k))
+    return context
+
+
+def generate_client_callers(spec, timeout, error_callback, local, app, handler_client=None):
     """Return a dict mapping method names to anonymous functions that
     will call the server's endpoint of the corresponding name as
-    described in the api defined by the swagger dict and bravado spec"""
+    described in the api defined by the swagger dict and bravado spec.
+    If handler_client is set, only generate the function of that name."""
+
+    # fanout imports this module
+    from pymacaron_core.swagger.fanout import map_calls
 
     callers_dict = {}
 
@@ -33,46 +91,45 @@ def generate_client_callers(spec, timeout, error_callback, local, app):
         if not endpoint.handler_client:
             return
 
-        callers_dict[endpoint.handler_client] = _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
+        caller = _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
 
-    spec.call_on_each_endpoint(mycallback)
+        # Calling caller.map(iterable, concurrency=N) makes one call per item
+        # of iterable, concurrently
+        caller.map = functools.partial(map_calls, caller)
+
+        callers_dict[endpoint.handler_client] = caller
+
+    spec.call_on_each_endpoint(mycallback, handler_client=handler_client)
 
     return callers_dict
 
 
-def _generate_request_arguments(url, spec, endpoint, headers, args, kwargs):
-    # Prepare (g)requests arguments
+def _set_call_headers(headers):
+    """Add the call ID and call path of the current call context, if any, to
+    the headers of a client call"""
+    context = get_call_context()
+    if hasattr(context, 'call_id'):
+        headers['PymCallID'] = context.call_id
+    if hasattr(context, 'call_path'):
+        headers['PymCallPath'] = context.call_path
+
+
+def _generate_request_arguments(spec, endpoint, headers, args):
+    # Prepare (g)requests arguments, besides the url (see UrlTemplate)
     data = None
-    params = None
-    custom_url = url
-
-    if hasattr(stack.top, 'call_id'):
-        headers['PymCallID'] = stack.top.call_id
-    if hasattr(stack.top, 'call_path'):
-        headers['PymCallPath'] = stack.top.call_path
-
-    if endpoint.param_in_path:
-        # Fill url with values from kwargs, and remove those params from kwargs
-        custom_url = _format_flask_url(url, kwargs)
-
-    if endpoint.param_in_query:
-        # The query parameters are contained in **kwargs
-        params = kwargs
-        # TODO: validate params? or let the server do that...
-    elif endpoint.param_in_body:
+
+    _set_call_headers(headers)
+
+    if endpoint.param_in_body:
         # The body parameter is the first elem in *args
         if len(args) != 1:
             raise ValidationError("%s expects exactly 1 parameter" % endpoint.handler_client)
-        data = json.dumps(spec.model_to_json(args[0]))
-
-    # Prune undefined parameters that would otherwise be turned into '=None'
-    # query params
-    if params:
-        for k in list(params.keys()):
-            if params[k] is None:
-                del params[k]
+        if spec.codec:
+            data = spec.codec.dumps(spec.model_to_json(args[0]))
+        else:
+            data = json.dumps(spec.model_to_json(args[0]))
 
-    return custom_url, params, data, headers
+    return data, headers
 
 
 def _generate_client_caller(spec, endpoint, timeout, error_callback, local, app):
@@ -91,16 +148,46 @@ def _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
             endpoint.path.lstrip('/')
         )
 
+    # Compile the url once, to format it with the parameters of each call
+    url_template = UrlTemplate(url, endpoint.operation.params.values())
+
     # Get eventual decorator and http method
     decorator = None
     if endpoint.decorate_request:
         decorator = get_function(endpoint.decorate_request)
 
+    # Unmarshaller of lazily unmarshalled responses, if the endpoint returns
+    # models that support it
+    lazy_unmarshaller = None
+    if endpoint.response_schema:
+        lazy_unmarshaller = get_lazy_unmarshaller(spec.spec, endpoint.response_schema)
+
     method = endpoint.method.lower()
     if method not in ('get', 'post', 'patch', 'put', 'delete'):
         raise PyMacaronCoreException("BUG: method %s for %s is not supported. Only get and post are." %
                                      (endpoint.method, endpoint.path))
 
+    # Does the server's handler take direct calls? (see
+    # server._generate_local_handler)
+    local_handler = spec.local_handlers.get(endpoint.handler_client) if local else None
+    if local_handler:
+        def direct_client(*args, **kwargs):
+            """Call the server's handler directly with the models and values given"""
+            log.info("Calling %s locally" % (endpoint.path))
+
+            headers = {'Content-Type': 'application/json'}
+            headers.update(kwargs.get('request_headers', {}))
+
+            # Remove magic client parameters before passing on
+            for k in ('max_attempts', 'read_timeout', 'connect_timeout', 'request_headers', 'lazy'):
+                if k in kwargs:
+                    del kwargs[k]
+
+            _set_call_headers(headers)
+            return local_handler(args, kwargs, headers)
+
+        return direct_client
+
     # Are we doing a local call?
     if local:
         def local_client(*args, **kwargs):
@@ -109,23 +196,19 @@ def _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
 
             headers = {'Content-Type': 'application/json'}
             headers.update(kwargs.get('request_headers', {}))
+            lazy = kwargs.get('lazy', spec.lazy)
 
             # Remove magic client parameters before passing on
-            for k in ('max_attempts', 'read_timeout', 'connect_timeout', 'request_headers'):
+            for k in ('max_attempts', 'read_timeout', 'connect_timeout', 'request_headers', 'lazy'):
                 if k in kwargs:
                     del kwargs[k]
 
-            custom_url, params, data, headers = _generate_request_arguments(url, spec, endpoint, headers, args, kwargs)
-            if '<' in custom_url:
-                # Some arguments were missing
-                return error_callback(ValidationError("Missing some arguments to format url: %s" % custom_url))
-
-            if params:
-                for k, v in params.items():
-                    if isinstance(v, str):
-                        params[k] = v.encode('utf-8')
-                custom_url = custom_url + '?' + urllib.parse.urlencode(params)
-            log.info("Calling with params [%s]" % params)
+            try:
+                custom_url = url_template.format(kwargs)
+            except ValidationError as e:
+                # Some arguments were missing, or unknown
+                return error_callback(e)
+            data, headers = _generate_request_arguments(spec, endpoint, headers, args)
 
             with app.test_client() as c:
                 requests_method = getattr(c, method)
@@ -138,15 +221,36 @@ def _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
                     headers=headers
                 )
 
-            return response_to_result(response, method, custom_url, endpoint.operation, error_callback)
+            return response_to_result(response, method, custom_url, endpoint.operation, error_callback, lazy_unmarshaller if lazy else None, spec.codec)
 
         return local_client
 
-    # Else call over HTTP/HTTPS
-    requests_method = getattr(requests, method)
+    # Else call over HTTP/HTTPS, on the api's pooled connections if any
+    if spec.http_pool:
+        requests_method = spec.http_pool.get_method(method)
+    else:
+        requests_method = getattr(requests, method)
     if decorator:
         requests_method = decorator(requests_method)
 
+    # Retry policy and circuit breaker of calls to that endpoint, if any (when
+    # calls are spread over several hosts, the load balancer ejects failing
+    # hosts instead)
+    retry_policy = spec.get_retry_policy(endpoint)
+    breaker = retry_policy.get_circuit_breaker("%s:%s" % (spec.host, spec.port)) if retry_policy and not spec.balancer else None
+
+    # Cache of the results of calls to that endpoint, if any
+    endpoint_cache = spec.get_endpoint_cache(endpoint)
+
+    # Coalescing of concurrent identical calls to that endpoint, if any
+    single_flight = spec.get_single_flight(endpoint)
+
+    # Hedging of slow requests to that endpoint, if any
+    hedge = spec.get_hedge(endpoint)
+
+    # Registry of the measurements of calls to that endpoint, if enabled
+    metrics = spec.metrics
+
     def client(*args, **kwargs):
         """Call the server endpoint and handle marshaling/unmarshaling of parameters/result.
 
@@ -156,9 +260,10 @@ def _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
 
         # Extract custom parameters from **kwargs
         headers = {'Content-Type': 'application/json'}
-        max_attempts = 3
+        max_attempts = None
         read_timeout = timeout
         connect_timeout = timeout
+        lazy = spec.lazy
 
         if 'max_attempts' in kwargs:
             max_attempts = kwargs['max_attempts']
@@ -172,44 +277,70 @@ def _generate_client_caller(spec, endpoint, timeout, error_callback, local, app)
         if 'request_headers' in kwargs:
             headers.update(kwargs['request_headers'])
             del kwargs['request_headers']
-
-        custom_url, params, data, headers = _generate_request_arguments(url, spec, endpoint, headers, args, kwargs)
-
-        if '<' in custom_url:
-            # Some arguments were missing
-            return error_callback(ValidationError("Missing some arguments to format url: %s" % custom_url))
+        if 'lazy' in kwargs:
+            lazy = kwargs['lazy']
+            del kwargs['lazy']
+
+        try:
+            if endpoint.decorate_request:
+                # Decorators get the query parameters in params, as requests
+                # methods do
+                custom_url, params = url_template.format_with_params(kwargs)
+            else:
+                custom_url, params = url_template.format(kwargs), None
+        except ValidationError as e:
+            # Some arguments were missing, or unknown
+            return error_callback(e)
+        data, headers = _generate_request_arguments(spec, endpoint, headers, args)
 
         # TODO: refactor this left-over from the time of async/grequests support and simplify!
-        return ClientCaller(requests_method, custom_url, data, params, headers, read_timeout, connect_timeout, endpoint.operation, endpoint.method, error_callback, max_attempts, spec.verify_ssl).call()
+        caller = ClientCaller(requests_method, custom_url, data, params, headers, read_timeout, connect_timeout, endpoint.operation, endpoint.method, error_callback, max_attempts, spec.verify_ssl, lazy_unmarshaller if lazy else None, spec.codec, retry_policy, breaker, hedge, spec.balancer)
+        if metrics:
+            caller.record = metrics.start(endpoint.handler_client, endpoint.method)
+            return metrics.measure(caller.record, lambda: _call(caller, single_flight, endpoint_cache, lazy))
+        return _call(caller, single_flight, endpoint_cache, lazy)
 
     return client
 
 
-def _format_flask_url(url, params):
-    # TODO: make this code more robust: error if some params are left unmatched
-    # or if url still contains placeholders after replacing
-    remove = []
-    for name, value in params.items():
-        if "<%s>" % name in url:
-            url = url.replace("<%s>" % name, str(value))
-            remove.append(name)
+def _call(caller, single_flight, endpoint_cache, lazy):
+    """Make the call, coalesced with identical calls in progress and served
+    from the cache if the endpoint says so"""
+    def call():
+        return caller.run(caller.plan_call(endpoint_cache, lazy))
+    if single_flight:
+        return single_flight.call(caller.get_flight_key(single_flight, lazy), call)
+    return call()
+
 
-    for name in remove:
-        del params[name]
+class FlaskResponseProxy(IncomingResponse):
+    """Make a flask Response, as returned by flask's test_client or by a server
+    handler, look like a bravado_core.response.IncomingResponse"""
 
-    return url
+    def __init__(self, response, codec=None):
+        self.status_code = response.status_code
+        self.reason = response.status
+        self.headers = response.headers
+        self.raw_bytes = response.data
+        self.text = response.data.decode("utf-8")
+        self._codec = codec
 
+    def json(self, **kwargs):
+        if self._codec:
+            return self._codec.loads(self.raw_bytes)
+        return json.loads(self.text)
 
-def response_to_result(response, method, url, operation, error_callback):
 
-    # Monkey patching flask test_client response if necessary
+def response_to_result(response, method, url, operation, error_callback, lazy_unmarshaller=None, codec=None, record=None):
+
+    # Wrapping flask test_client response if necessary
     if not hasattr(response, 'text'):
-        data = response.data.decode("utf-8")
-        setattr(response, 'text', data)
-        j = json.loads(data)
+        response = FlaskResponseProxy(response, codec)
 
+    elif codec:
+        # Decode the requests response's body with the codec
         def get_json():
-            return j
+            return codec.loads(response.content)
 
         setattr(response, 'json', get_json)
 
@@ -231,9 +362,36 @@ def response_to_result(response, method, url, operation, error_callback):
                 c = c.__func__
             return c(k)
 
+    if record is None:
+        return _unmarshal_result(response, method, url, operation, error_callback, lazy_unmarshaller)
+
+    # Time the decoding of the body apart from its unmarshalling
+    t0 = time.perf_counter()
+    try:
+        j = response.json()
+    except ValueError:
+        # Let unmarshalling fail as usual
+        pass
+    else:
+        setattr(response, 'json', lambda **kwargs: j)
+    t1 = time.perf_counter()
+    record.add_phase('decode', t1 - t0)
+    try:
+        return _unmarshal_result(response, method, url, operation, error_callback, lazy_unmarshaller)
+    finally:
+        record.add_phase('unmarshal', time.perf_counter() - t1)
+
+
+def _unmarshal_result(response, method, url, operation, error_callback, lazy_unmarshaller):
+
     # Now transform the request's Response object into an instance of a
     # swagger model
     try:
+        if lazy_unmarshaller and str(response.status_code) == '200':
+            # Nested models are validated and unmarshalled on first access
+            result = lazy_unmarshaller(response.json())
+            log.info("Call to %s %s returned an instance of %s" % (method, url, type(result)))
+            return result
         result = unmarshal_response(response, operation)
     except jsonschema.exceptions.ValidationError as e:
         log.warn("Failed to unmarshal response: %s" % e)
@@ -243,13 +401,46 @@ def response_to_result(response, method, url, operation, error_callback):
             c = c.__func__
         return c(k)
 
+    # Move the freshly unmarshalled bravado models into pymacaron models: no
+    # need to copy them, nobody else holds a reference to them
+    if isinstance(result, bravado_core.model.Model):
+        result = get_model(result.__class__.__name__).from_bravado(result, copy=False)
+    elif type(result) is list:
+        for i in range(len(result)):
+            if isinstance(result[i], bravado_core.model.Model):
+                result[i] = get_model(result[i].__class__.__name__).from_bravado(result[i], copy=False)
+
     log.info("Call to %s %s returned an instance of %s" % (method, url, type(result)))
     return result
 
 
-class ClientCaller():
+# The I/O that plans of client calls have their caller perform (see
+# BaseClientCaller)
+_SEND = 'send'
+_SLEEP = 'sleep'
+_REFRESH = 'refresh'
+
+
+class BaseClientCaller():
+    """The state of a client call, and the decisions made to complete it:
+    retries, caching, load balancing and metrics. ClientCaller and
+    AsyncClientCaller only perform its I/O, synchronously or not.
 
-    def __init__(self, requests_method, url, data, params, headers, read_timeout, connect_timeout, operation, method, error_callback, max_attempts, verify_ssl):
+    Calls are made by running plans: generators yielding the I/O to perform as
+    (action, argument) tuples, that are sent back its result or thrown the
+    exception it raised:
+
+    - (_SEND, None): send the request, hedged if the endpoint says so, and
+      return its response
+    - (_SLEEP, delay): wait delay seconds
+    - (_REFRESH, plan): run another plan in the background
+
+    If the I/O is cancelled or interrupted, the plan is closed.
+    """
+
+    def __init__(self, requests_method, url, data, params, headers, read_timeout, connect_timeout, operation, method, error_callback, max_attempts, verify_ssl, lazy_unmarshaller=None, codec=None, retry_policy=None, breaker=None, hedge=None, balancer=None, record=None):
+        if max_attempts is None:
+            max_attempts = retry_policy.max_attempts if retry_policy else 3
         assert max_attempts >= 1
         self.requests_method = requests_method
         self.url = url
@@ -263,31 +454,138 @@ class ClientCaller():
         self.error_callback = error_callback
         self.max_attempts = max_attempts
         self.verify_ssl = verify_ssl
+        self.lazy_unmarshaller = lazy_unmarshaller
+        self.codec = codec
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+        self.hedge = hedge
+        self.balancer = balancer
+        self.record = record
+
+        # Hosts the call was sent to so far, if it is load balanced
+        self.tried_hosts = []
+
+    # Which exceptions of the http library are connect timeouts, read timeouts
+    # and connection errors, told by subclasses
+    def _is_connect_timeout(self, e):
+        raise NotImplementedError()
+
+    def _is_read_timeout(self, e):
+        raise NotImplementedError()
+
+    def _is_connection_error(self, e):
+        raise NotImplementedError()
 
     def _method_is_safe_to_retry(self):
         return self.method in ('GET', 'PATCH')
 
-    def _call_retry(self, force_retry):
-        """Call request and retry up to max_attempts times (or none if self.max_attempts=1)"""
+    def _is_retriable_elsewhere(self, e):
+        """Return True if e is a connection error that another host of a load
+        balanced api may not have"""
+        return self.balancer is not None and self._is_connection_error(e) and self._method_is_safe_to_retry()
+
+    def _request(self, url):
+        return self.requests_method(
+            url,
+            data=self.data,
+            params=self.params,
+            headers=self.headers,
+            timeout=(self.connect_timeout, self.read_timeout),
+            verify=self.verify_ssl,
+        )
+
+    def _pick_host(self):
+        """Return the host picked by the load balancer, avoiding hosts already
+        tried by this call, and the url of the request to it. The host is None
+        if the call is not load balanced."""
+        if not self.balancer:
+            return None, self.url
+        u = self.balancer.acquire(self.tried_hosts)
+        self.tried_hosts.append(u)
+        return u, self.balancer.get_url(u, self.url)
+
+    def _release_host(self, u, outcome):
+        """Tell the load balancer how the request to host u ended: outcome is
+        either its response or the exception it raised"""
+        if u is None:
+            return
+        if isinstance(outcome, Exception):
+            success = False
+        elif isinstance(outcome, BaseException):
+            # Cancelled, as the losing request of a hedged call
+            success = None
+        else:
+            success = outcome is not None and int(outcome.status_code) < 500
+        self.balancer.release(u, success)
+
+    def _plan_send(self):
+        """Send the request once, and record the attempt if the call is
+        measured"""
+        record = self.record
+        if record is None:
+            return (yield _SEND, None)
+
+        t0 = time.perf_counter()
+        try:
+            response = yield _SEND, None
+        except Exception:
+            record.end_attempt(t0, None, self.data)
+            raise
+        record.end_attempt(t0, response, self.data)
+        return response
+
+    def _plan_policy(self, force_retry):
+        """Send the request and retry up to max_attempts times as the retry
+        policy says, waiting between attempts"""
+        policy = self.retry_policy
+        policy.start_call()
+        for i in range(self.max_attempts):
+            last_attempt = i == self.max_attempts - 1
+            policy.start_attempt(self.breaker)
+            try:
+                log.info("Calling %s %s" % (self.method, self.url))
+                response = yield from self._plan_send()
+                if response is None:
+                    raise PyMacaronCoreException("Call %s %s returned empty response" % (self.method, self.url))
+            except Exception as e:
+                policy.end_attempt(self.breaker, exception=e)
+                retriable = force_retry or self._is_connect_timeout(e) or (self._is_read_timeout(e) and self._method_is_safe_to_retry()) or self._is_retriable_elsewhere(e)
+                log.warn("Got %s calling %s %s: %s" % (type(e).__name__, self.method, self.url, str(e)))
+                delay = None if last_attempt else policy.get_retry_delay(i, retriable=retriable)
+                if delay is None:
+                    raise e
+            except BaseException as e:
+                # Cancelled or interrupted: the attempt failed, and must still
+                # be recorded, or a half-open circuit breaker would stay so
+                policy.end_attempt(self.breaker, exception=e)
+                raise
+            else:
+                policy.end_attempt(self.breaker, status_code=response.status_code)
+                delay = None if last_attempt else policy.get_retry_delay(i, response=response)
+                if delay is None:
+                    return response
+                log.warn("Got status %s calling %s %s" % (response.status_code, self.method, self.url))
+
+            log.info("Waiting %.3f sec before retrying %s %s" % (delay, self.method, self.url))
+            yield _SLEEP, delay
+
+    def _plan_retry(self, force_retry):
+        """Send the request and retry up to max_attempts times (or none if self.max_attempts=1)"""
+        if self.retry_policy:
+            return (yield from self._plan_policy(force_retry))
+
         last_exception = None
         for i in range(self.max_attempts):
             try:
                 log.info("Calling %s %s" % (self.method, self.url))
-                response = self.requests_method(
-                    self.url,
-                    data=self.data,
-                    params=self.params,
-                    headers=self.headers,
-                    timeout=(self.connect_timeout, self.read_timeout),
-                    verify=self.verify_ssl,
-                )
+                response = yield from self._plan_send()
 
                 if response is None:
                     log.warn("Got response None")
                     if self._method_is_safe_to_retry():
                         delay = 0.5 + i * 0.5
                         log.info("Waiting %s sec and Retrying since call is a %s" % (delay, self.method))
-                        time.sleep(delay)
+                        yield _SLEEP, delay
                         continue
                     else:
                         raise PyMacaronCoreException("Call %s %s returned empty response" % (self.method, self.url))
@@ -300,11 +598,17 @@ class ClientCaller():
 
                 retry = force_retry
 
-                if isinstance(e, ReadTimeout):
+                if self._is_connect_timeout(e):
+                    log.warn("Got a ConnectTimeout calling %s %s" % (self.method, self.url))
+                    log.warn("Exception was: %s" % str(e))
+                    # ConnectTimeouts are safe to retry whatever the call...
+                    retry = True
+
+                elif self._is_read_timeout(e):
                     # Log enough to help debugging...
                     log.warn("Got a ReadTimeout calling %s %s" % (self.method, self.url))
                     log.warn("Exception was: %s" % str(e))
-                    resp = e.response
+                    resp = getattr(e, 'response', None)
                     if not resp:
                         log.info("Requests error has no response.")
                         # TODO: retry=True? Is it really safe?
@@ -316,10 +620,9 @@ class ClientCaller():
                         log.info("Retrying since call is a %s" % self.method)
                         retry = True
 
-                elif isinstance(e, ConnectTimeout):
-                    log.warn("Got a ConnectTimeout calling %s %s" % (self.method, self.url))
-                    log.warn("Exception was: %s" % str(e))
-                    # ConnectTimeouts are safe to retry whatever the call...
+                elif self._is_retriable_elsewhere(e):
+                    log.warn("Got %s calling %s %s: %s" % (type(e).__name__, self.method, self.url, str(e)))
+                    # Retry on another host
                     retry = True
 
                 if retry:
@@ -332,6 +635,105 @@ class ClientCaller():
             last_exception = Exception("Reached max-attempts (%s). Giving up calling %s %s" % (self.max_attempts, self.method, self.url))
         raise last_exception
 
+    def _plan_uncached(self, force_retry):
+        response = yield from self._plan_retry(force_retry)
+        return self.get_result(response)
+
+    def _plan_cached(self, endpoint_cache, lazy):
+        """Return a copy of the cached result of the call if it is fresh, or else
+        make the call and cache its result"""
+        key = endpoint_cache.get_key(self.url, self.params, self.headers, lazy)
+        entry, usable, refresh = endpoint_cache.lookup(key)
+        if usable:
+            if refresh:
+                # The refresh is not part of this call's measurements
+                self.record = None
+                yield _REFRESH, self._plan_refresh_cached(endpoint_cache, key, entry)
+            return endpoint_cache.copy(entry.result)
+        return (yield from self._plan_fetch_cached(endpoint_cache, key, entry))
+
+    def _plan_fetch_cached(self, endpoint_cache, key, entry):
+        if entry and entry.etag:
+            self.headers['If-None-Match'] = entry.etag
+        response = yield from self._plan_retry(False)
+        if entry and str(response.status_code) == '304':
+            return endpoint_cache.revalidated(key, entry, response)
+        result = self.get_result(response)
+        if str(response.status_code) == '200':
+            return endpoint_cache.store(key, response, result)
+        return result
+
+    def _plan_refresh_cached(self, endpoint_cache, key, entry):
+        try:
+            yield from self._plan_fetch_cached(endpoint_cache, key, entry)
+        except Exception as e:
+            log.warn("Failed to refresh cached result of %s %s: %s" % (self.method, self.url, str(e)))
+        finally:
+            endpoint_cache.cache.end_refresh(entry)
+
+    def plan_call(self, endpoint_cache=None, lazy=False, force_retry=False):
+        """Return the plan of the call, served from endpoint_cache if any"""
+        if endpoint_cache:
+            return self._plan_cached(endpoint_cache, lazy)
+        return self._plan_uncached(force_retry)
+
+    def get_flight_key(self, single_flight, lazy):
+        return (single_flight.get_key(self.method, self.url, self.params, self.headers), lazy)
+
+    def get_result(self, response):
+        return response_to_result(response, self.method, self.url, self.operation, self.error_callback, self.lazy_unmarshaller, self.codec, self.record)
+
+
+class ClientCaller(BaseClientCaller):
+    """Make client calls with requests"""
+
+    def _is_connect_timeout(self, e):
+        return isinstance(e, ConnectTimeout)
+
+    def _is_read_timeout(self, e):
+        return isinstance(e, ReadTimeout)
+
+    def _is_connection_error(self, e):
+        return isinstance(e, requests.exceptions.ConnectionError)
+
+    def _send_once(self):
+        u, url = self._pick_host()
+        try:
+            response = self._request(url)
+        except BaseException as e:
+            self._release_host(u, e)
+            raise
+        self._release_host(u, response)
+        return response
+
+    def _send(self):
+        """Send the request once, or twice if it is hedged and slow"""
+        return self.hedge.call(self._send_once) if self.hedge else self._send_once()
+
+    def run(self, plan):
+        """Perform the I/O of a plan (see BaseClientCaller), and return its
+        result"""
+        value, error = None, None
+        while True:
+            try:
+                action, arg = plan.throw(error) if error is not None else plan.send(value)
+            except StopIteration as e:
+                return e.value
+            value, error = None, None
+            try:
+                if action == _SEND:
+                    value = self._send()
+                elif action == _SLEEP:
+                    time.sleep(arg)
+                elif action == _REFRESH:
+                    # fanout imports this module
+                    from pymacaron_core.swagger.fanout import get_executor
+                    get_executor().submit(self.run, arg)
+            except Exception as e:
+                error = e
+            except BaseException:
+                plan.close()
+                raise
+
     def call(self, force_retry=False):
-        response = self._call_retry(force_retry)
-        return response_to_result(response, self.method, self.url, self.operation, self.error_callback)
+        return self.run(self.plan_call(force_retry=force_retry))
@@ -0,0 +1,131 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
+from pymacaron_core.swagger.client import copy_call_context
+from pymacaron_core.swagger.client import set_call_context
+
+
+log = logging.getLogger(__name__)
+
+
+# The thread pool shared by all fan-outs, created on first use and again in
+# forked processes
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# Set in the pool's threads
+_worker = threading.local()
+
+
+def get_executor():
+    """Return the thread pool running fanned out client calls, of
+    PYM_FANOUT_WORKERS threads (32 by default)"""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor_pid != pid:
+        with _executor_lock:
+            if _executor_pid != pid:
+                workers = int(os.environ.get('PYM_FANOUT_WORKERS', 32))
+                log.info("Starting a pool of %s threads for fanning out client calls" % workers)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pym-fanout')
+                _executor_pid = pid
+    return _executor
+
+
+def gather(*calls, concurrency=None, return_exceptions=False):
+    """Call each of calls, functions taking no argument such as
+    lambda: ApiPool.user.client.get_user(user_id='1'), concurrently in the
+    shared thread pool, at most concurrency at a time, and return the list of
+    their results, in order.
+
+    If a call raises an exception, no more calls are started and the first
+    exception raised, in order of calls, is raised once all started calls have
+    completed. If return_exceptions is true, all calls are made and exceptions
+    are returned in place of results instead."""
+    return _run_all(list(calls), concurrency, return_exceptions)
+
+
+def map_calls(caller, iterable, concurrency=None, return_exceptions=False, **kwargs):
+    """Call the client caller once per item of iterable, as gather does. Items
+    that are dicts are passed as keyword arguments, other items as the only
+    positional argument (such as a body parameter). kwargs are passed to all
+    calls (such as request_headers)."""
+    calls = []
+    for item in iterable:
+        if isinstance(item, dict):
+            call_kwargs = dict(kwargs)
+            call_kwargs.update(item)
+            calls.append(_bind(caller, (), call_kwargs))
+        else:
+            calls.append(_bind(caller, (item,), dict(kwargs)))
+    return _run_all(calls, concurrency, return_exceptions)
+
+
+def _bind(caller, args, kwargs):
+    # Client callers consume their kwargs, so give each call a fresh copy
+    return lambda: caller(*args, **dict(kwargs))
+
+
+def _run_in_worker(call, context):
+    _worker.active = True
+    set_call_context(context)
+    try:
+        return call()
+    finally:
+        set_call_context(None)
+
+
+def _run_all(calls, concurrency, return_exceptions):
+    results = [None] * len(calls)
+    errors = {}
+
+    # Calls fanned out from within the pool would wait for threads of the
+    # same pool, and possibly deadlock: make them one after the other
+    if getattr(_worker, 'active', False) or len(calls) <= 1:
+        for i, call in enumerate(calls):
+            try:
+                results[i] = call()
+            except Exception as e:
+                errors[i] = e
+                if not return_exceptions:
+                    break
+        return _results_or_raise(results, errors, return_exceptions)
+
+    # Worker threads are not in the flask app context of this thread: pass
+    # them its call ID and call path
+    context = copy_call_context()
+
+    executor = get_executor()
+    limit = concurrency or len(calls)
+    todo = list(enumerate(calls))
+    todo.reverse()
+    running = {}
+
+    while todo or running:
+        while todo and len(running) < limit and not (errors and not return_exceptions):
+            i, call = todo.pop()
+            running[executor.submit(_run_in_worker, call, context)] = i
+        if not running:
+            break
+
+        done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+        for f in done:
+            i = running.pop(f)
+            try:
+                results[i] = f.result()
+            except Exception as e:
+                errors[i] = e
+
+    return _results_or_raise(results, errors, return_exceptions)
+
+
+def _results_or_raise(results, errors, return_exceptions):
+    if return_exceptions:
+        for i, e in errors.items():
+            results[i] = e
+    elif errors:
+        raise errors[min(errors.keys())]
+    return results
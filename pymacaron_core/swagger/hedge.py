@@ -0,0 +1,244 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
+from pymacaron_core.exceptions import PyMacaronCoreException
+
+
+log = logging.getLogger(__name__)
+
+
+# The thread pool sending hedged requests, created on first use and again in
+# forked processes. It is not the fan-out pool, so that hedged calls made from
+# fanned out calls never wait for threads of their own pool.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# The number of threads of the pool, and of requests it is sending
+_workers = 0
+_running = 0
+_running_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the thread pool sending hedged requests, of PYM_HEDGE_WORKERS
+    threads (64 by default)"""
+    global _executor, _executor_pid, _workers, _running
+    pid = os.getpid()
+    if _executor_pid != pid:
+        with _executor_lock:
+            if _executor_pid != pid:
+                workers = int(os.environ.get('PYM_HEDGE_WORKERS', 64))
+                log.info("Starting a pool of %s threads for hedging client calls" % workers)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pym-hedge')
+                _workers = workers
+                _running = 0
+                _executor_pid = pid
+    return _executor
+
+
+def _submit(f, *args):
+    """Run f(*args) in the pool and return its future, or return None if all
+    the threads of the pool are busy"""
+    global _running
+    executor = get_executor()
+    with _running_lock:
+        if _running >= _workers:
+            return None
+        _running += 1
+    future = executor.submit(f, *args)
+    future.add_done_callback(_release)
+    return future
+
+
+def _release(future):
+    global _running
+    with _running_lock:
+        _running -= 1
+
+
+class Hedge():
+    """Hedging of the requests to an endpoint: if a request has not been
+    answered after a delay, send a second identical one, and return the
+    response of whichever answers first.
+
+    - delay: a fixed delay in seconds, or None to use the percentile of the
+      latencies of the last window requests, between min_delay and max_delay
+      (max_delay until min_samples requests were made)
+    - max_ratio: at most that fraction of requests are hedged
+    """
+
+    def __init__(self, delay=None, percentile=95, min_delay=0.01, max_delay=1, window=200, min_samples=20, max_ratio=0.1):
+        if delay is None and not 0 < percentile <= 100:
+            raise PyMacaronCoreException("Invalid hedging percentile: %s" % percentile)
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'primary_wins': 0,
+            'denied': 0,
+            'saturated': 0,
+        }
+
+
+    def get_delay(self):
+        """Return how long to wait for a response before hedging"""
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.max_delay
+            latencies = sorted(self._latencies)
+        i = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return min(self.max_delay, max(self.min_delay, latencies[i]))
+
+
+    def call(self, send):
+        """Return the response of send(), a function sending the request, or of
+        its hedge.
+
+        The calling thread can not give up on a request it sends, so both are
+        sent from the pool. When all its threads are busy, the request is sent
+        from the calling thread and not hedged, rather than wait for one."""
+        with self._lock:
+            self.counters['requests'] += 1
+        started = threading.Event()
+        primary = _submit(self._timed, send, started)
+        if primary is None:
+            self._count('saturated')
+            return self._timed(send)
+
+        # The delay runs from when the request is sent, not from when it was
+        # queued
+        delay = self.get_delay()
+        started.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._may_hedge():
+            return primary.result()
+
+        hedge = _submit(self._timed, send)
+        if hedge is None:
+            with self._lock:
+                self.counters['hedged'] -= 1
+                self.counters['saturated'] += 1
+            return primary.result()
+
+        log.info("Hedging request not answered after %.3f sec" % delay)
+        pending = [primary, hedge]
+        first_exception = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                pending.remove(f)
+                if f.exception() is None:
+                    self._count('hedge_wins' if f is hedge else 'primary_wins')
+                    for p in pending:
+                        # Too late for requests already sent: their response
+                        # is ignored
+                        p.cancel()
+                    return f.result()
+                if first_exception is None or f is primary:
+                    first_exception = f.exception()
+        raise first_exception
+
+
+    async def call_async(self, send):
+        """Same as call, for a coroutine function send. The request that loses
+        is cancelled."""
+        import asyncio
+        with self._lock:
+            self.counters['requests'] += 1
+        primary = asyncio.ensure_future(self._timed_async(send))
+        delay = self.get_delay()
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done or not self._may_hedge():
+            return await primary
+
+        log.info("Hedging request not answered after %.3f sec" % delay)
+        hedge = asyncio.ensure_future(self._timed_async(send))
+        pending = {primary, hedge}
+        first_exception = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for f in done:
+                    if f.exception() is None:
+                        self._count('hedge_wins' if f is hedge else 'primary_wins')
+                        return f.result()
+                    if first_exception is None or f is primary:
+                        first_exception = f.exception()
+            raise first_exception
+        finally:
+            for f in pending:
+                f.cancel()
+
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['delay'] = self.get_delay()
+        return stats
+
+
+    def _may_hedge(self):
+        with self._lock:
+            if self.counters['hedged'] + 1 > self.max_ratio * self.counters['requests']:
+                self.counters['denied'] += 1
+                return False
+            self.counters['hedged'] += 1
+            return True
+
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+
+    def _record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+
+    def _timed(self, send, started=None):
+        if started:
+            started.set()
+        t0 = time.time()
+        response = send()
+        self._record(time.time() - t0)
+        return response
+
+
+    async def _timed_async(self, send):
+        t0 = time.time()
+        response = await send()
+        self._record(time.time() - t0)
+        return response
+
+
+def get_hedge_options(api_options, endpoint_options):
+    """Return the options of the Hedge of an endpoint given the hedge option of
+    an api and the x-hedge of an endpoint (either a dict of options, true to
+    use those of the api or false for no hedging), or None if requests to the
+    endpoint should not be hedged"""
+    if endpoint_options is False or (not api_options and not endpoint_options):
+        return None
+    options = {}
+    for o in (api_options, endpoint_options):
+        if o is True or o is None:
+            continue
+        if not isinstance(o, dict):
+            raise PyMacaronCoreException("Invalid hedging options: %s" % o)
+        options.update(o)
+    return options
@@ -0,0 +1,132 @@
+import os
+import logging
+import threading
+import http.cookiejar
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.connection import is_connection_dropped
+
+
+log = logging.getLogger(__name__)
+
+
+class HttpPool():
+    """A requests Session shared by all the client callers of an api, keeping
+    up to pool_size connections per host alive between calls. If
+    max_connections is set, at most that many calls to each host of the api
+    are made at once, and further calls wait for one of them to complete. If
+    keep_alive is false, connections are closed after each call.
+
+    The session stores no cookies: calls made on behalf of different requests
+    or users must not send each other's cookies.
+
+    The session is created on first call, and re-created in forked processes,
+    which must not share the sockets of their parent.
+    """
+
+    def __init__(self, pool_size=10, max_connections=None, keep_alive=True):
+        assert pool_size >= 1
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.keep_alive = keep_alive
+
+        self._session = None
+        self._adapter = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Semaphores limiting calls in progress, by host
+        self._semaphores = {}
+
+        # Statistics
+        self._in_use = 0
+        self._waits = 0
+        self._requests = 0
+
+
+    def _get_session(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._session
+
+        with self._lock:
+            if self._pid != pid:
+                log.info("Creating http session with a pool of %s connections per host" % self.pool_size)
+                adapter = HTTPAdapter(pool_maxsize=self.pool_size, max_retries=0)
+                session = requests.Session()
+                session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session, self._adapter, self._pid = session, adapter, pid
+                self._in_use = 0
+
+        return self._session
+
+
+    def _get_semaphore(self, url):
+        host = urlsplit(url).netloc
+        semaphore = self._semaphores.get(host)
+        if not semaphore:
+            with self._lock:
+                semaphore = self._semaphores.get(host)
+                if not semaphore:
+                    semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.max_connections)
+        return semaphore
+
+
+    def request(self, method, url, **kwargs):
+        """Call requests.Session.request on the pooled session"""
+        session = self._get_session() if self.keep_alive else None
+
+        semaphore = self._get_semaphore(url) if self.max_connections else None
+        if semaphore and not semaphore.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            semaphore.acquire()
+
+        with self._lock:
+            self._in_use += 1
+            self._requests += 1
+        try:
+            if session:
+                return session.request(method, url, **kwargs)
+            # Close the connection as soon as the response is read
+            with requests.Session() as session:
+                return session.request(method, url, **kwargs)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            if semaphore:
+                semaphore.release()
+
+
+    def get_method(self, method):
+        """Return a function with the signature of requests.<method>, sending
+        requests on the pooled session"""
+        method = method.upper()
+
+        def pooled_method(url, **kwargs):
+            return self.request(method, url, **kwargs)
+
+        return pooled_method
+
+
+    def stats(self):
+        """Return the number of calls in progress, of idle connections kept
+        alive, of calls that had to wait for max_connections to a host, and of calls
+        made so far"""
+        idle = 0
+        if self._adapter and self._pid == os.getpid():
+            for key in list(self._adapter.poolmanager.pools.keys()):
+                pool = self._adapter.poolmanager.pools.get(key)
+                if pool and pool.pool:
+                    idle += len([c for c in list(pool.pool.queue) if c is not None and not is_connection_dropped(c)])
+
+        return {
+            'in_use': self._in_use,
+            'idle': idle,
+            'waits': self._waits,
+            'requests': self._requests,
+            'pool_size': self.pool_size,
+            'max_connections': self.max_connections,
+        }
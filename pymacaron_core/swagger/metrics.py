@@ -0,0 +1,284 @@
+import time
+import bisect
+import logging
+import threading
+from datetime import timedelta
+
+
+log = logging.getLogger(__name__)
+
+
+# Phases of client calls, timed in seconds:
+# - wait: connecting, sending the request and waiting for the response's
+#   headers, summed over all attempts
+# - read: reading the response's body, summed over all attempts
+# - decode: decoding the json body
+# - unmarshal: validating and unmarshalling it into models
+# - total: the whole call, including waiting between attempts
+PHASES = ('wait', 'read', 'decode', 'unmarshal', 'total')
+
+# Upper bounds, in seconds, of the buckets of the histograms of phase durations
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+# Functions called with the CallRecord of every client call measured
+_hooks = []
+
+
+def add_metrics_hook(hook):
+    """Call hook(record) with the CallRecord of every client call of apis
+    recording metrics, once the call is complete, for example to forward its
+    measurements to another telemetry system. Hooks run in the thread making
+    the call, and exceptions they raise are logged and ignored."""
+    _hooks.append(hook)
+
+
+def remove_metrics_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+class CallRecord():
+    """The measurements of one client call: the number of attempts made (0 if
+    the result came from the cache or from an identical call in progress),
+    the status codes received, the bytes sent and received, the seconds spent
+    in each phase, and the name of the exception raised, if any"""
+
+    __slots__ = ('api', 'endpoint', 'method', 'start', 'attempts', 'statuses', 'bytes_sent', 'bytes_received', 'phases', 'error')
+
+    def __init__(self, api, endpoint, method):
+        self.api = api
+        self.endpoint = endpoint
+        self.method = method
+        self.start = time.perf_counter()
+        self.attempts = 0
+        self.statuses = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.phases = {}
+        self.error = None
+
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+
+    def end_attempt(self, t0, response, data=None):
+        """Record an attempt started at time.perf_counter() t0, that sent data
+        and got response, or None if it failed"""
+        seconds = time.perf_counter() - t0
+        self.attempts += 1
+        if data:
+            self.bytes_sent += len(data) if type(data) is bytes else len(str(data).encode('utf-8'))
+        if response is None:
+            self.add_phase('wait', seconds)
+            return
+
+        self.statuses.append(response.status_code)
+
+        # Requests and async client responses tell how long it took to get the
+        # headers
+        elapsed = getattr(response, 'elapsed', None)
+        wait = min(seconds, elapsed.total_seconds()) if isinstance(elapsed, timedelta) else seconds
+        self.add_phase('wait', wait)
+        self.add_phase('read', seconds - wait)
+
+        content = getattr(response, 'content', None)
+        if type(content) is bytes:
+            self.bytes_received += len(content)
+
+
+class _Histogram():
+
+    __slots__ = ('count', 'sum', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+    def snapshot(self):
+        # Cumulative counts, as in prometheus histograms
+        cumulative, n = [], 0
+        for le, c in zip(BUCKETS + (float('inf'),), self.buckets):
+            n += c
+            cumulative.append((le, n))
+        return {'count': self.count, 'sum': self.sum, 'max': self.max, 'buckets': cumulative}
+
+
+class _EndpointMetrics():
+
+    def __init__(self, method):
+        self.method = method
+        self.calls = 0
+        self.errors = 0
+        self.attempts = 0
+        self.retries = 0
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.phases = {}
+
+
+    def add(self, record):
+        self.calls += 1
+        if record.error:
+            self.errors += 1
+        self.attempts += record.attempts
+        if record.attempts > 1:
+            self.retries += record.attempts - 1
+        for status in record.statuses:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes_sent += record.bytes_sent
+        self.bytes_received += record.bytes_received
+        for name, seconds in record.phases.items():
+            h = self.phases.get(name)
+            if not h:
+                h = self.phases[name] = _Histogram()
+            h.observe(seconds)
+
+
+    def snapshot(self):
+        return {
+            'method': self.method,
+            'calls': self.calls,
+            'errors': self.errors,
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'statuses': dict(self.statuses),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'phases': {name: h.snapshot() for name, h in self.phases.items()},
+        }
+
+
+class ClientMetrics():
+    """In-process registry of the measurements of the client calls of an api,
+    aggregated per client method"""
+
+    def __init__(self, api_name):
+        self.api_name = api_name
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+
+    def start(self, endpoint, method):
+        """Return the CallRecord of a call starting now"""
+        return CallRecord(self.api_name, endpoint, method)
+
+
+    def end(self, record, exception=None):
+        """Aggregate the measurements of a complete call, and pass them on to
+        the hooks"""
+        record.phases['total'] = time.perf_counter() - record.start
+        if exception is not None:
+            record.error = type(exception).__name__
+
+        with self._lock:
+            m = self._endpoints.get(record.endpoint)
+            if not m:
+                m = self._endpoints[record.endpoint] = _EndpointMetrics(record.method)
+            m.add(record)
+
+        for hook in list(_hooks):
+            try:
+                hook(record)
+            except Exception as e:
+                log.warn("Metrics hook %s failed: %s" % (hook, str(e)))
+
+
+    def measure(self, record, f):
+        """Return f(), recording the end of the call of record"""
+        try:
+            result = f()
+        except Exception as e:
+            self.end(record, e)
+            raise
+        self.end(record)
+        return result
+
+
+    async def measure_async(self, record, f):
+        """Same as measure, for a coroutine function f"""
+        try:
+            result = await f()
+        except Exception as e:
+            self.end(record, e)
+            raise
+        self.end(record)
+        return result
+
+
+    def snapshot(self):
+        """Return a dict mapping the client methods called so far to their
+        numbers of calls, errors, attempts and retries, the counts of the
+        statuses they got, the bytes they sent and received, and histograms of
+        the durations of their phases"""
+        with self._lock:
+            return {name: m.snapshot() for name, m in self._endpoints.items()}
+
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus(snapshots, prefix='pym_client'):
+    """Return the metrics of the client calls of several apis, given as a dict
+    mapping api names to ClientMetrics snapshots, in prometheus' text format"""
+    counters = [
+        ('calls', 'Client calls'),
+        ('errors', 'Client calls that raised an exception'),
+        ('attempts', 'Requests sent by client calls'),
+        ('retries', 'Requests sent by client calls to retry a failed request'),
+        ('bytes_sent', 'Bytes of request bodies sent'),
+        ('bytes_received', 'Bytes of response bodies received'),
+    ]
+
+    lines = []
+    for key, help in counters:
+        name = '%s_%s_total' % (prefix, key)
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s counter' % name)
+        for api, endpoints in sorted(snapshots.items()):
+            for endpoint, m in sorted(endpoints.items()):
+                lines.append('%s{api="%s",endpoint="%s"} %s' % (name, _escape(api), _escape(endpoint), m[key]))
+
+    name = '%s_responses_total' % prefix
+    lines.append('# HELP %s Responses received by client calls, per status code' % name)
+    lines.append('# TYPE %s counter' % name)
+    for api, endpoints in sorted(snapshots.items()):
+        for endpoint, m in sorted(endpoints.items()):
+            for status, count in sorted(m['statuses'].items()):
+                lines.append('%s{api="%s",endpoint="%s",status="%s"} %s' % (name, _escape(api), _escape(endpoint), status, count))
+
+    name = '%s_phase_seconds' % prefix
+    lines.append('# HELP %s Durations of the phases of client calls' % name)
+    lines.append('# TYPE %s histogram' % name)
+    for api, endpoints in sorted(snapshots.items()):
+        for endpoint, m in sorted(endpoints.items()):
+            for phase in PHASES:
+                h = m['phases'].get(phase)
+                if not h:
+                    continue
+                labels = 'api="%s",endpoint="%s",phase="%s"' % (_escape(api), _escape(endpoint), phase)
+                for le, count in h['buckets']:
+                    lines.append('%s_bucket{%s,le="%s"} %s' % (name, labels, '+Inf' if le == float('inf') else le, count))
+                lines.append('%s_sum{%s} %s' % (name, labels, h['sum']))
+                lines.append('%s_count{%s} %s' % (name, labels, h['count']))
+
+    return '\n'.join(lines) + '\n'
@@ -1,5 +1,6 @@
 import logging
 from werkzeug import FileStorage
+from werkzeug.exceptions import BadRequest
 from bravado_core.request import IncomingRequest
 
 
@@ -16,7 +17,7 @@ class FlaskRequestProxy(IncomingRequest):
     headers = None
     _json = None
 
-    def __init__(self, request, has_data):
+    def __init__(self, request, has_data, codec=None):
         self.request = request
         self.query = request.args
         self.path = request.view_args
@@ -58,6 +59,12 @@ class FlaskRequestProxy(IncomingRequest):
                         self.files['%s_mimetype' % name] = v.content_type
                     else:
                         raise Exception("Support for multipart/form-data containing %s is not implemented" % type(v))
+            elif codec:
+                # Assuming we got a json body, decoded straight from bytes
+                try:
+                    self._json = codec.loads(self.request.get_data())
+                except ValueError as e:
+                    raise BadRequest("Failed to decode JSON object: %s" % e)
             else:
                 # Assuming we got a json body
                 self._json = self.request.get_json(force=True)
@@ -65,3 +72,40 @@ class FlaskRequestProxy(IncomingRequest):
     def json(self):
         # Convert a weltkreuz ImmutableDict to a simple python dict
         return self._json
+
+
+class LocalRequestProxy(IncomingRequest):
+    """Make the parameters of a local client call look like a
+    bravado_core.request.IncomingRequest, with their values formatted as they
+    would be in an http request"""
+
+    path = None
+    query = None
+    form = None
+    headers = None
+    _json = None
+
+    def __init__(self, operation, kwargs, headers, body_json=None):
+        self.path = {}
+        self.query = {}
+        self.form = {}
+        self.headers = headers
+        self.files = {}
+        self._json = body_json
+
+        for param in operation.params.values():
+            value = kwargs.get(param.name, None)
+            if value is None:
+                continue
+            if type(value) in (bool, int, float):
+                # As requests does when sending them
+                value = str(value)
+            if param.location == 'path':
+                self.path[param.name] = value
+            elif param.location == 'query':
+                self.query[param.name] = value
+            elif param.location == 'formData':
+                self.form[param.name] = value
+
+    def json(self):
+        return self._json
@@ -0,0 +1,225 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from pymacaron_core.exceptions import PyMacaronCoreException
+from pymacaron_core.models import _clone_value
+from pymacaron_core.swagger.singleflight import IGNORED_HEADERS
+
+
+log = logging.getLogger(__name__)
+
+
+class CacheEntry():
+    """The unmarshalled result of a GET call, with its ETag if any, fresh until
+    expires and then still returned while refreshed until stale_until"""
+
+    __slots__ = ('result', 'etag', 'expires', 'stale_until', 'refreshing')
+
+    def __init__(self, result, etag, expires, stale_until):
+        self.result = result
+        self.etag = etag
+        self.expires = expires
+        self.stale_until = stale_until
+        self.refreshing = False
+
+    def is_fresh(self, now):
+        return now < self.expires
+
+    def is_stale_usable(self, now):
+        return now < self.stale_until
+
+
+class ResponseCache():
+    """An in-process LRU cache of the results of an api's GET calls, holding at
+    most max_entries results"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'revalidations': 0,
+            'stores': 0,
+            'evictions': 0,
+        }
+
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.counters['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+
+    def start_refresh(self, entry):
+        """Return True if the caller should refresh entry, False if another
+        caller already is"""
+        with self._lock:
+            if entry.refreshing:
+                return False
+            entry.refreshing = True
+            return True
+
+
+    def end_refresh(self, entry):
+        entry.refreshing = False
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            return stats
+
+
+class EndpointCache():
+    """How the results of calls to a GET endpoint are cached in the api's
+    ResponseCache:
+
+    - ttl: results are fresh for that many seconds, or as long as the max-age
+      of the response's Cache-Control header if ttl is None
+    - stale_while_revalidate: expired results are still returned for that
+      many seconds (or the stale-while-revalidate of the response's
+      Cache-Control header), while a call in the background refreshes them
+    - vary: names of the request headers whose values are part of the cache
+      key, along with the url and the query parameters, or None to make all
+      request headers part of it, but those in IGNORED_HEADERS
+
+    Expired results whose response had an ETag are revalidated with an
+    If-None-Match header, and kept if the server answers 304. Responses with
+    Cache-Control no-store are never cached.
+    """
+
+    def __init__(self, cache, ttl=None, stale_while_revalidate=0, vary=None):
+        self.cache = cache
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.vary = tuple(vary) if vary is not None else None
+
+
+    def get_key(self, url, params, headers, lazy=False):
+        query = tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+        if self.vary is None:
+            headers = tuple(sorted((k, v) for k, v in headers.items() if k not in IGNORED_HEADERS))
+        else:
+            headers = tuple(headers.get(h) for h in self.vary)
+        return (url, query, headers, lazy)
+
+
+    def lookup(self, key):
+        """Return (entry, usable, refresh): the cached entry of key if any,
+        whether its result may be returned right away, and whether the caller
+        should then refresh it in the background"""
+        entry = self.cache.get(key)
+        if not entry:
+            self.cache.count('misses')
+            return None, False, False
+        now = time.time()
+        if entry.is_fresh(now):
+            self.cache.count('hits')
+            return entry, True, False
+        if entry.is_stale_usable(now):
+            self.cache.count('stale_hits')
+            return entry, True, self.cache.start_refresh(entry)
+        self.cache.count('misses')
+        return entry, False, False
+
+
+    def store(self, key, response, result):
+        """Cache the result of a successful call, if the response allows it, and
+        return a copy of it"""
+        ttl, stale = self._get_lifetimes(response)
+        etag = response.headers.get('ETag')
+        if ttl is None or (ttl <= 0 and stale <= 0 and not etag):
+            return result
+        now = time.time()
+        self.cache.put(key, CacheEntry(result, etag, now + ttl, now + ttl + stale))
+        return self.copy(result)
+
+
+    def revalidated(self, key, entry, response):
+        """Refresh an entry after the server answered 304 Not Modified, and
+        return a copy of its result"""
+        self.cache.count('revalidations')
+        ttl, stale = self._get_lifetimes(response)
+        now = time.time()
+        self.cache.put(key, CacheEntry(entry.result, response.headers.get('ETag') or entry.etag, now + (ttl or 0), now + (ttl or 0) + stale))
+        return self.copy(entry.result)
+
+
+    def copy(self, result):
+        """Return a copy of a cached result that the caller may modify: nested
+        values are only copied when first accessed"""
+        return _clone_value(result, copy_on_write=True)
+
+
+    def _get_lifetimes(self, response):
+        # Return (ttl, stale_while_revalidate) of a response, with a ttl of
+        # None if it must not be cached
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        if 'no-store' in directives:
+            return None, 0
+        ttl = self.ttl
+        if ttl is None:
+            ttl = directives.get('max-age') or 0
+        if 'no-cache' in directives:
+            ttl = 0
+        stale = self.stale_while_revalidate or directives.get('stale-while-revalidate') or 0
+        return ttl, stale
+
+
+def parse_cache_control(value):
+    """Return a dict mapping the directives of a Cache-Control header to their
+    number of seconds, or None for those that have none"""
+    directives = {}
+    for d in (value or '').split(','):
+        name, _, arg = d.strip().partition('=')
+        if not name:
+            continue
+        arg = arg.strip('"')
+        directives[name.lower()] = int(arg) if arg.isdigit() else None
+    return directives
+
+
+def get_endpoint_cache_options(api_options, endpoint_options):
+    """Return the options of an EndpointCache given the client_cache option of
+    an api and the x-client-cache of an endpoint (either a dict of options,
+    true to use those of the api or false for no caching), or None if the
+    endpoint's results should not be cached"""
+    if endpoint_options is False or (not api_options and not endpoint_options):
+        return None
+    options = {}
+    for o in (api_options, endpoint_options):
+        if o is True or o is None:
+            continue
+        if not isinstance(o, dict):
+            raise PyMacaronCoreException("Invalid client cache options: %s" % o)
+        options.update(o)
+    options.pop('max_entries', None)
+    return options
@@ -0,0 +1,269 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from pymacaron_core.exceptions import PyMacaronCoreException
+
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(PyMacaronCoreException):
+    """Raised instead of calling a host whose circuit breaker is open"""
+    status_code = 503
+
+
+class RetryBudget():
+    """A token bucket limiting retries to a fraction of calls: every call adds
+    ratio tokens, every retry takes one, and the bucket holds at most burst
+    tokens, so that occasional retries are always allowed."""
+
+    def __init__(self, ratio=0.2, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Take a token for a retry, and return False if there are none left"""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker():
+    """Open after failure_threshold consecutive failed calls to a host, and
+    then let one trial call through every reset_timeout seconds, closing again
+    when one succeeds. A trial call whose result was never recorded does not
+    keep the breaker half-open for longer than reset_timeout."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._trial_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may be made now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.time()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                # Let one trial call through
+                self.state = self.HALF_OPEN
+                self._trial_at = now
+                return True
+            if self.state == self.HALF_OPEN and now - self._trial_at >= self.reset_timeout:
+                # The trial call never ended: let another one through
+                self._trial_at = now
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if success:
+                self.state = self.CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    log.warn("Opening circuit breaker after %s failed calls" % self._failures)
+                self.state = self.OPEN
+                self._opened_at = time.time()
+
+
+# Circuit breakers, by host
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host, failure_threshold=5, reset_timeout=30):
+    """Return the circuit breaker of host ('host:port'), shared by all apis
+    calling it and created with the settings of the first of them"""
+    breaker = _breakers.get(host)
+    if not breaker:
+        with _breakers_lock:
+            breaker = _breakers.get(host)
+            if not breaker:
+                breaker = CircuitBreaker(failure_threshold, reset_timeout)
+                _breakers[host] = breaker
+    return breaker
+
+
+def reset_circuit_breakers():
+    """Forget the circuit breakers of all hosts"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+class RetryPolicy():
+    """How client calls are retried:
+
+    - max_attempts: calls are made at most that many times (unless the
+      max_attempts argument of a call says otherwise)
+    - backoff_base, backoff_max: before the n-th retry, wait a random time
+      between 0 and min(backoff_max, backoff_base * 2^n) seconds
+    - retry_statuses: responses with these statuses are retried, after the
+      delay given by their Retry-After header if any, unless it is more than
+      max_retry_after seconds
+    - retry_budget, retry_budget_burst: retries are at most that fraction of
+      calls, plus bursts of that many retries (see RetryBudget)
+    - failure_threshold, reset_timeout: settings of the circuit breakers of
+      the hosts called (see CircuitBreaker), or None for no circuit breaker
+
+    Timeouts connecting to the server are always retried, read timeouts only
+    for GET and PATCH calls. Calls made while a host's circuit breaker is open
+    raise a CircuitOpenError.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.1, backoff_max=5, retry_statuses=(429, 503), max_retry_after=30,
+                 retry_budget=0.2, retry_budget_burst=10, failure_threshold=5, reset_timeout=30, budget=None, counters=None):
+        assert max_attempts >= 1
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.max_retry_after = max_retry_after
+        self.retry_budget = retry_budget
+        self.retry_budget_burst = retry_budget_burst
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.budget = budget or RetryBudget(retry_budget, retry_budget_burst)
+        self.counters = counters if counters is not None else {
+            'calls': 0,
+            'attempts': 0,
+            'retries': 0,
+            'retries_after': 0,
+            'retries_denied': 0,
+            'failures': 0,
+            'circuit_open': 0,
+        }
+        self._lock = threading.Lock()
+
+
+    def derive(self, **options):
+        """Return a policy with some options changed, sharing the retry budget
+        and counters of this one unless the budget options change"""
+        kwargs = {k: getattr(self, k) for k in (
+            'max_attempts', 'backoff_base', 'backoff_max', 'retry_statuses', 'max_retry_after',
+            'retry_budget', 'retry_budget_burst', 'failure_threshold', 'reset_timeout',
+        )}
+        kwargs.update(options)
+        if kwargs['retry_budget'] == self.retry_budget and kwargs['retry_budget_burst'] == self.retry_budget_burst:
+            kwargs['budget'] = self.budget
+        kwargs['counters'] = self.counters
+        policy = RetryPolicy(**kwargs)
+        # Shared counters are updated under the same lock
+        policy._lock = self._lock
+        return policy
+
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+
+    def get_circuit_breaker(self, host):
+        if self.failure_threshold is None:
+            return None
+        return get_circuit_breaker(host, self.failure_threshold, self.reset_timeout)
+
+
+    def start_call(self):
+        self.count('calls')
+        self.budget.deposit()
+
+
+    def start_attempt(self, breaker):
+        """Raise CircuitOpenError if the host's circuit breaker is open"""
+        if breaker and not breaker.allow():
+            self.count('circuit_open')
+            raise CircuitOpenError("Circuit breaker is open: not calling server")
+        self.count('attempts')
+
+
+    def end_attempt(self, breaker, exception=None, status_code=None):
+        failed = exception is not None or (status_code is not None and int(status_code) >= 500)
+        if failed:
+            self.count('failures')
+        if breaker:
+            breaker.record(not failed)
+
+
+    def get_retry_delay(self, attempt, retriable=False, response=None):
+        """Return how many seconds to wait before retrying a call whose attempt
+        number attempt (starting at 0) returned response, or raised an
+        exception that is retriable or not, or None if it should not be
+        retried"""
+        retry_after = None
+
+        if response is not None:
+            if int(response.status_code) not in self.retry_statuses:
+                return None
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None and retry_after > self.max_retry_after:
+                log.info("Not retrying: server asks to retry in %s sec" % retry_after)
+                return None
+        elif not retriable:
+            return None
+
+        if not self.budget.withdraw():
+            log.warn("Not retrying: retry budget exhausted")
+            self.count('retries_denied')
+            return None
+
+        self.count('retries')
+        if retry_after is not None:
+            self.count('retries_after')
+            return retry_after
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def get_retry_policy(policy):
+    """Return a RetryPolicy, given one or a dict of its options"""
+    if isinstance(policy, RetryPolicy):
+        return policy
+    if isinstance(policy, dict):
+        return RetryPolicy(**policy)
+    raise PyMacaronCoreException("Invalid retry policy: %s" % policy)
+
+
+def parse_retry_after(value):
+    """Return the number of seconds in a Retry-After header, given either in
+    seconds or as a date, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        d = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=timezone.utc)
+    return max(0, (d - datetime.now(timezone.utc)).total_seconds())
@@ -2,15 +2,31 @@ import jsonschema
 import logging
 import uuid
 import os
+from collections.abc import Iterator
+from urllib.parse import unquote
 from functools import wraps
 from werkzeug.exceptions import BadRequest
-from flask import request, jsonify
+from werkzeug.test import EnvironBuilder
+from flask import request, jsonify, current_app, stream_with_context
+import flask.json
 from flask_cors import cross_origin
 from pymacaron_core.exceptions import PyMacaronCoreException, ValidationError, add_error_handlers
 from pymacaron_core.utils import get_function
 from pymacaron_core.models import get_model
+from pymacaron_core.models import PyMacaronModel
+from pymacaron_core.models import get_lazy_unmarshaller
+from pymacaron_core.models import _clone_value
 from pymacaron_core.swagger.request import FlaskRequestProxy
-from bravado_core.request import unmarshal_request
+from pymacaron_core.swagger.request import LocalRequestProxy
+from pymacaron_core.swagger.client import response_to_result
+from pymacaron_core.swagger.urltemplate import UrlTemplate
+from bravado_core.model import MODEL_MARKER
+from bravado_core.param import get_param_type_spec
+from bravado_core.param import unmarshal_param
+from bravado_core.request import validate_security_object
+from bravado_core.unmarshal import unmarshal_schema_object
+from bravado_core.validate import validate_schema_object
+import bravado_core.model
 
 
 log = logging.getLogger(__name__)
@@ -32,11 +48,15 @@ def spawn_server_api(api_name, app, api_spec, error_callback, decorator):
     """
 
     def mycallback(endpoint):
-        handler_func = get_function(endpoint.handler_server)
+        handler_func = _decorate_handler(endpoint, get_function(endpoint.handler_server))
 
         # Generate api endpoint around that handler
         handler_wrapper = _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_callback, decorator)
 
+        # Let local client calls call that handler directly
+        if api_spec.local_dispatch and endpoint.handler_client and endpoint.produces_json:
+            api_spec.local_handlers[endpoint.handler_client] = _generate_local_handler(api_name, app, api_spec, endpoint, handler_func, error_callback)
+
         # Bind handler to the API path
         log.info("Binding %s %s ==> %s" % (endpoint.method, endpoint.path, endpoint.handler_server))
         endpoint_name = '_'.join([endpoint.method, endpoint.path]).replace('/', '_')
@@ -53,11 +73,155 @@ def _responsify(api_spec, error, status):
     """Take a bravado-core model representing an error, and return a Flask Response
     with the given error code and error instance as body"""
     result_json = api_spec.model_to_json(error)
-    r = jsonify(result_json)
+    r = _jsonify(api_spec, result_json)
     r.status_code = status
     return r
 
 
+def _jsonify(api_spec, j):
+    """Return a Flask Response with the json value j as body, encoded by the
+    api's codec straight into bytes, or by jsonify if the api has none"""
+    if not api_spec.codec:
+        return jsonify(j)
+    return current_app.response_class(
+        api_spec.codec.dumps(j),
+        mimetype=current_app.config.get('JSONIFY_MIMETYPE', 'application/json'),
+    )
+
+
+def _responsify_array(api_spec, items):
+    """Take a list or an iterator of models (or of json values) and return a
+    Flask Response with code 200 and their json array as body, encoded exactly
+    as jsonify (or the api's codec) would encode it. An iterator is marshalled
+    and encoded item by item into a streamed response, so the whole array is
+    never held in memory.
+    """
+    if type(items) in (list, tuple):
+        r = _jsonify(api_spec, [_item_to_json(api_spec, i) for i in items])
+    else:
+        r = current_app.response_class(
+            stream_with_context(_generate_json_array(api_spec, items)),
+            mimetype=current_app.config.get('JSONIFY_MIMETYPE', 'application/json'),
+        )
+    r.status_code = 200
+    return r
+
+
+def _item_to_json(api_spec, item):
+    if isinstance(item, PyMacaronModel):
+        return api_spec.model_to_json(item)
+    return item
+
+
+def _generate_json_array(api_spec, items, batch_size=500):
+    """Yield the json encoding of the array of items, batch_size items at a
+    time, byte-identical to what jsonify(list(items)) returns"""
+
+    if api_spec.codec:
+        yield from _generate_json_array_with_codec(api_spec, items, batch_size)
+        return
+
+    # Same formatting as jsonify
+    indent = None
+    separators = (",", ":")
+    if current_app.config.get('JSONIFY_PRETTYPRINT_REGULAR') or current_app.debug:
+        indent = 2
+        separators = (", ", ": ")
+
+    # Each batch is encoded as a json array, whose brackets are then replaced
+    # to splice it into the complete array
+    if indent:
+        start, separator, end = '[\n' + ' ' * indent, separators[0] + '\n' + ' ' * indent, '\n]'
+    else:
+        start, separator, end = '[', separators[0], ']'
+
+    first = True
+    batch = []
+    for item in items:
+        batch.append(_item_to_json(api_spec, item))
+        if len(batch) == batch_size:
+            s = flask.json.dumps(batch, indent=indent, separators=separators)
+            yield (start if first else separator) + s[len(start):-len(end)]
+            first = False
+            batch = []
+
+    if batch:
+        s = flask.json.dumps(batch, indent=indent, separators=separators)
+        yield (start if first else separator) + s[len(start):]
+    elif first:
+        yield '[]'
+    else:
+        yield end
+    yield '\n'
+
+
+def _generate_json_array_with_codec(api_spec, items, batch_size):
+    """Same as _generate_json_array, with the api's codec encoding the items in
+    compact form straight into bytes"""
+    first = True
+    batch = []
+    for item in items:
+        batch.append(_item_to_json(api_spec, item))
+        if len(batch) == batch_size:
+            b = api_spec.codec.dumps(batch)
+            yield (b'[' if first else b',') + b[1:-1]
+            first = False
+            batch = []
+
+    if batch:
+        b = api_spec.codec.dumps(batch)
+        yield (b'[' if first else b',') + b[1:]
+    elif first:
+        yield b'[]'
+    else:
+        yield b']'
+
+
+def _unmarshal_body_param(param, req, lazy_unmarshaller=None):
+    """Validate the json body of a request and unmarshal it directly into a
+    PyMacaron model, instead of a bravado model. If given a lazy_unmarshaller
+    (see get_lazy_unmarshaller), nested models are validated and unmarshalled
+    on first access only."""
+    swagger_spec = param.swagger_spec
+    param_spec = swagger_spec.deref(get_param_type_spec(param))
+
+    raw_value = req.json()
+    if raw_value is None and not param.required:
+        return None
+
+    if lazy_unmarshaller:
+        return lazy_unmarshaller(raw_value)
+
+    if swagger_spec.config['validate_requests']:
+        validate_schema_object(swagger_spec, param_spec, raw_value)
+
+    if MODEL_MARKER in param_spec:
+        cls = get_model(param_spec[MODEL_MARKER])
+        if getattr(cls, '__swagger_dict') is param_spec:
+            return cls.from_json(raw_value)
+
+    value = unmarshal_schema_object(swagger_spec, param_spec, raw_value)
+    if isinstance(value, bravado_core.model.Model):
+        value = get_model(value.__class__.__name__).from_bravado(value, copy=False)
+    return value
+
+
+def _unmarshal_request(req, operation, lazy_unmarshaller=None):
+    """Same as bravado-core's unmarshal_request, except that the body
+    parameter, if any, is unmarshalled into a PyMacaron model"""
+    request_data = {}
+    for param in operation.params.values():
+        if param.location == 'body':
+            request_data[param.name] = _unmarshal_body_param(param, req, lazy_unmarshaller)
+        else:
+            request_data[param.name] = unmarshal_param(param, req)
+
+    if operation.swagger_spec.config['validate_requests']:
+        validate_security_object(operation, request_data)
+
+    return request_data
+
+
 def log_endpoint(f, endpoint):
     """A decorator that adds start and stop logging around an endpoint"""
 
@@ -84,8 +248,9 @@ def log_endpoint(f, endpoint):
     return decorator
 
 
-def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_callback, global_decorator):
-    """Generate a handler method for the given url method+path and operation"""
+def _decorate_handler(endpoint, handler_func):
+    """Return the handler function of an endpoint with logging around it, and
+    decorated as the Swagger spec says"""
 
     # Add logging around the handler function
     handler_func = log_endpoint(handler_func, endpoint)
@@ -95,6 +260,49 @@ def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_
         endpoint_decorator = get_function(endpoint.decorate_server)
         handler_func = endpoint_decorator(handler_func)
 
+    return handler_func
+
+
+def _get_handler_arguments(endpoint, path_params, parameters):
+    """Return the args and kwargs to call the handler of endpoint with, given
+    the request's path parameters and its unmarshalled parameters"""
+    args = []
+    kwargs = {}
+
+    if endpoint.param_in_path:
+        kwargs = path_params
+
+    if endpoint.param_in_body:
+        # Remove the parameters already defined in path_params
+        for k in list(path_params.keys()):
+            del parameters[k]
+        lst = list(parameters.values())
+        assert len(lst) == 1
+
+        # The body was already unmarshalled into a pymacaron model
+        args.append(lst[0])
+
+    if endpoint.param_in_query:
+        kwargs.update(parameters)
+
+    if endpoint.param_in_formdata:
+        for k in list(path_params.keys()):
+            del parameters[k]
+        kwargs.update(parameters)
+
+    return args, kwargs
+
+
+def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_callback, global_decorator):
+    """Generate a handler method for the given url method+path and operation"""
+
+    # Should the body parameter be unmarshalled lazily?
+    lazy_unmarshaller = None
+    if api_spec.lazy and endpoint.param_in_body:
+        for param in endpoint.operation.params.values():
+            if param.location == 'body':
+                lazy_unmarshaller = get_lazy_unmarshaller(param.swagger_spec, get_param_type_spec(param))
+
     @wraps(handler_func)
     def handler_wrapper(**path_params):
         if os.environ.get('PYM_DEBUG', None) == '1':
@@ -114,11 +322,12 @@ def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_
             call_path = api_name
         stack.top.call_path = call_path
 
+        parameters = None
         if endpoint.param_in_body or endpoint.param_in_query or endpoint.param_in_formdata:
             # Turn the flask request into something bravado-core can process...
             has_data = endpoint.param_in_body or endpoint.param_in_formdata
             try:
-                req = FlaskRequestProxy(request, has_data)
+                req = FlaskRequestProxy(request, has_data, api_spec.codec)
             except BadRequest:
                 ee = error_callback(ValidationError("Cannot parse json data: have you set 'Content-Type' to 'application/json'?"))
                 return _responsify(api_spec, ee, 400)
@@ -126,7 +335,7 @@ def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_
             try:
                 # Note: unmarshall validates parameters but does not fail
                 # if extra unknown parameters are submitted
-                parameters = unmarshal_request(req, endpoint.operation)
+                parameters = _unmarshal_request(req, endpoint.operation, lazy_unmarshaller)
                 # Example of parameters: {'body': RegisterCredentials()}
             except jsonschema.exceptions.ValidationError as e:
                 ee = error_callback(ValidationError(str(e)))
@@ -134,38 +343,19 @@ def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_
 
         # Call the endpoint, with proper parameters depending on whether
         # parameters are in body, query or url
-        args = []
-        kwargs = {}
-
-        if endpoint.param_in_path:
-            kwargs = path_params
-
-        if endpoint.param_in_body:
-            # Remove the parameters already defined in path_params
-            for k in list(path_params.keys()):
-                del parameters[k]
-            lst = list(parameters.values())
-            assert len(lst) == 1
-
-            # Now convert the Bravado body object into a pymacaron model
-            body = lst[0]
-            cls = get_model(body.__class__.__name__)
-            body = cls.from_bravado(body)
-            args.append(body)
-
-        if endpoint.param_in_query:
-            kwargs.update(parameters)
-
-        if endpoint.param_in_formdata:
-            for k in list(path_params.keys()):
-                del parameters[k]
-            kwargs.update(parameters)
+        args, kwargs = _get_handler_arguments(endpoint, path_params, parameters)
 
         if os.environ.get('PYM_DEBUG', None) == '1':
             log.debug("PYM_DEBUG: Request args are: [args: %s] [kwargs: %s]" % (args, kwargs))
 
         result = handler_func(*args, **kwargs)
 
+        # Endpoints returning an array may return a list, or an iterator to
+        # stream the response
+        if endpoint.produces_array and endpoint.produces_json:
+            if type(result) in (list, tuple) or isinstance(result, Iterator):
+                return _responsify_array(api_spec, result)
+
         if not result:
             e = error_callback(PyMacaronCoreException("Have nothing to send in response"))
             return _responsify(api_spec, e, 500)
@@ -207,7 +397,7 @@ def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_
             result_json = api_spec.model_to_json(result)
 
             # Send a Flask Response with code 200 and result_json
-            r = jsonify(result_json)
+            r = _jsonify(api_spec, result_json)
             r.status_code = 200
             return r
 
@@ -218,3 +408,142 @@ def _generate_handler_wrapper(api_name, api_spec, endpoint, handler_func, error_
         handler_wrapper = global_decorator(handler_wrapper)
 
     return handler_wrapper
+
+
+def _generate_local_handler(api_name, app, api_spec, endpoint, handler_func, error_callback):
+    """Generate a function that calls the handler of the endpoint directly with
+    the arguments of a local client call, and returns its result, without
+    encoding nor decoding anything to and from json.
+
+    If api_spec.local_dispatch is 'schema', the body parameter is only
+    validated against its schema and a copy of it passed to the handler, and
+    other parameters are passed as given. Otherwise, parameters are validated
+    and unmarshalled as those of http requests are. In both cases, the result
+    is validated against the response's schema.
+    """
+
+    swagger_spec = api_spec.spec
+    schema_only = api_spec.local_dispatch == 'schema'
+
+    body_spec = None
+    for param in endpoint.operation.params.values():
+        if param.location == 'body':
+            body_spec = swagger_spec.deref(get_param_type_spec(param))
+
+    response_spec = None
+    if endpoint.response_schema and swagger_spec.config['validate_responses']:
+        response_spec = swagger_spec.deref(endpoint.response_schema)
+
+    # The wsgi environment of requests to the endpoint, without headers, and
+    # the template of their path
+    base_environ = EnvironBuilder(path=endpoint.path, method=endpoint.method).get_environ()
+    path_template = None
+    if endpoint.param_in_path:
+        path_template = UrlTemplate(endpoint.path)
+        path_names = [p.name for p in endpoint.operation.params.values() if p.location == 'path']
+
+    def report(e):
+        # As client callers do
+        c = error_callback
+        if hasattr(c, '__func__'):
+            c = c.__func__
+        return c(e)
+
+    def get_arguments(args, kwargs, headers):
+        body_json = None
+        if endpoint.param_in_body:
+            if len(args) != 1:
+                raise ValidationError("%s expects exactly 1 parameter" % endpoint.handler_client)
+            body_json = _item_to_json(api_spec, args[0])
+
+        if schema_only:
+            if endpoint.param_in_body:
+                if swagger_spec.config['validate_requests']:
+                    validate_schema_object(swagger_spec, body_spec, body_json)
+                args = [_clone_value(args[0], copy_on_write=True)]
+            return args, kwargs
+
+        req = LocalRequestProxy(endpoint.operation, kwargs, headers, body_json)
+        parameters = None
+        if endpoint.param_in_body or endpoint.param_in_query or endpoint.param_in_formdata:
+            parameters = _unmarshal_request(req, endpoint.operation)
+        return _get_handler_arguments(endpoint, dict(req.path), parameters)
+
+    def get_result(result):
+        if endpoint.produces_array:
+            if type(result) in (list, tuple) or isinstance(result, Iterator):
+                result = list(result)
+                if response_spec:
+                    validate_schema_object(swagger_spec, response_spec, [_item_to_json(api_spec, i) for i in result])
+                return [_clone_value(i, copy_on_write=True) for i in result]
+
+        if not result:
+            return report(PyMacaronCoreException("Have nothing to send in response"))
+
+        if not hasattr(result, '__module__') or not hasattr(result, '__class__'):
+            return report(PyMacaronCoreException("Method %s did not return a class instance but a %s" %
+                                                 (endpoint.handler_server, type(result))))
+
+        # Flask Responses, and pymacaron errors, are returned as they would
+        # be over http
+        if hasattr(result, 'http_reply'):
+            result = result.http_reply()
+        if isinstance(result, current_app.response_class):
+            return response_to_result(result, endpoint.method, endpoint.path, endpoint.operation, error_callback, None, api_spec.codec)
+
+        if response_spec:
+            validate_schema_object(swagger_spec, response_spec, api_spec.model_to_json(result))
+        return _clone_value(result, copy_on_write=True)
+
+    def local_handler(args, kwargs, headers):
+        # Same call ID and call path as in http requests
+        call_id = headers.get('PymCallID', None) or str(uuid.uuid4())
+        call_path = headers.get('PymCallPath', None)
+        call_path = "%s.%s" % (call_path, api_name) if call_path else api_name
+
+        # The handler may still look at the flask request's path and headers
+        environ = dict(base_environ)
+        if path_template:
+            # Path values are quoted as client callers quote them, and the
+            # path decoded into PATH_INFO as werkzeug does for http requests
+            try:
+                path = path_template.format({name: kwargs.get(name) for name in path_names})
+            except ValidationError as e:
+                return report(e)
+            environ['REQUEST_URI'] = environ['RAW_URI'] = path
+            environ['PATH_INFO'] = unquote(path).encode('utf-8').decode('latin1')
+        for k, v in headers.items():
+            k = k.upper().replace('-', '_')
+            environ[k if k in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + k] = v
+
+        with app.request_context(environ):
+
+            # The app context may be that of a request in progress, whose call
+            # ID and call path are restored after the call
+            top = stack.top
+            previous = top.__dict__.get('call_id'), top.__dict__.get('call_path')
+            top.call_id = call_id
+            top.call_path = call_path
+
+            try:
+                try:
+                    args, kwargs = get_arguments(args, kwargs, request.headers)
+                except jsonschema.exceptions.ValidationError as e:
+                    return report(ValidationError(str(e)))
+
+                result = handler_func(*args, **kwargs)
+
+                try:
+                    return get_result(result)
+                except jsonschema.exceptions.ValidationError as e:
+                    log.warn("Failed to validate response: %s" % e)
+                    return report(ValidationError("Failed to unmarshal response because: %s" % str(e)))
+
+            finally:
+                for k, v in zip(('call_id', 'call_path'), previous):
+                    if v is None:
+                        top.__dict__.pop(k, None)
+                    else:
+                        setattr(top, k, v)
+
+    return local_handler
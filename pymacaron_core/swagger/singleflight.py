@@ -0,0 +1,132 @@
+import logging
+import threading
+from pymacaron_core.models import _clone_value
+
+
+log = logging.getLogger(__name__)
+
+
+# Headers that differ between otherwise identical calls made on behalf of
+# different requests, and are not part of the keys of calls
+IGNORED_HEADERS = frozenset(['PymCallID', 'PymCallPath'])
+
+
+class _Flight():
+    """A call in progress, and the callers waiting for its result"""
+
+    __slots__ = ('done', 'waiters', 'result', 'exception', 'copies')
+
+    def __init__(self, done):
+        self.done = done
+        self.waiters = 0
+        self.result = None
+        self.exception = None
+        self.copies = []
+
+
+class SingleFlight():
+    """Make concurrent identical calls share one call: the first caller of a
+    key makes the call, and callers of the same key arriving while it is in
+    progress wait for it and get their own copy of its result, or the
+    exception it raised"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            'calls': 0,
+            'coalesced': 0,
+        }
+
+
+    def get_key(self, method, url, params, headers):
+        query = tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+        headers = tuple(sorted((k, v) for k, v in headers.items() if k not in IGNORED_HEADERS))
+        return (method, url, query, headers)
+
+
+    def call(self, key, f):
+        """Return the result of f(), or of the call to f() in progress with
+        the same key"""
+        with self._lock:
+            self.counters['calls'] += 1
+            flight = self._flights.get(key)
+            if flight:
+                self.counters['coalesced'] += 1
+                flight.waiters += 1
+                follower = True
+            else:
+                flight = _Flight(threading.Event())
+                self._flights[key] = flight
+                follower = False
+
+        if follower:
+            flight.done.wait()
+            return self._get_copy(flight)
+
+        try:
+            flight.result = f()
+        except BaseException as e:
+            flight.exception = e
+        self._land(key, flight)
+        flight.done.set()
+        if flight.exception:
+            raise flight.exception
+        return flight.result
+
+
+    async def call_async(self, key, f):
+        """Same as call, for a coroutine function f and callers in the same
+        event loop"""
+        import asyncio
+        loop = asyncio.get_event_loop()
+        key = (loop, key)
+        with self._lock:
+            self.counters['calls'] += 1
+            flight = self._flights.get(key)
+            if flight:
+                self.counters['coalesced'] += 1
+                flight.waiters += 1
+                follower = True
+            else:
+                flight = _Flight(loop.create_future())
+                self._flights[key] = flight
+                follower = False
+
+        if follower:
+            await asyncio.shield(flight.done)
+            return self._get_copy(flight)
+
+        try:
+            flight.result = await f()
+        except BaseException as e:
+            flight.exception = e
+        self._land(key, flight)
+        flight.done.set_result(True)
+        if flight.exception:
+            raise flight.exception
+        return flight.result
+
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._flights)
+            return stats
+
+
+    def _land(self, key, flight):
+        # Stop coalescing calls into that flight, and make a copy of its
+        # result for each of its waiters before the caller gets it
+        with self._lock:
+            del self._flights[key]
+            waiters = flight.waiters
+        if not flight.exception:
+            flight.copies = [_clone_value(flight.result, copy_on_write=True) for _ in range(waiters)]
+
+
+    def _get_copy(self, flight):
+        if flight.exception:
+            raise flight.exception
+        with self._lock:
+            return flight.copies.pop()
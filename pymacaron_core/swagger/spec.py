@@ -1,11 +1,28 @@
 import pprint
 import logging
+import functools
 from bravado_core.spec import Spec
 from bravado_core.operation import Operation
 from bravado_core.validate import validate_schema_object
+from bravado_core.swagger20_validator import get_validator_type
 from pymacaron_core.exceptions import ValidationError
 from pymacaron_core.models import generate_model_class
 from pymacaron_core.models import get_model
+from pymacaron_core.models import register_model_factory
+from pymacaron_core.models import models_lock
+from pymacaron_core.codec import get_json_codec
+from pymacaron_core.swagger.httppool import HttpPool
+from pymacaron_core.swagger.retry import get_retry_policy
+from pymacaron_core.swagger.retry import RetryPolicy
+from pymacaron_core.swagger.responsecache import ResponseCache
+from pymacaron_core.swagger.responsecache import EndpointCache
+from pymacaron_core.swagger.responsecache import get_endpoint_cache_options
+from pymacaron_core.swagger.singleflight import SingleFlight
+from pymacaron_core.swagger.hedge import Hedge
+from pymacaron_core.swagger.hedge import get_hedge_options
+from pymacaron_core.swagger.balancer import get_load_balancer
+from pymacaron_core.swagger.balancer import is_host_list
+from pymacaron_core.swagger.balancer import parse_host
 
 
 log = logging.getLogger(__name__)
@@ -22,6 +39,12 @@ class EndpointData():
     operation = None
     produces_json = False
     produces_html = False
+    produces_array = False
+    response_schema = None
+    retry = None
+    client_cache = None
+    coalesce = None
+    hedge = None
 
     param_in_body = False
     param_in_query = False
@@ -34,6 +57,22 @@ class EndpointData():
         self.path = path
         self.method = method.upper()
 
+def get_bravado_config(formats=None):
+    """Return the bravado-core config of the Spec objects of all apis"""
+    config = {
+        'validate_responses': True,
+        'validate_requests': True,
+        'validate_swagger_spec': False,
+        'use_models': True,
+    }
+
+    if formats:
+        assert type(formats).__name__ == 'list'
+        config['formats'] = formats
+
+    return config
+
+
 class ApiSpec():
     """Object holding the swagger spec as a YAML dict and a bravado-core Spec object,
     as well as methods for exploring the spec.
@@ -47,29 +86,40 @@ class ApiSpec():
     protocol = None
     version = None
     verify_ssl = True
+    lazy = False
+    codec = None
+    http_pool = None
+    async_http_pool = None
+    retry_policy = None
+    response_cache = None
+    single_flight = None
+    balancer = None
 
-    def __init__(self, swagger_dict, formats=None, host=None, port=None, proto=None, verify_ssl=True):
+    def __init__(self, swagger_dict, formats=None, host=None, port=None, proto=None, verify_ssl=True, lazy=False, json_codec=None, spec=None, pool_size=None, pool_max_connections=None, pool_keep_alive=True, retry_policy=None, client_cache=None, coalesce=False, hedge=None, local_dispatch=False, metrics=None, load_balancing=None):
 
         self.swagger_dict = swagger_dict
 
-        config = {
-            'validate_responses': True,
-            'validate_requests': True,
-            'validate_swagger_spec': False,
-            'use_models': True,
-        }
-
-        if formats:
-            assert type(formats).__name__ == 'list'
-            config['formats'] = formats
-
-        self.spec = Spec.from_dict(self.swagger_dict, config=config)
+        # Build the bravado-core Spec, unless given one built from swagger_dict
+        # with the same formats
+        if not spec:
+            spec = Spec.from_dict(self.swagger_dict, config=get_bravado_config(formats))
+        self.spec = spec
         self.definitions = self.spec.definitions
 
+        # bravado-core memoizes the spec's validator on first use, in a way
+        # that is not thread-safe: concurrent first validations (fan-out,
+        # hedged calls) raise RecursiveCallException. Build it now instead.
+        get_validator_type(self.spec)
+
         self.host = swagger_dict.get('host', None)
         if not self.host:
             raise Exception("Swagger file has no 'host' entry")
-        if host:
+        hosts = None
+        if is_host_list(host):
+            hosts = host
+        elif isinstance(host, tuple):
+            self.host, port = parse_host(host, port)
+        elif host:
             self.host = host
 
         schemes = swagger_dict.get('schemes', None)
@@ -88,48 +138,225 @@ class ApiSpec():
         if proto:
             self.protocol = proto
 
+        # Should client calls be spread over several hosts? (see
+        # balancer.LoadBalancer)
+        if hosts:
+            self.balancer = get_load_balancer(hosts, self.port, self.protocol, load_balancing)
+            self.host = self.balancer.upstreams[0].host
+            self.port = self.balancer.upstreams[0].port
+
         if not verify_ssl:
             self.verify_ssl = False
 
+        # Should nested models in responses and request bodies be unmarshalled
+        # on first access only?
+        self.lazy = lazy
+
+        # Which codec encodes and decodes json bodies? (None means flask's
+        # jsonify and the standard json library, as always)
+        if json_codec:
+            self.codec = get_json_codec(json_codec)
+
+        # Should client callers share a pool of connections to the server?
+        # (None means a new connection per call, as always)
+        if pool_size:
+            self.http_pool = HttpPool(pool_size, pool_max_connections, pool_keep_alive)
+
+        # How should client callers retry failed calls? (None means up to 3
+        # attempts without waiting, as always)
+        if retry_policy:
+            self.retry_policy = get_retry_policy(retry_policy)
+        self._endpoint_retry_policies = {}
+
+        # Should client callers cache the results of GET calls? (see
+        # get_endpoint_cache)
+        self.client_cache = client_cache
+
+        # Should concurrent identical GET calls share one call? (see
+        # get_single_flight)
+        self.coalesce = coalesce
+
+        # Should GET requests not answered after a delay be sent a second time?
+        # (see get_hedge)
+        self.hedge = hedge
+        self.hedges = {}
+
+        # Should local client calls call the server's handlers directly? (see
+        # server._generate_local_handler)
+        self.local_dispatch = local_dispatch
+        self.local_handlers = {}
+
+        # Registry recording the measurements of client calls, if any (see
+        # metrics.ClientMetrics)
+        self.metrics = metrics
+
         self.version = swagger_dict.get('info', {}).get('version', '')
 
 
-    def load_models(self, do_persist=True):
+    def load_models(self, do_persist=True, slots=False, cache_json=False, defer=False):
         """Generate PyMacaron Model classes for every data model in that API and store
-        them in the calling api object"""
+        them in the calling api object. If slots is true, model instances store
+        their property values in __slots__ instead of bravado instances. If
+        cache_json is true, model instances cache their json representation
+        until modified. If defer is true, each model class is only generated on
+        first access to it (see get_model_class)."""
+
+        self.model_options = {'do_persist': do_persist, 'slots': slots, 'cache_json': cache_json}
+        self.model_classes = {}
 
         names = []
         for model_name in self.definitions:
-
-            model_spec = self.swagger_dict['definitions'][model_name]
-
-            # Should this model inherit from a base class?
-            parent_name = None
-            if 'x-parent' in model_spec:
-                parent_name = model_spec['x-parent']
-
-            # Is this model persistent?
-            persist = None
-            if do_persist and 'x-persist' in model_spec:
-                persist = model_spec['x-persist']
-
-            # Associate model generator to ApiPool().<api_name>.model.<model_name>
-            log.debug("Generating model class for %s" % model_name)
-            generate_model_class(
-                name=model_name,
-                bravado_class=self.definitions.get(model_name),
-                swagger_dict=model_spec,
-                swagger_spec=self.spec,
-                parent_name=parent_name,
-                persist=persist,
-                properties=model_spec['properties'] if 'properties' in model_spec else {},
-            )
-
+            if defer:
+                register_model_factory(model_name, functools.partial(self.get_model_class, model_name))
+            else:
+                self.get_model_class(model_name)
             names.append(model_name)
 
         return names
 
 
+    def get_model_class(self, model_name):
+        """Return the PyMacaron Model class generated for the data model
+        model_name of that API, generating it if it does not exist yet"""
+        cls = self.model_classes.get(model_name)
+        if cls:
+            return cls
+        with models_lock:
+            return self._generate_model_class(model_name)
+
+
+    def _generate_model_class(self, model_name):
+        # Another thread may have generated it while we waited for the lock
+        cls = self.model_classes.get(model_name)
+        if cls:
+            return cls
+
+        model_spec = self.swagger_dict['definitions'][model_name]
+
+        # Should this model inherit from a base class?
+        parent_name = None
+        if 'x-parent' in model_spec:
+            parent_name = model_spec['x-parent']
+
+        # Is this model persistent?
+        persist = None
+        if self.model_options['do_persist'] and 'x-persist' in model_spec:
+            persist = model_spec['x-persist']
+
+        # Associate model generator to ApiPool().<api_name>.model.<model_name>
+        log.debug("Generating model class for %s" % model_name)
+        cls = generate_model_class(
+            name=model_name,
+            bravado_class=self.definitions.get(model_name),
+            swagger_dict=model_spec,
+            swagger_spec=self.spec,
+            parent_name=parent_name,
+            persist=persist,
+            properties=model_spec['properties'] if 'properties' in model_spec else {},
+            slots=self.model_options['slots'],
+            cache_json=self.model_options['cache_json'],
+        )
+
+        self.model_classes[model_name] = cls
+        return cls
+
+
+    def get_retry_policy(self, endpoint):
+        """Return the RetryPolicy of calls to endpoint: the api's, with the
+        options of the endpoint's x-retry if any, or None"""
+        if not endpoint.retry:
+            return self.retry_policy
+        key = (endpoint.method, endpoint.path)
+        policy = self._endpoint_retry_policies.get(key)
+        if not policy:
+            # One policy, and circuit breakers, for all threads' callers
+            with models_lock:
+                policy = self._endpoint_retry_policies.get(key)
+                if not policy:
+                    base = self.retry_policy or RetryPolicy()
+                    policy = base.derive(**endpoint.retry)
+                    self._endpoint_retry_policies[key] = policy
+        return policy
+
+
+    def get_endpoint_cache(self, endpoint):
+        """Return the EndpointCache of calls to endpoint, or None if their
+        results are not cached: only GET endpoints are, if either the api has
+        the client_cache option or the endpoint has x-client-cache"""
+        if endpoint.method != 'GET':
+            return None
+        options = get_endpoint_cache_options(self.client_cache, endpoint.client_cache)
+        if options is None:
+            return None
+        if not self.response_cache:
+            # Callers may be generated by several threads at once (see
+            # api.LazyAPIClient): they must all share one cache
+            with models_lock:
+                if not self.response_cache:
+                    max_entries = 1000
+                    if isinstance(self.client_cache, dict):
+                        max_entries = self.client_cache.get('max_entries', max_entries)
+                    self.response_cache = ResponseCache(max_entries)
+        return EndpointCache(self.response_cache, **options)
+
+
+    def get_single_flight(self, endpoint):
+        """Return the SingleFlight coalescing concurrent identical calls to
+        endpoint, or None if they are not coalesced: only GET endpoints are,
+        if the api has the coalesce option or the endpoint has x-coalesce, and
+        unless the endpoint has x-coalesce: false"""
+        if endpoint.method != 'GET':
+            return None
+        coalesce = self.coalesce if endpoint.coalesce is None else endpoint.coalesce
+        if not coalesce:
+            return None
+        if not self.single_flight:
+            # Like the response cache, shared by callers of all threads
+            with models_lock:
+                if not self.single_flight:
+                    self.single_flight = SingleFlight()
+        return self.single_flight
+
+
+    def get_hedge(self, endpoint):
+        """Return the Hedge of requests to endpoint, or None if they are not
+        hedged: only GET endpoints are, if either the api has the hedge option
+        or the endpoint has x-hedge"""
+        if endpoint.method != 'GET':
+            return None
+        key = endpoint.handler_client or endpoint.path
+        hedge = self.hedges.get(key)
+        if not hedge:
+            options = get_hedge_options(self.hedge, endpoint.hedge)
+            if options is None:
+                return None
+            # Shared by callers of all threads, which must update the same
+            # latency percentiles
+            with models_lock:
+                hedge = self.hedges.get(key)
+                if not hedge:
+                    hedge = self.hedges[key] = Hedge(**options)
+        return hedge
+
+
+    def get_retry_stats(self):
+        """Return the counters of all the retry policies of this api, summed,
+        or None if it has none"""
+        policies = list(self._endpoint_retry_policies.values())
+        if self.retry_policy:
+            policies.append(self.retry_policy)
+        if not policies:
+            return None
+        stats, seen = {}, []
+        for policy in policies:
+            if any(policy.counters is c for c in seen):
+                continue
+            seen.append(policy.counters)
+            for k, v in policy.stats().items():
+                stats[k] = stats.get(k, 0) + v
+        return stats
+
+
     def model_to_json(self, object, cleanup=True):
         """Take a model instance and return it as a json struct"""
         return object.to_json()
@@ -137,8 +364,22 @@ class ApiSpec():
 
     def json_to_model(self, model_name, j, keep_datetime=False):
         """Take a json struct and a model name, and return a model instance"""
-        cls = get_model(model_name, keep_datetime=keep_datetime)
-        return cls.from_json(j)
+        cls = get_model(model_name)
+        return cls.from_json(j, keep_datetime=keep_datetime)
+
+
+    def models_to_json(self, objects):
+        """Take a list of instances of the same model and return a list of json structs"""
+        objects = list(objects)
+        if not objects:
+            return []
+        return type(objects[0]).to_json_many(objects)
+
+
+    def json_to_models(self, model_name, js, keep_datetime=False):
+        """Take a list of json structs and a model name, and return a list of model instances"""
+        cls = get_model(model_name)
+        return cls.from_json_many(js, keep_datetime=keep_datetime)
 
 
     def validate(self, model_name, object):
@@ -150,9 +391,20 @@ class ApiSpec():
         return validate_schema_object(self.spec, model_def, object)
 
 
-    def call_on_each_endpoint(self, callback):
+    def validate_many(self, model_name, objects):
+        """Validate a list of objects against their swagger model, in one pass"""
+        if model_name not in self.swagger_dict['definitions']:
+            raise ValidationError("Swagger spec has no definition for model %s" % model_name)
+        model_def = self.swagger_dict['definitions'][model_name]
+        log.debug("Validating many %s" % model_name)
+        # Validating the list as an array of model_def builds only one validator
+        return validate_schema_object(self.spec, {'type': 'array', 'items': model_def}, objects)
+
+
+    def call_on_each_endpoint(self, callback, handler_client=None):
         """Find all server endpoints defined in the swagger spec and calls 'callback' for each,
-        with an instance of EndpointData as argument.
+        with an instance of EndpointData as argument. If handler_client is set,
+        only call 'callback' on the endpoint bound to that client method.
         """
 
         if 'paths' not in self.swagger_dict:
@@ -160,6 +412,9 @@ class ApiSpec():
 
         for path, d in list(self.swagger_dict['paths'].items()):
             for method, op_spec in list(d.items()):
+                if handler_client and op_spec.get('x-bind-client') != handler_client:
+                    continue
+
                 data = EndpointData(path, method)
 
                 # Which server method handles this endpoint?
@@ -188,6 +443,13 @@ class ApiSpec():
                 else:
                     raise Exception("Only 'application/json' or 'text/html' are supported. See %s %s" % (method, path))
 
+                # Does the endpoint return an array?
+                responses = op_spec.get('responses', {})
+                schema = (responses.get('200') or responses.get(200) or {}).get('schema')
+                if schema and self.spec.deref(schema).get('type') == 'array':
+                    data.produces_array = True
+                data.response_schema = schema
+
                 # Which client method handles this endpoint?
                 if 'x-bind-client' in op_spec:
                     data.handler_client = op_spec['x-bind-client']
@@ -200,6 +462,23 @@ class ApiSpec():
                 if 'x-decorate-request' in op_spec:
                     data.decorate_request = op_spec['x-decorate-request']
 
+                # Should calls to this endpoint be retried differently?
+                if 'x-retry' in op_spec:
+                    data.retry = op_spec['x-retry']
+
+                # Should the client cache results of calls to this endpoint?
+                if 'x-client-cache' in op_spec:
+                    data.client_cache = op_spec['x-client-cache']
+
+                # Should concurrent identical calls to this endpoint share one
+                # call?
+                if 'x-coalesce' in op_spec:
+                    data.coalesce = bool(op_spec['x-coalesce'])
+
+                # Should slow requests to this endpoint be hedged?
+                if 'x-hedge' in op_spec:
+                    data.hedge = op_spec['x-hedge']
+
                 # Generate a bravado-core operation object
                 data.operation = Operation.from_spec(self.spec, path, method, op_spec)
 
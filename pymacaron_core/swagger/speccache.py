@@ -0,0 +1,115 @@
+import os
+import re
+import sys
+import pickle
+import hashlib
+import logging
+import tempfile
+import yaml
+import bravado_core
+from bravado_core.model import create_model_type
+from bravado_core.resource import build_resources
+from bravado_core.spec import Spec
+from bravado_core.spec import build_api_serving_url
+
+
+log = logging.getLogger(__name__)
+
+
+# Bump whenever the content of cache files changes
+CACHE_FORMAT_VERSION = 1
+
+
+def load_yaml(yaml_str):
+    """Parse a swagger file, with the C-accelerated yaml loader if available"""
+    if hasattr(yaml, 'CFullLoader'):
+        return yaml.load(yaml_str, Loader=yaml.CFullLoader)
+    if hasattr(yaml, 'FullLoader'):
+        return yaml.load(yaml_str, Loader=yaml.FullLoader)
+    # Versions of PyYAML without Loader
+    return yaml.load(yaml_str)
+
+
+def get_cache_key(yaml_str, config):
+    """Return a key identifying the spec built from the swagger file yaml_str
+    with the bravado-core config, by the current versions of the libraries
+    involved"""
+    h = hashlib.sha256()
+    for s in (
+        str(CACHE_FORMAT_VERSION),
+        sys.version,
+        bravado_core.version,
+        yaml.__version__,
+        repr(sorted((k, v) for k, v in config.items() if k != 'formats')),
+        repr(sorted(f.format for f in config.get('formats', []))),
+    ):
+        h.update(s.encode('utf-8'))
+        h.update(b'\0')
+    h.update(yaml_str.encode('utf-8') if isinstance(yaml_str, str) else yaml_str)
+    return h.hexdigest()
+
+
+def load_spec(cache_dir, key, config):
+    """Return the swagger dict and the bravado-core Spec cached under key in
+    cache_dir, or (None, None) if there are none. The Spec is rebuilt from a
+    swagger dict whose $refs were already resolved, and whose models were
+    already discovered, which skips most of the work of Spec.from_dict."""
+    path = os.path.join(cache_dir, '%s.pickle' % key)
+    if not os.path.isfile(path):
+        return None, None
+
+    try:
+        with open(path, 'rb') as f:
+            swagger_dict, model_references = pickle.load(f)
+
+        spec = Spec(swagger_dict, config=config)
+        for model_name, json_reference in model_references:
+            _, model_spec = spec.resolver.resolve(json_reference)
+            spec.definitions[model_name] = create_model_type(
+                swagger_spec=spec,
+                model_name=model_name,
+                model_spec=model_spec,
+                json_reference=json_reference,
+            )
+        for user_defined_format in spec.config['formats']:
+            spec.register_format(user_defined_format)
+        spec.resources = build_resources(spec)
+        spec.api_url = build_api_serving_url(
+            spec_dict=swagger_dict,
+            origin_url=spec.origin_url,
+            use_spec_url_for_base_path=spec.config['use_spec_url_for_base_path'],
+        )
+    except Exception as e:
+        log.warning("Ignoring unreadable spec cache file %s: %s" % (path, e))
+        return None, None
+
+    log.info("Loaded swagger spec from cache file %s" % path)
+    return swagger_dict, spec
+
+
+def save_spec(cache_dir, key, swagger_dict, spec):
+    """Cache the swagger dict and bravado-core Spec under key in cache_dir.
+    Specs referencing other files or urls are not cached."""
+    for uri in spec.resolver.store:
+        if uri and not re.match(r'https?://json-schema.org/', uri):
+            log.info("Not caching swagger spec referencing %s" % uri)
+            return
+
+    model_references = [(name, model._json_reference) for name, model in spec.definitions.items()]
+
+    # Write to a temporary file then rename it, so that concurrent workers
+    # never read a partially written file
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    except OSError as e:
+        log.warning("Failed to cache swagger spec in %s: %s" % (cache_dir, e))
+        return
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((swagger_dict, model_references), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(cache_dir, '%s.pickle' % key))
+    except Exception as e:
+        log.warning("Failed to cache swagger spec in %s: %s" % (cache_dir, e))
+        os.remove(tmp_path)
@@ -0,0 +1,107 @@
+import re
+from urllib.parse import quote, quote_plus
+from pymacaron_core.exceptions import ValidationError
+
+
+# Path parameters in flask-style urls, as in /v1/item/<item_id>
+_SLOT = re.compile(r'<([^<>]+)>')
+
+
+# Percent-encoding of ascii characters other than unreserved ones, as quote
+# and quote_plus do, applied to ascii values with str.translate
+_UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~')
+_PATH_TABLE = {c: '%%%02X' % c for c in range(128) if chr(c) not in _UNRESERVED}
+_QUERY_TABLE = dict(_PATH_TABLE)
+_QUERY_TABLE[ord(' ')] = '+'
+
+
+def _quote_path_value(v):
+    if type(v) is not str:
+        v = str(v)
+    return v.translate(_PATH_TABLE) if v.isascii() else quote(v, safe='')
+
+
+def _quote_query_value(v):
+    if type(v) is bytes:
+        return quote_plus(v)
+    if type(v) is not str:
+        v = str(v)
+    return v.translate(_QUERY_TABLE) if v.isascii() else quote_plus(v)
+
+
+class UrlTemplate():
+    """The url of an endpoint, compiled once into its constant parts and the
+    slots of its path parameters, that formats the url of each call along
+    with its query string.
+
+    Parameters are looked up by name: path parameters are percent-encoded into
+    their slots, query parameters are encoded as requests does, in the order
+    in which the endpoint declares them, and skipped if None. Missing path
+    parameters or required query parameters, and parameters the endpoint does
+    not declare, raise a ValidationError.
+    """
+
+    def __init__(self, url, params=()):
+        self.url = url
+
+        # Constant parts of the url, between slots
+        parts = _SLOT.split(url)
+        self._head = parts[0]
+        self._slots = list(zip(parts[1::2], parts[2::2]))
+        path_names = set(parts[1::2])
+
+        # Query parameters, as (name, encoded name, required)
+        self._query = []
+        self._known = set(path_names)
+        for param in params:
+            self._known.add(param.name)
+            if param.location == 'query' and param.name not in path_names:
+                self._query.append((param.name, quote_plus(param.name) + '=', param.required))
+
+
+    def format(self, kwargs):
+        """Return the url of a call with the parameters in the dict kwargs"""
+        return self._format(kwargs, None)
+
+
+    def format_with_params(self, kwargs):
+        """Same as format, but return the url without its query string, and a
+        dict of the query parameters, to be encoded by requests"""
+        params = {}
+        url = self._format(kwargs, params)
+        return url, params
+
+
+    def _format(self, kwargs, params):
+        # Add the query parameters to params if it is a dict, or else to the
+        # url
+        parts = [self._head]
+        for name, constant in self._slots:
+            value = kwargs.get(name, None)
+            if value is None:
+                raise ValidationError("Missing some arguments to format url: %s" % self.url)
+            parts.append(_quote_path_value(value))
+            parts.append(constant)
+
+        separator = '?'
+        for name, prefix, required in self._query:
+            value = kwargs.get(name, None)
+            if value is None:
+                if required:
+                    raise ValidationError("Missing required query parameter '%s' to call %s" % (name, self.url))
+                continue
+            if params is not None:
+                params[name] = value
+            elif type(value) in (list, tuple):
+                for v in value:
+                    parts.append(separator + prefix + _quote_query_value(v))
+                    separator = '&'
+            else:
+                parts.append(separator + prefix + _quote_query_value(value))
+                separator = '&'
+
+        if not self._known.issuperset(kwargs):
+            unknown = sorted(k for k in kwargs if k not in self._known)
+            raise ValidationError("Unknown parameter(s) %s to call %s" % (', '.join(unknown), self.url))
+
+        return ''.join(parts)
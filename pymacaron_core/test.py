@@ -26,3 +26,12 @@ class FunnyDad(FunnyGrandad):
 
     def lol(self):
         return 'lol'
+
+
+# Dummy decorator of client requests (see x-decorate-request)
+def add_test_header(f):
+    def decorated(url, **kwargs):
+        kwargs['headers']['X-Test'] = 'decorated'
+        kwargs['headers']['X-Test-Params'] = ','.join(sorted(kwargs.get('params') or {}))
+        return f(url, **kwargs)
+    return decorated
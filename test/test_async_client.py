@@ -0,0 +1,186 @@
+import os
+import imp
+import json
+import asyncio
+import unittest
+from flask import Flask, request
+from mock import patch
+from pymacaron_core.exceptions import PyMacaronCoreException, ValidationError
+from pymacaron_core.models import PyMacaronModel
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger import asyncclient
+from pymacaron_core.swagger.asyncclient import AsyncHttpPool
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+try:
+    from flask import _app_ctx_stack as stack
+except ImportError:
+    from flask import _request_ctx_stack as stack
+
+
+@unittest.skipIf(not asyncclient.aiohttp, "aiohttp is not installed")
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = utils.start_scripted_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.stop_scripted_server(cls.server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+
+    def new_api(self, yaml_str, **kwargs):
+        return API('somename', yaml_str=yaml_str, host='127.0.0.1', port=self.server.server_address[1], **kwargs)
+
+    def run_with_api(self, api, coroutine):
+        async def run():
+            try:
+                return await coroutine
+            finally:
+                await api.close_async_client()
+        return asyncio.run(run())
+
+
+    def test_async_client_with_query_param(self):
+        api = self.new_api(self.yaml_query_param)
+        self.assertTrue(asyncio.iscoroutinefunction(api.async_client.do_test))
+
+        async def calls():
+            return await asyncio.gather(*[
+                api.async_client.do_test(arg1='this', arg2=str(i), request_headers={'X-Foo': 'bar'})
+                for i in range(5)
+            ])
+
+        results = self.run_with_api(api, calls())
+        self.assertEqual(len(results), 5)
+        for res in results:
+            self.assertTrue(isinstance(res, PyMacaronModel))
+            self.assertEqual(type(res).__name__, 'Result')
+            self.assertEqual(res.to_json(), {'foo': 'a', 'bar': 'b'})
+
+        paths = sorted(r[1] for r in utils.ScriptedHandler.requests)
+        self.assertEqual(paths, ['/v1/some/path?arg1=this&arg2=%s' % i for i in range(5)])
+        for _, _, headers, _ in utils.ScriptedHandler.requests:
+            self.assertEqual(headers['X-Foo'], 'bar')
+            self.assertEqual(headers['Content-Type'], 'application/json')
+
+
+    def test_async_client_with_body_param(self):
+        api = self.new_api(self.yaml_body_param, json_codec='json')
+        param = api.model.Param(arg1='a', arg2='b')
+        res = self.run_with_api(api, api.async_client.do_test(param, lazy=True))
+        self.assertEqual(res.to_json(), {'foo': 'a', 'bar': 'b'})
+
+        method, _, _, body = utils.ScriptedHandler.requests[0]
+        self.assertEqual(method, 'POST')
+        self.assertEqual(json.loads(body.decode('utf-8')), {'arg1': 'a', 'arg2': 'b'})
+
+
+    def test_async_client_errors(self):
+        api = self.new_api(self.yaml_query_param)
+
+        utils.ScriptedHandler.scripted = [(0, 500, {'error': 'boom'})]
+        with self.assertRaises(PyMacaronCoreException) as e:
+            self.run_with_api(api, api.async_client.do_test(arg1='this', arg2='that'))
+        self.assertEqual(e.exception.status_code, 500)
+
+        utils.ScriptedHandler.scripted = [(0, 200, {'foo': 1})]
+        with self.assertRaises(ValidationError):
+            self.run_with_api(api, api.async_client.do_test(arg1='this', arg2='that'))
+
+        with self.assertRaises(AttributeError):
+            api.async_client.do_foo
+
+
+    def test_async_client_retries_read_timeouts(self):
+        api = self.new_api(self.yaml_query_param)
+
+        # GETs are retried
+        utils.ScriptedHandler.scripted = [(0.5, 200, {'foo': 'slow'})]
+        res = self.run_with_api(api, api.async_client.do_test(arg1='this', arg2='that', read_timeout=0.2))
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        # Until max_attempts is reached
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0.5, 200, {'foo': 'slow'})] * 2
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_with_api(api, api.async_client.do_test(arg1='this', arg2='that', read_timeout=0.2, max_attempts=2))
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        # POSTs are not
+        api = self.new_api(self.yaml_body_param)
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0.5, 200, {'foo': 'slow'})]
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_with_api(api, api.async_client.do_test(api.model.Param(arg1='a'), read_timeout=0.2))
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+
+    def test_async_client_decorate_request(self):
+        yaml_str = self.yaml_query_param.replace(
+            'x-bind-client: do_test',
+            'x-bind-client: do_test\n      x-decorate-request: pymacaron_core.test.add_test_header',
+        )
+        api = self.new_api(yaml_str, pool_size=2)
+        res = self.run_with_api(api, api.async_client.do_test(arg1='this', arg2='that'))
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(utils.ScriptedHandler.requests[0][2]['X-Test'], 'decorated')
+        self.assertEqual(utils.ScriptedHandler.requests[0][2]['X-Test-Params'], 'arg1,arg2')
+        self.assertEqual(utils.ScriptedHandler.requests[0][1], '/v1/some/path?arg1=this&arg2=that')
+
+
+    def test_one_async_pool_per_api(self):
+        # Async callers generated by several threads at once share the api's
+        # pool
+        api = self.new_api(self.yaml_query_param)
+        api.api_spec.async_http_pool = None
+        slow_pool = utils.slowed(AsyncHttpPool)
+
+        def generate():
+            asyncclient.generate_async_client_callers(api.api_spec, 10, None, False, None)
+            return api.api_spec.async_http_pool
+
+        with patch('pymacaron_core.swagger.asyncclient.AsyncHttpPool', side_effect=slow_pool) as patched:
+            results, errors = utils.run_threads(generate)
+        self.assertEqual(errors, [])
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_async_local_client_call_context(self, func):
+        func.__name__ = 'return_token'
+        yaml_str = self.yaml_no_param.replace(
+            'x-bind-server: pymacaron_core.test.return_token',
+            'x-bind-server: pymacaron_core.test.return_token\n      x-bind-client: do_test',
+        )
+        api = API('somename', yaml_str=yaml_str.replace('200:', "'200':"), local=True)
+        app = Flask('test')
+        api.spawn_api(app)
+
+        seen = {}
+
+        def handler():
+            seen['call_id'] = request.headers.get('PymCallID')
+            seen['call_path'] = request.headers.get('PymCallPath')
+            return api.model.SessionToken(token='1')
+
+        func.side_effect = handler
+
+        # Local calls run in another thread, but still send the call ID and
+        # call path of the flask app context they are made from
+        with app.app_context():
+            stack.top.call_id = 'abc'
+            stack.top.call_path = 'public'
+            res = self.run_with_api(api, api.async_client.do_test())
+
+        self.assertEqual(res.token, '1')
+        self.assertEqual(seen, {'call_id': 'abc', 'call_path': 'public'})
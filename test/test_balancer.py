@@ -0,0 +1,229 @@
+import os
+import imp
+import time
+import socket
+import asyncio
+from pymacaron_core.exceptions import PyMacaronCoreException
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger import asyncclient
+from pymacaron_core.swagger.balancer import LoadBalancer
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+def get_free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servers = [utils.start_scripted_server() for _ in range(3)]
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers:
+            utils.stop_scripted_server(server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+
+    def address(self, server):
+        return '127.0.0.1:%s' % server.server_address[1]
+
+    def new_api(self, hosts=None, **kwargs):
+        hosts = hosts or [self.address(s) for s in self.servers]
+        return API('somename', yaml_str=self.yaml_query_param, host=hosts, **kwargs)
+
+    def hosts_called(self):
+        return [r[2]['Host'] for r in utils.ScriptedHandler.requests]
+
+
+    def test_spread_calls(self):
+        api = self.new_api()
+        self.assertEqual(api.api_spec.host, '127.0.0.1')
+        self.assertEqual(api.api_spec.port, self.servers[0].server_address[1])
+
+        for _ in range(30):
+            self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+
+        hosts = self.hosts_called()
+        self.assertEqual(sorted(set(hosts)), sorted(self.address(s) for s in self.servers))
+        self.assertTrue(all(r[1] == '/v1/some/path?arg1=this&arg2=that' for r in utils.ScriptedHandler.requests))
+
+        stats = api.get_balancer_stats()
+        self.assertEqual(sorted(stats.keys()), sorted(set(hosts)))
+        for address, s in stats.items():
+            self.assertEqual(s['requests'], hosts.count(address))
+            self.assertEqual(s['outstanding'], 0)
+            self.assertEqual(s['failures'], 0)
+            self.assertFalse(s['ejected'])
+
+        # Apis calling a single host have no balancer
+        api = API('somename', yaml_str=self.yaml_query_param, host='127.0.0.1', port=self.servers[0].server_address[1])
+        self.assertIsNone(api.api_spec.balancer)
+        self.assertIsNone(api.get_balancer_stats())
+
+        # Nor those given a single (host, port) tuple
+        api = API('somename', yaml_str=self.yaml_query_param, host=('127.0.0.1', self.servers[1].server_address[1]))
+        self.assertIsNone(api.api_spec.balancer)
+        self.assertEqual(api.api_spec.host, '127.0.0.1')
+        self.assertEqual(api.api_spec.port, self.servers[1].server_address[1])
+        utils.ScriptedHandler.requests = []
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+        self.assertEqual(self.hosts_called(), [self.address(self.servers[1])])
+
+        # But tuples of hosts are several hosts
+        api = self.new_api(hosts=tuple(self.address(s) for s in self.servers[:2]))
+        self.assertEqual(len(api.api_spec.balancer.upstreams), 2)
+        api = self.new_api(hosts=(('127.0.0.1', 81), ('127.0.0.1', 82)))
+        self.assertEqual([u.address for u in api.api_spec.balancer.upstreams], ['127.0.0.1:81', '127.0.0.1:82'])
+
+
+    def test_strategies(self):
+        lb = LoadBalancer(['a', 'b:81', ('c', 82)], 80, 'http')
+        self.assertEqual([u.address for u in lb.upstreams], ['a:80', 'b:81', 'c:82'])
+        self.assertEqual(lb.get_url(lb.upstreams[2], 'http://a:80/v1/x?y=1'), 'http://c:82/v1/x?y=1')
+
+        # Least outstanding requests
+        picked = [lb.acquire() for _ in range(3)]
+        self.assertEqual(len(set(picked)), 3)
+        lb.release(picked[1], True)
+        self.assertIs(lb.acquire(), picked[1])
+
+        # Power of two choices
+        lb = LoadBalancer(['a', 'b'], 80, 'http', strategy='power_of_two')
+        u = lb.acquire()
+        for _ in range(10):
+            v = lb.acquire()
+            self.assertIsNot(v, u)
+            lb.release(v, True)
+
+        # Hosts already tried are avoided, unless they are the only ones left
+        lb = LoadBalancer(['a', 'b'], 80, 'http')
+        u = lb.acquire()
+        lb.release(u, True)
+        v = lb.acquire(exclude=[u])
+        self.assertIsNot(v, u)
+        lb.release(v, True)
+        self.assertIn(lb.acquire(exclude=[u, v]), [u, v])
+
+        with self.assertRaises(PyMacaronCoreException):
+            LoadBalancer(['a'], 80, 'http', strategy='random')
+        with self.assertRaises(PyMacaronCoreException):
+            LoadBalancer([], 80, 'http')
+        with self.assertRaises(PyMacaronCoreException):
+            self.new_api(load_balancing={'strategy': 'round_robin'}).api_spec
+
+
+    def test_ejection(self):
+        lb = LoadBalancer(['a', 'b'], 80, 'http', max_failures=2, eject_time=0.1)
+        a, b = lb.upstreams
+
+        # A success resets the count of consecutive failures
+        for success in (False, True, False):
+            lb.acquire(exclude=[b])
+            lb.release(a, success)
+        self.assertFalse(lb.stats()['a:80']['ejected'])
+
+        lb.acquire(exclude=[b])
+        lb.release(a, False)
+        self.assertEqual(lb.stats()['a:80'], {'requests': 4, 'failures': 3, 'ejections': 1, 'outstanding': 0, 'ejected': True})
+        for _ in range(5):
+            self.assertIs(lb.acquire(exclude=[b]), b)
+
+        # A single request probes the host when its ejection ends, and ejects
+        # it again if it fails
+        time.sleep(0.1)
+        self.assertIs(lb.acquire(exclude=[b]), a)
+        self.assertIs(lb.acquire(exclude=[b]), b)
+        lb.release(a, False)
+        self.assertTrue(lb.stats()['a:80']['ejected'])
+        self.assertIs(lb.acquire(exclude=[b]), b)
+
+        time.sleep(0.1)
+        self.assertIs(lb.acquire(exclude=[b]), a)
+        lb.release(a, True)
+        self.assertFalse(lb.stats()['a:80']['ejected'])
+        self.assertIs(lb.acquire(exclude=[b]), a)
+
+        # When all hosts are ejected, they are called anyway
+        lb = LoadBalancer(['a'], 80, 'http', max_failures=1)
+        u = lb.acquire()
+        lb.release(u, False)
+        self.assertIs(lb.acquire(), u)
+
+
+    def test_dead_host(self):
+        dead = '127.0.0.1:%s' % get_free_port()
+        live = self.address(self.servers[0])
+        api = self.new_api(hosts=[dead, live], load_balancing={'max_failures': 2, 'eject_time': 0.3})
+
+        # Calls sent to the dead host are retried on the other one
+        for _ in range(10):
+            self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+        self.assertEqual(self.hosts_called(), [live] * 10)
+
+        stats = api.get_balancer_stats()[dead]
+        self.assertTrue(stats['ejected'])
+        self.assertEqual(stats['ejections'], 1)
+        self.assertEqual(stats['failures'], 2)
+
+        # Until it is probed again
+        for _ in range(10):
+            api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(api.get_balancer_stats()[dead]['requests'], 2)
+        time.sleep(0.3)
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(api.get_balancer_stats()[dead]['requests'], 3)
+
+        # Calls that are not safe to retry fail
+        api = API('somename', yaml_str=self.yaml_body_param, host=[dead])
+        with self.assertRaises(Exception):
+            api.client.do_test(api.model.Param(arg1='this', arg2='that'))
+        self.assertEqual(api.get_balancer_stats()[dead]['requests'], 1)
+
+
+    def test_retries_prefer_another_host(self):
+        api = self.new_api(retry_policy={'backoff_base': 0})
+        for _ in range(5):
+            utils.ScriptedHandler.requests = []
+            utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'})]
+            self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+            hosts = self.hosts_called()
+            self.assertEqual(len(hosts), 2)
+            self.assertNotEqual(hosts[0], hosts[1])
+
+        # Without a retry policy
+        dead = '127.0.0.1:%s' % get_free_port()
+        api = self.new_api(hosts=[dead, dead, self.address(self.servers[1])])
+        utils.ScriptedHandler.requests = []
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+        self.assertEqual(self.hosts_called(), [self.address(self.servers[1])])
+
+
+    def test_async_balancing(self):
+        if not asyncclient.aiohttp:
+            self.skipTest("aiohttp is not installed")
+
+        dead = '127.0.0.1:%s' % get_free_port()
+        api = self.new_api(hosts=[dead] + [self.address(s) for s in self.servers])
+
+        async def call():
+            try:
+                return await asyncio.gather(*[api.async_client.do_test(arg1='this', arg2='that') for _ in range(20)])
+            finally:
+                await api.close_async_client()
+
+        self.assertEqual([r.foo for r in asyncio.run(call())], ['a'] * 20)
+        self.assertEqual(len(set(self.hosts_called())), 3)
+        stats = api.get_balancer_stats()
+        self.assertEqual(sum(s['outstanding'] for s in stats.values()), 0)
+        self.assertEqual(sum(s['requests'] for s in stats.values()), 20 + stats[dead]['requests'])
@@ -0,0 +1,67 @@
+import unittest
+import json
+from decimal import Decimal
+from flask import Flask, request
+from werkzeug.exceptions import BadRequest
+from pymacaron_core.codec import get_json_codec, JsonCodec, StdlibJsonCodec, OrjsonCodec
+from pymacaron_core.exceptions import PyMacaronCoreException
+from pymacaron_core.swagger.request import FlaskRequestProxy
+import pymacaron_core.codec
+
+
+class Tests(unittest.TestCase):
+
+    def codecs(self):
+        names = [name for name in ('json', 'orjson', 'ujson') if getattr(pymacaron_core.codec, name)]
+        return [get_json_codec(name) for name in names]
+
+
+    def test_get_json_codec(self):
+        self.assertTrue(isinstance(get_json_codec('json'), StdlibJsonCodec))
+        if pymacaron_core.codec.orjson:
+            self.assertTrue(isinstance(get_json_codec('auto'), OrjsonCodec))
+
+        codec = StdlibJsonCodec()
+        self.assertTrue(get_json_codec(codec) is codec)
+
+        with self.assertRaises(PyMacaronCoreException):
+            get_json_codec('foobar')
+
+
+    def test_dumps_loads(self):
+        j = {'s': 'é/"', 'i': 1, 'f': 1.5, 'b': True, 'n': None, 'l': [1, {'a': []}]}
+        for codec in self.codecs():
+            b = codec.dumps(j)
+            self.assertEqual(type(b), bytes)
+            self.assertEqual(json.loads(b.decode('utf-8')), j)
+            self.assertEqual(codec.loads(b), j)
+            self.assertEqual(codec.loads(b.decode('utf-8')), j)
+
+            # Compact, so that arrays can be spliced by the streaming server
+            self.assertEqual(codec.dumps([1, 2]), b'[1,2]')
+
+            # Values unsupported by fast codecs fall back to the stdlib
+            self.assertEqual(codec.dumps({'d': 2 ** 70}), b'{"d":1180591620717411303424}')
+
+
+    def test_custom_codec(self):
+        class DecimalCodec(JsonCodec):
+            def dumps(self, o):
+                return json.dumps(o, default=float).encode('utf-8')
+
+            def loads(self, s):
+                return json.loads(s, parse_float=Decimal)
+
+        codec = get_json_codec(DecimalCodec())
+        self.assertEqual(codec.loads(codec.dumps({'d': Decimal('1.5')})), {'d': Decimal('1.5')})
+
+
+    def test_flask_request_proxy(self):
+        app = Flask('test')
+        for codec in self.codecs():
+            with app.test_request_context('/', method='POST', data='{"a":"é"}'.encode('utf-8'), content_type='application/json'):
+                self.assertEqual(FlaskRequestProxy(request, True, codec).json(), {'a': 'é'})
+
+            with app.test_request_context('/', method='POST', data=b'{"a":', content_type='application/json'):
+                with self.assertRaises(BadRequest):
+                    FlaskRequestProxy(request, True, codec)
@@ -0,0 +1,121 @@
+import os
+import imp
+import time
+import types
+from flask import Flask
+from pymacaron_core.exceptions import PyMacaronCoreException
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger.apipool import ApiPool
+from pymacaron_core.swagger.fanout import gather
+from pymacaron_core.swagger.client import set_call_context
+
+try:
+    from flask import _app_ctx_stack as stack
+except ImportError:
+    from flask import _request_ctx_stack as stack
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = utils.start_scripted_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.stop_scripted_server(cls.server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+        self.api = API('somename', yaml_str=self.yaml_query_param, host='127.0.0.1', port=self.server.server_address[1])
+
+
+    def test_gather(self):
+        utils.ScriptedHandler.delay = 0.2
+        client = self.api.client
+
+        t0 = time.time()
+        results = ApiPool.gather(*[lambda i=i: client.do_test(arg1='this', arg2=str(i)) for i in range(5)])
+        self.assertLess(time.time() - t0, 0.8)
+
+        self.assertEqual([r.foo for r in results], ['a'] * 5)
+        self.assertEqual(utils.ScriptedHandler.max_in_flight, 5)
+        self.assertEqual(sorted(r[1] for r in utils.ScriptedHandler.requests), ['/v1/some/path?arg1=this&arg2=%s' % i for i in range(5)])
+
+
+    def test_map(self):
+        utils.ScriptedHandler.delay = 0.05
+        items = [{'arg1': 'this', 'arg2': str(i)} for i in range(6)]
+
+        results = self.api.client.do_test.map(items, concurrency=2, request_headers={'X-Foo': 'bar'})
+        self.assertEqual([r.foo for r in results], ['a'] * 6)
+        self.assertEqual(utils.ScriptedHandler.max_in_flight, 2)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 6)
+        for _, _, headers, _ in utils.ScriptedHandler.requests:
+            self.assertEqual(headers['X-Foo'], 'bar')
+
+        # Items are not modified
+        self.assertEqual(items[0], {'arg1': 'this', 'arg2': '0'})
+
+
+    def test_errors(self):
+        def fail():
+            raise PyMacaronCoreException('boom')
+
+        results = gather(lambda: 1, fail, lambda: 3, return_exceptions=True)
+        self.assertEqual(results[0], 1)
+        self.assertTrue(isinstance(results[1], PyMacaronCoreException))
+        self.assertEqual(results[2], 3)
+
+        with self.assertRaises(PyMacaronCoreException):
+            gather(lambda: 1, fail, lambda: 3)
+
+        # Calls not started yet when an error occurs are not made
+        calls = []
+
+        def call(i):
+            calls.append(i)
+            if i == 0:
+                raise PyMacaronCoreException('boom')
+            return i
+
+        with self.assertRaises(PyMacaronCoreException):
+            gather(*[lambda i=i: call(i) for i in range(10)], concurrency=1)
+        self.assertEqual(calls, [0])
+
+
+    def test_nested_gather(self):
+        # Calls fanned out from fanned out calls run in the calling thread
+        results = gather(*[lambda i=i: gather(lambda: i, lambda: i + 1) for i in range(3)], concurrency=2)
+        self.assertEqual(results, [[0, 1], [1, 2], [2, 3]])
+
+
+    def test_call_id_and_path_propagate(self):
+        app = Flask('test')
+        with app.app_context():
+            stack.top.call_id = 'abc'
+            stack.top.call_path = 'public.user'
+            self.api.client.do_test.map([{'arg1': 'a', 'arg2': str(i)} for i in range(3)])
+
+        self.assertEqual(len(utils.ScriptedHandler.requests), 3)
+        for _, _, headers, _ in utils.ScriptedHandler.requests:
+            self.assertEqual(headers['PymCallID'], 'abc')
+            self.assertEqual(headers['PymCallPath'], 'public.user')
+
+        # Without a flask app context, no headers are sent
+        utils.ScriptedHandler.reset()
+        self.api.client.do_test.map([{'arg1': 'a', 'arg2': str(i)} for i in range(3)])
+        for _, _, headers, _ in utils.ScriptedHandler.requests:
+            self.assertNotIn('PymCallID', headers)
+
+        # A call context set explicitly takes precedence
+        set_call_context(types.SimpleNamespace(call_id='xyz'))
+        try:
+            self.api.client.do_test(arg1='a', arg2='b')
+        finally:
+            set_call_context(None)
+        self.assertEqual(utils.ScriptedHandler.requests[-1][2]['PymCallID'], 'xyz')
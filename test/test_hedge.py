@@ -0,0 +1,166 @@
+import os
+import imp
+import time
+import asyncio
+from mock import patch
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger import asyncclient
+from pymacaron_core.swagger import hedge
+from pymacaron_core.swagger.hedge import Hedge
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = utils.start_scripted_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.stop_scripted_server(cls.server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+
+    def new_api(self, yaml_str=None, **kwargs):
+        return API('somename', yaml_str=yaml_str or self.yaml_query_param, host='127.0.0.1', port=self.server.server_address[1], **kwargs)
+
+
+    def test_hedge_wins(self):
+        api = self.new_api(hedge={'delay': 0.1, 'max_ratio': 1})
+        utils.ScriptedHandler.scripted = [(0.5, 200, {'foo': 'slow'})]
+
+        t0 = time.time()
+        res = api.client.do_test(arg1='this', arg2='that')
+        self.assertLess(time.time() - t0, 0.4)
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+        self.assertEqual(utils.ScriptedHandler.requests[0][1], utils.ScriptedHandler.requests[1][1])
+
+        stats = api.get_hedge_stats()['do_test']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['hedged'], 1)
+        self.assertEqual(stats['hedge_wins'], 1)
+        self.assertEqual(stats['delay'], 0.1)
+
+        # Fast requests are not hedged
+        utils.ScriptedHandler.requests = []
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+
+    def test_primary_wins(self):
+        api = self.new_api(hedge={'delay': 0.1, 'max_ratio': 1})
+        utils.ScriptedHandler.scripted = [(0.15, 200, {'foo': 'first'}), (0.5, 200, {'foo': 'hedge'})]
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'first')
+        self.assertEqual(api.get_hedge_stats()['do_test']['primary_wins'], 1)
+
+
+    def test_hedge_ratio_and_options(self):
+        # At most max_ratio of requests are hedged
+        api = self.new_api(hedge={'delay': 0.05})
+        utils.ScriptedHandler.scripted = [(0.2, 200, {'foo': 'slow'})]
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'slow')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+        self.assertEqual(api.get_hedge_stats()['do_test']['denied'], 1)
+
+        # Endpoints may opt in or out
+        yaml_str = self.yaml_query_param.replace('x-bind-client: do_test', 'x-bind-client: do_test\n      x-hedge: %s')
+        api = self.new_api(yaml_str=yaml_str % '{delay: 0.05, max_ratio: 1}')
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0.2, 200, {'foo': 'slow'})]
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        api = self.new_api(yaml_str=yaml_str % 'false', hedge={'delay': 0.05, 'max_ratio': 1})
+        utils.ScriptedHandler.scripted = [(0.2, 200, {'foo': 'slow'})]
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'slow')
+        self.assertEqual(api.get_hedge_stats(), None)
+
+        # POSTs are never hedged
+        api = self.new_api(yaml_str=self.yaml_body_param, hedge={'delay': 0.05, 'max_ratio': 1})
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0.2, 200, {'foo': 'slow'})]
+        self.assertEqual(api.client.do_test(api.model.Param(arg1='a')).foo, 'slow')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+
+    def test_hedge_pool_saturated(self):
+        api = self.new_api(hedge={'delay': 0.05, 'max_ratio': 1})
+        hedge.get_executor()
+
+        # Requests are sent from the calling thread when all threads of the
+        # pool are busy, and not hedged
+        utils.ScriptedHandler.scripted = [(0.2, 200, {'foo': 'slow'})]
+        with patch.object(hedge, '_running', hedge._workers):
+            self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'slow')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+        # Nor hedged when the thread that would send the hedge is busy
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0.2, 200, {'foo': 'slow'})]
+        with patch.object(hedge, '_running', hedge._workers - 1):
+            self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'slow')
+            time.sleep(0.05)
+            self.assertEqual(hedge._running, hedge._workers - 1)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+        stats = api.get_hedge_stats()['do_test']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['saturated'], 2)
+        self.assertEqual(stats['hedged'], 0)
+
+
+    def test_delay_from_latencies(self):
+        hedge = Hedge(percentile=90, min_delay=0.01, max_delay=1, min_samples=10)
+        self.assertEqual(hedge.get_delay(), 1)
+        for i in range(10):
+            hedge._record(0.1 * (i + 1))
+        self.assertAlmostEqual(hedge.get_delay(), 1)
+        for i in range(100):
+            hedge._record(0.02)
+        self.assertAlmostEqual(hedge.get_delay(), 0.02)
+        for i in range(200):
+            hedge._record(0.001)
+        self.assertAlmostEqual(hedge.get_delay(), 0.01)
+
+
+    def test_one_hedge_per_endpoint(self):
+        # Callers generated by several threads at once share the endpoint's
+        # Hedge, and its latencies
+        api = self.new_api(hedge={'delay': 0.1})
+        endpoints = []
+        api.api_spec.call_on_each_endpoint(endpoints.append)
+        api.api_spec.hedges.clear()
+        slow_hedge = utils.slowed(Hedge)
+        with patch('pymacaron_core.swagger.spec.Hedge', side_effect=slow_hedge) as patched:
+            results, errors = utils.run_threads(lambda: api.api_spec.get_hedge(endpoints[0]))
+        self.assertEqual(errors, [])
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertIs(results[0], api.api_spec.hedges['do_test'])
+
+
+    def test_async_hedge(self):
+        if not asyncclient.aiohttp:
+            self.skipTest("aiohttp is not installed")
+
+        api = self.new_api(hedge={'delay': 0.1, 'max_ratio': 1})
+        utils.ScriptedHandler.scripted = [(0.5, 200, {'foo': 'slow'})]
+
+        async def call():
+            try:
+                return await api.async_client.do_test(arg1='this', arg2='that')
+            finally:
+                await api.close_async_client()
+
+        t0 = time.time()
+        res = asyncio.run(call())
+        self.assertLess(time.time() - t0, 0.4)
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+        self.assertEqual(api.get_hedge_stats()['do_test']['hedge_wins'], 1)
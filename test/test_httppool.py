@@ -0,0 +1,159 @@
+import os
+import imp
+import json
+import time
+import threading
+import responses
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger.httppool import HttpPool
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        super(JsonHandler, self).setup()
+        JsonHandler.connections += 1
+
+    def do_GET(self):
+        body = json.dumps({'foo': 'a'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Test(utils.PymTest):
+
+    def yaml_with_decorator(self):
+        return self.yaml_query_param.replace(
+            'x-bind-client: do_test',
+            'x-bind-client: do_test\n      x-decorate-request: pymacaron_core.test.add_test_header',
+        )
+
+
+    @responses.activate
+    def test_pooled_client(self):
+        api = API('somename', yaml_str=self.yaml_with_decorator(), pool_size=2)
+        self.assertEqual(api.get_pool_stats()['requests'], 0)
+
+        responses.add(
+            responses.GET, "http://some.server.com:80/v1/some/path",
+            body=json.dumps({"foo": "a", "bar": "b"}),
+            status=200,
+            content_type="application/json"
+        )
+
+        for _ in range(2):
+            res = api.client.do_test(arg1='this', arg2='that')
+            self.assertEqual(res.to_json(), {"foo": "a", "bar": "b"})
+
+        # x-decorate-request still applies to the pooled method, and gets the
+        # query parameters in params
+        self.assertEqual(responses.calls[0].request.headers['X-Test'], 'decorated')
+        self.assertEqual(responses.calls[0].request.headers['X-Test-Params'], 'arg1,arg2')
+        self.assertEqual(responses.calls[0].request.url, "http://some.server.com:80/v1/some/path?arg1=this&arg2=that")
+
+        stats = api.get_pool_stats()
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['waits'], 0)
+        self.assertEqual(stats['pool_size'], 2)
+
+        # Not pooling by default
+        self.assertIsNone(API('somename', yaml_str=self.yaml_query_param).get_pool_stats())
+
+
+    def test_connections_kept_alive(self):
+        server = ThreadingServer(('127.0.0.1', 0), JsonHandler)
+        t = threading.Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        try:
+            for keep_alive, connections in ((True, 1), (False, 3)):
+                JsonHandler.connections = 0
+                api = API('somename', yaml_str=self.yaml_query_param, host='127.0.0.1', port=server.server_address[1], pool_size=2, pool_keep_alive=keep_alive)
+                for _ in range(3):
+                    res = api.client.do_test(arg1='this', arg2='that')
+                    self.assertEqual(res.foo, 'a')
+                self.assertEqual(JsonHandler.connections, connections)
+                self.assertEqual(api.get_pool_stats()['idle'], 1 if keep_alive else 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+    def test_max_connections(self):
+        pool = HttpPool(pool_size=1, max_connections=1)
+        session = pool._get_session()
+        max_in_use = []
+
+        def slow_request(method, url, **kwargs):
+            max_in_use.append(pool.stats()['in_use'])
+            time.sleep(0.1)
+            return url
+
+        session.request = slow_request
+
+        threads = [threading.Thread(target=pool.get_method('get'), args=('http://foo',)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = pool.stats()
+        self.assertEqual(max_in_use, [1, 1, 1])
+        self.assertEqual(stats['waits'], 2)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['in_use'], 0)
+
+        # The limit applies to each host
+        max_in_use.clear()
+        threads = [threading.Thread(target=pool.get_method('get'), args=('http://foo%s' % i,)) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(pool.stats()['waits'], 2)
+        self.assertEqual(max(max_in_use), 3)
+
+
+    def test_no_cookies_kept(self):
+        server = utils.start_scripted_server()
+        try:
+            api = API('somename', yaml_str=self.yaml_query_param, host='127.0.0.1', port=server.server_address[1], pool_size=2)
+            utils.ScriptedHandler.reset()
+            utils.ScriptedHandler.scripted = [(0, 200, {'foo': 'a'}, {'Set-Cookie': 'session=user-A; Path=/'})]
+            api.client.do_test(arg1='this', arg2='that')
+            api.client.do_test(arg1='this', arg2='that')
+            self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+            self.assertNotIn('Cookie', utils.ScriptedHandler.requests[1][2])
+        finally:
+            utils.stop_scripted_server(server)
+
+
+    def test_session_recreated_after_fork(self):
+        pool = HttpPool()
+        session = pool._get_session()
+        self.assertTrue(pool._get_session() is session)
+
+        # Pretend that we are in a forked process
+        pool._pid = -1
+        self.assertFalse(pool._get_session() is session)
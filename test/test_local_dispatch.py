@@ -0,0 +1,214 @@
+import os
+import imp
+import json
+from flask import Flask, request, jsonify
+from mock import patch
+from pymacaron_core.exceptions import PyMacaronCoreException, ValidationError
+from pymacaron_core.swagger.api import API
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+try:
+    from flask import _app_ctx_stack as stack
+except ImportError:
+    from flask import _request_ctx_stack as stack
+
+
+class Test(utils.PymTest):
+
+    def new_api(self, yaml_str, **kwargs):
+        yaml_str = yaml_str.replace(
+            'x-bind-server: pymacaron_core.test.return_token',
+            'x-bind-server: pymacaron_core.test.return_token\n      x-bind-client: do_test',
+        )
+        api = API('somename', yaml_str=yaml_str, local=True, **kwargs)
+        self.app = Flask('test')
+        api.spawn_api(self.app)
+        return api
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_direct_call_with_body(self, func):
+        func.__name__ = 'return_token'
+        api = self.new_api(self.yaml_in_body, local_dispatch=True)
+
+        token = api.model.SessionToken(token='456')
+        func.return_value = token
+        credentials = api.model.Credentials(email='a@a.a', int='123')
+
+        with patch.object(self.app, 'test_client') as test_client:
+            res = api.client.do_test(credentials)
+            test_client.assert_not_called()
+
+        self.assertEqual(res.token, '456')
+        func.assert_called_once_with(credentials)
+
+        # The handler and the caller do not share models
+        self.assertIsNot(func.call_args[0][0], credentials)
+        res.token = 'modified'
+        self.assertEqual(token.token, '456')
+
+        # Invalid bodies are rejected before calling the handler
+        func.reset_mock()
+        with self.assertRaises(ValidationError) as e:
+            api.client.do_test(api.model.Credentials(email=123, int='123'))
+        self.assertTrue("123 is not of type 'string'" in str(e.exception))
+        func.assert_not_called()
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_direct_call_with_query(self, func):
+        func.__name__ = 'return_token'
+        api = self.new_api(self.yaml_in_query, local_dispatch=True)
+        func.return_value = api.model.SessionToken(token='456')
+
+        # Unknown parameters are dropped, as over http
+        self.assertEqual(api.client.do_test(foo='aaa', bar='bbb', baz='ccc').token, '456')
+        func.assert_called_once_with(foo='aaa', bar='bbb')
+
+        func.reset_mock()
+        with self.assertRaises(ValidationError):
+            api.client.do_test(bar='bbb')
+        func.assert_not_called()
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_direct_call_schema_only(self, func):
+        func.__name__ = 'return_token'
+        api = self.new_api(self.yaml_in_query, local_dispatch='schema')
+        func.return_value = api.model.SessionToken(token='456')
+
+        # Query parameters are passed as given
+        self.assertEqual(api.client.do_test(bar='bbb').token, '456')
+        func.assert_called_once_with(bar='bbb')
+
+        api = self.new_api(self.yaml_in_body, local_dispatch='schema')
+        func.reset_mock()
+        with self.assertRaises(ValidationError):
+            api.client.do_test(api.model.Credentials(email=123, int='123'))
+        func.assert_not_called()
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_direct_call_with_path(self, func):
+        func.__name__ = 'return_token'
+        api = self.new_api(self.yaml_in_path, local_dispatch=True)
+
+        def handler(item, path):
+            self.assertEqual(request.path, '/v1/in/12/34/foo/bob')
+            return api.model.SessionToken(token=item + path)
+
+        func.side_effect = handler
+        self.assertEqual(api.client.do_test(item='12/34', path='bob').token, '12/34bob')
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_direct_call_with_escaped_path(self, func):
+        func.__name__ = 'return_token'
+        seen = {}
+
+        def handler(item, path):
+            seen['path'] = request.path
+            seen['uri'] = request.environ['REQUEST_URI']
+            seen['query'] = request.query_string
+            return api.model.SessionToken(token=item + path)
+
+        func.side_effect = handler
+
+        # Path values are quoted as in the url of http calls
+        api = self.new_api(self.yaml_in_path, local_dispatch=True)
+        self.assertEqual(api.client.do_test(item='a/b?c=%d e', path='bob').token, 'a/b?c=%d ebob')
+        self.assertEqual(seen, {
+            'path': '/v1/in/a/b?c=%d e/foo/bob',
+            'uri': '/v1/in/a%2Fb%3Fc%3D%25d%20e/foo/bob',
+            'query': b'',
+        })
+
+        # And the handler sees the same path as over http
+        value = 'c?d=%e f\u00e9'
+        api.client.do_test(item=value, path='bob')
+        direct = dict(seen)
+        self.assertEqual(direct['uri'], '/v1/in/c%3Fd%3D%25e%20f%C3%A9/foo/bob')
+        api = self.new_api(self.yaml_in_path.replace('200:', "'200':"))
+        self.assertEqual(api.client.do_test(item=value, path='bob').token, value + 'bob')
+        self.assertEqual((seen['path'], seen['query']), (direct['path'], direct['query']))
+
+        with self.assertRaises(ValidationError):
+            self.new_api(self.yaml_in_path, local_dispatch=True).client.do_test(item='a')
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_direct_call_results(self, func):
+        func.__name__ = 'return_token'
+        api = self.new_api(self.yaml_no_param, local_dispatch=True)
+
+        # Invalid results are rejected
+        func.return_value = api.model.SessionToken(token=123)
+        with self.assertRaises(ValidationError):
+            api.client.do_test()
+
+        func.return_value = None
+        with self.assertRaises(PyMacaronCoreException):
+            api.client.do_test()
+
+        # Flask responses are handled as over http
+        def handler():
+            r = jsonify({'error': 'denied'})
+            r.status_code = 401
+            return r
+
+        func.side_effect = handler
+        with self.assertRaises(PyMacaronCoreException) as e:
+            api.client.do_test()
+        self.assertEqual(e.exception.status_code, 401)
+
+        # Arrays too are returned as lists of models
+        api = self.new_api(self.yaml_array, local_dispatch=True)
+        func.side_effect = None
+        func.return_value = iter([api.model.SessionToken(token='1'), api.model.SessionToken(token='2')])
+        self.assertEqual([t.token for t in api.client.do_test()], ['1', '2'])
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_direct_call_context(self, func):
+        func.__name__ = 'return_token'
+        api = self.new_api(self.yaml_no_param, local_dispatch=True)
+
+        seen = {}
+
+        def handler():
+            seen['call_id'] = stack.top.call_id
+            seen['call_path'] = stack.top.call_path
+            seen['authorization'] = request.headers.get('Authorization')
+            return api.model.SessionToken(token='1')
+
+        func.side_effect = handler
+
+        # Outside of any request, a new call ID is generated
+        api.client.do_test()
+        self.assertEqual(seen['call_path'], 'somename')
+        self.assertEqual(len(seen['call_id']), 36)
+
+        # Within a request, its call ID and path are passed on, then restored
+        with self.app.test_request_context('/'):
+            stack.top.call_id = 'abc'
+            stack.top.call_path = 'public'
+            api.client.do_test(request_headers={'Authorization': 'Bearer 123'})
+            self.assertEqual(stack.top.call_id, 'abc')
+            self.assertEqual(stack.top.call_path, 'public')
+
+        self.assertEqual(seen, {'call_id': 'abc', 'call_path': 'public.somename', 'authorization': 'Bearer 123'})
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_local_call_without_direct_dispatch(self, func):
+        func.__name__ = 'return_token'
+        api = self.new_api(self.yaml_in_body.replace('200:', "'200':"))
+        func.return_value = api.model.SessionToken(token='456')
+
+        credentials = api.model.Credentials(email='a@a.a', int='123')
+        self.assertEqual(api.client.do_test(credentials).token, '456')
+        self.assertEqual(json.dumps(func.call_args[0][0].to_json(), sort_keys=True), json.dumps(credentials.to_json(), sort_keys=True))
+        self.assertEqual(api.api_spec.local_handlers, {})
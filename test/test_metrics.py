@@ -0,0 +1,195 @@
+import os
+import imp
+import json
+import asyncio
+from mock import patch
+from pymacaron_core.exceptions import PyMacaronCoreException
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger.apipool import ApiPool
+from pymacaron_core.swagger import asyncclient
+from pymacaron_core.swagger.metrics import add_metrics_hook, remove_metrics_hook, format_prometheus, BUCKETS
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = utils.start_scripted_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.stop_scripted_server(cls.server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+
+    def new_api(self, yaml_str=None, **kwargs):
+        return API('somename', yaml_str=yaml_str or self.yaml_query_param, host='127.0.0.1', port=self.server.server_address[1], **kwargs)
+
+
+    def test_no_metrics_by_default(self):
+        api = self.new_api()
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertIsNone(api.api_spec.metrics)
+        self.assertIsNone(api.get_client_metrics())
+
+
+    def test_call_metrics(self):
+        api = self.new_api(metrics=True)
+        for _ in range(3):
+            self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+
+        m = api.get_client_metrics()['do_test']
+        self.assertEqual(m['method'], 'GET')
+        self.assertEqual(m['calls'], 3)
+        self.assertEqual(m['errors'], 0)
+        self.assertEqual(m['attempts'], 3)
+        self.assertEqual(m['retries'], 0)
+        self.assertEqual(m['statuses'], {200: 3})
+        self.assertEqual(m['bytes_sent'], 0)
+        self.assertEqual(m['bytes_received'], 3 * len(json.dumps({'foo': 'a', 'bar': 'b'})))
+
+        self.assertEqual(sorted(m['phases'].keys()), ['decode', 'read', 'total', 'unmarshal', 'wait'])
+        for name, h in m['phases'].items():
+            self.assertEqual(h['count'], 3)
+            self.assertTrue(0 <= h['max'] <= h['sum'])
+            self.assertEqual(len(h['buckets']), len(BUCKETS) + 1)
+            self.assertEqual(h['buckets'][-1], (float('inf'), 3))
+        phases = m['phases']
+        self.assertTrue(phases['total']['sum'] >= phases['wait']['sum'] + phases['read']['sum'] + phases['decode']['sum'] + phases['unmarshal']['sum'])
+
+        api.reset_client_metrics()
+        self.assertEqual(api.get_client_metrics(), {})
+
+
+    def test_slow_responses(self):
+        api = self.new_api(metrics=True)
+        utils.ScriptedHandler.scripted = [(0.2, 200, {'foo': 'slow'})]
+        api.client.do_test(arg1='this', arg2='that')
+
+        h = api.get_client_metrics()['do_test']['phases']['wait']
+        self.assertTrue(0.2 <= h['sum'] < 0.4)
+        self.assertEqual(dict(h['buckets'])[0.1], 0)
+        self.assertEqual(dict(h['buckets'])[0.25], 1)
+
+
+    def test_retries_and_errors(self):
+        api = self.new_api(metrics=True, retry_policy={'backoff_base': 0})
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'})]
+        api.client.do_test(arg1='this', arg2='that')
+
+        m = api.get_client_metrics()['do_test']
+        self.assertEqual(m['calls'], 1)
+        self.assertEqual(m['attempts'], 2)
+        self.assertEqual(m['retries'], 1)
+        self.assertEqual(m['statuses'], {503: 1, 200: 1})
+
+        utils.ScriptedHandler.scripted = [(0, 500, {'error': 'boom'})]
+        with self.assertRaises(PyMacaronCoreException):
+            api.client.do_test(arg1='this', arg2='that')
+
+        m = api.get_client_metrics()['do_test']
+        self.assertEqual(m['calls'], 2)
+        self.assertEqual(m['errors'], 1)
+        self.assertEqual(m['statuses'], {503: 1, 200: 1, 500: 1})
+
+        # Failed attempts count as waiting
+        api = API('somename', yaml_str=self.yaml_query_param, host='127.0.0.1', port=1, metrics=True)
+        with self.assertRaises(Exception):
+            api.client.do_test(arg1='this', arg2='that', max_attempts=1)
+        m = api.get_client_metrics()['do_test']
+        self.assertEqual(m['errors'], 1)
+        self.assertEqual(m['attempts'], 1)
+        self.assertEqual(m['statuses'], {})
+        self.assertEqual(sorted(m['phases'].keys()), ['total', 'wait'])
+
+
+    def test_bytes_sent(self):
+        api = self.new_api(yaml_str=self.yaml_body_param, metrics=True)
+        api.client.do_test(api.model.Param(arg1='this', arg2='that'))
+        m = api.get_client_metrics()['do_test']
+        self.assertEqual(m['method'], 'POST')
+        self.assertEqual(m['bytes_sent'], len(utils.ScriptedHandler.requests[0][3]))
+        self.assertTrue(m['bytes_sent'] > 0)
+
+
+    def test_cached_calls(self):
+        api = self.new_api(metrics=True, client_cache={'ttl': 30})
+        api.client.do_test(arg1='this', arg2='that')
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+        m = api.get_client_metrics()['do_test']
+        self.assertEqual(m['calls'], 2)
+        self.assertEqual(m['attempts'], 1)
+        self.assertEqual(m['phases']['total']['count'], 2)
+        self.assertEqual(m['phases']['wait']['count'], 1)
+
+
+    def test_hooks(self):
+        api = self.new_api(metrics=True)
+        records = []
+
+        def failing_hook(record):
+            raise Exception("boom")
+
+        add_metrics_hook(failing_hook)
+        add_metrics_hook(records.append)
+        try:
+            with patch('pymacaron_core.swagger.metrics.log') as log:
+                api.client.do_test(arg1='this', arg2='that')
+                self.assertEqual(log.warn.call_count, 1)
+        finally:
+            remove_metrics_hook(failing_hook)
+            remove_metrics_hook(records.append)
+
+        self.assertEqual(len(records), 1)
+        r = records[0]
+        self.assertEqual((r.api, r.endpoint, r.method, r.attempts, r.statuses, r.error), ('somename', 'do_test', 'GET', 1, [200], None))
+        self.assertTrue(r.phases['total'] > 0)
+
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(records), 1)
+
+
+    def test_apipool_and_prometheus(self):
+        api = ApiPool.add('metered', yaml_str=self.yaml_query_param, host='127.0.0.1', port=self.server.server_address[1], metrics=True)
+        api.client.do_test(arg1='this', arg2='that')
+
+        metrics = ApiPool.get_client_metrics()
+        self.assertEqual(metrics['metered']['do_test']['calls'], 1)
+
+        text = ApiPool.format_client_metrics()
+        self.assertTrue('# TYPE pym_client_calls_total counter' in text)
+        self.assertTrue('pym_client_calls_total{api="metered",endpoint="do_test"} 1\n' in text)
+        self.assertTrue('pym_client_responses_total{api="metered",endpoint="do_test",status="200"} 1\n' in text)
+        self.assertTrue('pym_client_phase_seconds_bucket{api="metered",endpoint="do_test",phase="wait",le="+Inf"} 1\n' in text)
+        self.assertTrue('pym_client_phase_seconds_count{api="metered",endpoint="do_test",phase="total"} 1\n' in text)
+
+        self.assertEqual(format_prometheus({'a"b': {}}, prefix='x').count('\n'), 16)
+
+
+    def test_async_metrics(self):
+        if not asyncclient.aiohttp:
+            self.skipTest("aiohttp is not installed")
+
+        api = self.new_api(metrics=True)
+        utils.ScriptedHandler.scripted = [(0.1, 200, {'foo': 'slow'})]
+
+        async def call():
+            try:
+                return await api.async_client.do_test(arg1='this', arg2='that')
+            finally:
+                await api.close_async_client()
+
+        self.assertEqual(asyncio.run(call()).foo, 'slow')
+        m = api.get_client_metrics()['do_test']
+        self.assertEqual(m['calls'], 1)
+        self.assertEqual(m['statuses'], {200: 1})
+        self.assertEqual(m['bytes_received'], len(json.dumps({'foo': 'slow'})))
+        self.assertTrue(m['phases']['wait']['sum'] >= 0.1)
+        self.assertEqual(sorted(m['phases'].keys()), ['decode', 'read', 'total', 'unmarshal', 'wait'])
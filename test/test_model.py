@@ -1,4 +1,8 @@
 import unittest
+from datetime import datetime, date
+from bravado_core.marshal import marshal_schema_object
+from bravado_core.unmarshal import unmarshal_model
+from jsonschema.exceptions import ValidationError
 from pymacaron_core.swagger.api import API
 from pymacaron_core.models import get_model
 from pymacaron_core.models import PyMacaronModel
@@ -51,6 +55,44 @@ definitions:
       s:
         type: string
 
+  Qux:
+    type: object
+    required:
+      - r
+    properties:
+      r:
+        type: string
+        default: 'abc'
+      n:
+        type: string
+        x-nullable: true
+      d:
+        type: string
+        format: date
+      dt:
+        type: string
+        format: date-time
+      ldt:
+        type: array
+        items:
+          type: string
+          format: date-time
+      inline:
+        type: object
+        properties:
+          a:
+            type: integer
+      baz:
+        $ref: '#/definitions/Baz'
+
+  Shadow:
+    type: object
+    properties:
+      s:
+        type: string
+      clone:
+        type: string
+
 """
 
 #
@@ -131,6 +173,41 @@ class Tests(unittest.TestCase):
         self.assertTrue(hasattr(o, 'local'))
 
 
+    def test__property_descriptors(self):
+        o = get_model('Foo')(s='bob')
+
+        # Properties are descriptors on the class, not instance attributes
+        self.assertTrue('s' not in o.__dict__)
+        self.assertTrue('s' not in dir(o))
+        self.assertTrue('to_json' in dir(o))
+
+        self.assertTrue(hasattr(o, 's'))
+        self.assertFalse(hasattr(o, 'foobar'))
+        self.assertEqual(o.s, 'bob')
+
+        del o.s
+        self.assertEqual(o.s, None)
+        self.assertEqual(getattr(o, '__bravado_instance').s, None)
+
+
+    def test__shadowed_property(self):
+        o = get_model('Shadow')(s='a', clone='b')
+
+        # The method wins over the property when reading it as an attribute...
+        self.assertTrue(callable(o.clone))
+        self.assertEqual(o['clone'], 'b')
+
+        # ... but setting it updates the bravado instance
+        o.clone = 'c'
+        self.assertEqual(o['clone'], 'c')
+        self.assertTrue(callable(o.clone))
+        self.assertEqual(o.to_json(), {'s': 'a', 'clone': 'c'})
+
+        del o.clone
+        self.assertEqual(o['clone'], None)
+        self.assertEqual(o.to_json(), {'s': 'a'})
+
+
     def test__delattr(self):
         o = get_model('Foo')()
 
@@ -296,3 +373,258 @@ class Tests(unittest.TestCase):
             foo.to_json(),
             {'i': 32},
         )
+
+
+    def test__to_json__compiled_marshaller(self):
+        Qux = get_model('Qux')
+        Baz = get_model('Baz')
+        Bar = get_model('Bar')
+
+        def marshal_with_bravado(o):
+            return marshal_schema_object(
+                getattr(o, '__swagger_spec'),
+                getattr(o, '__swagger_dict'),
+                o.to_bravado(),
+            )
+
+        self.assertIsNotNone(getattr(Qux, '__marshaller'))
+
+        for o in (
+            Qux(),
+            Qux(r='x', n='y'),
+            Qux(
+                d=date(2020, 1, 2),
+                dt=datetime(2020, 1, 2, 3, 4, 5),
+                ldt=[datetime(2020, 1, 2), None],
+                inline={'a': 1},
+                baz=Baz(s='a'),
+            ),
+            Qux(baz=Bar(s='b', o=Baz(s='c'))),
+        ):
+            self.assertEqual(o.to_json(), marshal_with_bravado(o))
+
+        o = Qux(dt=datetime(2020, 1, 2, 3, 4, 5))
+        self.assertEqual(o.to_json(keep_datetime=True)['dt'], datetime(2020, 1, 2, 3, 4, 5))
+
+
+    def test__from_json__compiled_unmarshaller(self):
+        Foo = get_model('Foo')
+        Qux = get_model('Qux')
+
+        def unmarshal_with_bravado(cls, j):
+            return cls.from_bravado(
+                unmarshal_model(
+                    getattr(cls, '__swagger_spec'),
+                    getattr(cls, '__swagger_dict'),
+                    j,
+                )
+            )
+
+        self.assertIsNotNone(getattr(Qux, '__unmarshaller'))
+
+        for cls, j in (
+            (Qux, {}),
+            (Qux, {'r': None, 'n': None, 'extra': 12}),
+            (Qux, {
+                'd': '2020-01-02',
+                'dt': '2020-01-02T03:04:05+00:00',
+                'ldt': ['2020-01-02T03:04:05+00:00', None],
+                'inline': {'a': 1},
+                'baz': {'s': 'a'},
+            }),
+            (Foo, {
+                's': 'abc',
+                'lst': ['a', 'b'],
+                'o': {'s': '1', 'o': {'s': '2'}},
+                'lo': [{'s': 'r'}, {}],
+            }),
+        ):
+            o = cls.from_json(j)
+            self.assertEqual(o, unmarshal_with_bravado(cls, j))
+            self.assertEqual(o.to_json(), unmarshal_with_bravado(cls, j).to_json())
+
+        o = Foo.from_json({'o': {'o': {'s': '2'}}, 'lo': [{'s': 'r'}]})
+        self.assertTrue(isinstance(o.o, PyMacaronModel))
+        self.assertTrue(isinstance(o.o.o, PyMacaronModel))
+        self.assertTrue(isinstance(o.lo[0], PyMacaronModel))
+
+        dt = datetime(2020, 1, 2, 3, 4, 5)
+        o = Qux.from_json({'dt': dt}, keep_datetime=True)
+        self.assertEqual(o.dt, dt)
+
+
+    def test__to_bravado__from_bravado__no_copy(self):
+        Foo = get_model('Foo')
+        Bar = get_model('Bar')
+        Baz = get_model('Baz')
+        lst = ['a', 'b']
+        a = Foo(s='abc', lst=lst, o=Bar(s='1', o=Baz(s='2')), lo=[Bar(s='3')])
+
+        # A copy is independent from self
+        b = a.to_bravado()
+        self.assertFalse(b.lst is lst)
+        self.assertEqual(b.o.__class__.__name__, 'Bar')
+        self.assertFalse(isinstance(b.o, PyMacaronModel))
+        self.assertFalse(isinstance(b.lo[0], PyMacaronModel))
+
+        # Without copy, values are shared with self, but nested models are
+        # still bravado models, and self is left unchanged
+        b = a.to_bravado(copy=False)
+        self.assertTrue(b.lst is lst)
+        self.assertFalse(isinstance(b.o, PyMacaronModel))
+        self.assertFalse(isinstance(b.o.o, PyMacaronModel))
+        self.assertFalse(isinstance(b.lo[0], PyMacaronModel))
+        self.assertTrue(isinstance(a.o, PyMacaronModel))
+        self.assertTrue(isinstance(a.lo[0], PyMacaronModel))
+        self.assertEqual(b, a.to_bravado())
+
+        # A model without nested models hands out its bravado instance
+        baz = Baz(s='x')
+        self.assertTrue(baz.to_bravado(copy=False) is getattr(baz, '__bravado_instance'))
+
+        # Without copy, the bravado instance moves into the PyMacaron instance
+        b = a.to_bravado()
+        c = Foo.from_bravado(b, copy=False)
+        self.assertTrue(getattr(c, '__bravado_instance') is b)
+        self.assertTrue(isinstance(c.o, PyMacaronModel))
+        self.assertTrue(isinstance(c.o.o, PyMacaronModel))
+        self.assertTrue(isinstance(c.lo[0], PyMacaronModel))
+        self.assertEqual(c, a)
+
+        c = Foo.from_bravado(a.to_bravado())
+        self.assertEqual(c, a)
+
+
+    def test__clone(self):
+        Foo = get_model('Foo')
+        Bar = get_model('Bar')
+        Baz = get_model('Baz')
+        a = Foo(s='abc', i=1, lst=['a', 'b'], o=Bar(s='1', o=Baz(s='2')), lo=[Bar(s='3')])
+
+        b = a.clone()
+        self.assertEqual(b, a)
+        self.assertEqual(b.to_json(), a.to_json())
+
+        # Mutable values are copied, immutable ones shared
+        self.assertTrue(b.s is a.s)
+        self.assertFalse(b.lst is a.lst)
+        self.assertFalse(b.o is a.o)
+        self.assertFalse(b.o.o is a.o.o)
+        self.assertFalse(b.lo[0] is a.lo[0])
+
+        b.lst.append('c')
+        b.o.o.s = 'x'
+        b.lo[0].s = 'y'
+        self.assertEqual(a.to_json(), {'s': 'abc', 'i': 1, 'lst': ['a', 'b'], 'o': {'s': '1', 'o': {'s': '2'}}, 'lo': [{'s': '3'}]})
+
+        # Dates are shared, inline objects copied
+        Qux = get_model('Qux')
+        q = Qux(r='a', dt=datetime(2020, 1, 1), inline={'a': 1})
+        c = q.clone()
+        self.assertTrue(c.dt is q.dt)
+        self.assertFalse(c.inline is q.inline)
+        self.assertEqual(c, q)
+
+
+    def test__clone__copy_on_write(self):
+        Foo = get_model('Foo')
+        Bar = get_model('Bar')
+        Baz = get_model('Baz')
+        a = Foo(s='abc', lst=['a', 'b'], o=Bar(s='1', o=Baz(s='2')), lo=[Bar(s='3')])
+        j = a.to_json()
+
+        b = a.clone(copy_on_write=True)
+        self.assertEqual(b, a)
+        self.assertEqual(a, b)
+        self.assertEqual(b.to_json(), j)
+        self.assertEqual(b.to_bravado(), a.to_bravado())
+        self.assertTrue('PyMacaron:Foo:Foo(' in repr(b))
+
+        # Accessing a shared value gives the first reader a copy, and the last
+        # one the value itself
+        o = a.o
+        b.o.o.s = 'x'
+        self.assertFalse(b.o is o)
+        self.assertTrue(a.o is o)
+        self.assertEqual(a.o.o.s, '2')
+        self.assertEqual(b.o.o.s, 'x')
+
+        # Whichever model accesses it first
+        lst = b.lst
+        a.lst.append('c')
+        self.assertTrue(b.lst is lst)
+        self.assertEqual(b.lst, ['a', 'b'])
+        self.assertEqual(a.lst, ['a', 'b', 'c'])
+
+        b['lo'][0].s = 'y'
+        self.assertEqual(a.lo[0].s, '3')
+        self.assertEqual(a.to_json(), {'s': 'abc', 'lst': ['a', 'b', 'c'], 'o': {'s': '1', 'o': {'s': '2'}}, 'lo': [{'s': '3'}]})
+        self.assertEqual(b.to_json(), {'s': 'abc', 'lst': ['a', 'b'], 'o': {'s': '1', 'o': {'s': 'x'}}, 'lo': [{'s': 'y'}]})
+
+        # Values shared by several clones
+        c = a.clone(copy_on_write=True)
+        d = a.clone(copy_on_write=True)
+        c.o.s = 'c'
+        d.o.s = 'd'
+        self.assertEqual(a.o.s, '1')
+        self.assertEqual(c.o.s, 'c')
+        self.assertEqual(d.o.s, 'd')
+
+
+    def test__to_json_many__from_json_many(self):
+        Foo = get_model('Foo')
+        Bar = get_model('Bar')
+        foos = [Foo(s='a', o=Bar(s='b')), Foo(i=1, lo=[Bar(s='c')])]
+        js = [f.to_json() for f in foos]
+
+        self.assertEqual(Foo.to_json_many(foos), js)
+        self.assertEqual(Foo.to_json_many(iter(foos)), js)
+        self.assertEqual(Foo.to_json_many([]), [])
+
+        # Instances of other models are marshalled by their own class
+        self.assertEqual(Foo.to_json_many([foos[0], Bar(s='x')]), [js[0], {'s': 'x'}])
+
+        fs = Foo.from_json_many(js)
+        self.assertEqual(fs, foos)
+        self.assertTrue(isinstance(fs[1].lo[0], Bar))
+        self.assertEqual(Foo.from_json_many([]), [])
+
+        # keep_datetime applies to every item
+        Qux = get_model('Qux')
+        dt = datetime(2020, 1, 1)
+        qs = Qux.from_json_many([{'r': 'a', 'dt': dt}], keep_datetime=True)
+        self.assertTrue(qs[0].dt is dt)
+        self.assertEqual(Qux.to_json_many(qs, keep_datetime=True), [{'r': 'a', 'n': None, 'dt': dt}])
+
+
+    def test__from_json__lazy(self):
+        Foo = get_model('Foo')
+        Bar = get_model('Bar')
+        j = {'s': 'abc', 'o': {'s': '1', 'o': {'s': '2'}}, 'lo': [{'s': '3'}], 'lst': ['a']}
+
+        a = Foo.from_json(j, lazy=True)
+        self.assertEqual(a.s, 'abc')
+
+        # Untouched nested values are marshalled back as is
+        self.assertTrue(a.to_json()['o'] is j['o'])
+        self.assertEqual(a.to_json(), j)
+        self.assertEqual(a, Foo.from_json(j))
+
+        # And unmarshalled into models on first access
+        self.assertTrue(isinstance(a.o, Bar))
+        self.assertEqual(a.o.o.s, '2')
+        self.assertTrue(isinstance(a['lo'][0], Bar))
+        a.o.s = 'x'
+        self.assertEqual(a.to_json()['o'], {'s': 'x', 'o': {'s': '2'}})
+        self.assertEqual(j['o']['s'], '1')
+
+        # Clones share the raw json
+        b = Foo.from_json(j, lazy=True).clone()
+        self.assertEqual(b.to_json(), j)
+        self.assertEqual(b.lo[0].s, '3')
+
+        # Invalid nested values are only detected on access
+        c = Foo.from_json({'s': 'abc', 'o': {'s': 1}}, lazy=True)
+        self.assertEqual(c.s, 'abc')
+        with self.assertRaises(ValidationError):
+            c.o
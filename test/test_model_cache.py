@@ -0,0 +1,152 @@
+import unittest
+from copy import deepcopy
+from pymacaron_core.swagger.api import API
+
+
+#
+# Swagger spec
+#
+
+yaml_str = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: some.server.com
+schemes:
+  - http
+produces:
+  - application/json
+definitions:
+
+  Foo:
+    type: object
+    properties:
+      s:
+        type: string
+      lst:
+        type: array
+        items:
+          type: string
+      o:
+        $ref: '#/definitions/Bar'
+      lo:
+        type: array
+        items:
+          $ref: '#/definitions/Bar'
+
+  Bar:
+    type: object
+    properties:
+      s:
+        type: string
+      o:
+        $ref: '#/definitions/Baz'
+
+  Baz:
+    type: object
+    properties:
+      s:
+        type: string
+"""
+
+#
+# Tests
+#
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.api = API('somename', yaml_str=yaml_str, cache_json=True)
+
+
+    def new_foo(self):
+        Foo, Bar, Baz = self.api.model.Foo, self.api.model.Bar, self.api.model.Baz
+        return Foo(s='a', lst=['x'], o=Bar(s='b', o=Baz(s='c')), lo=[Bar(s='d')])
+
+
+    def test_cache(self):
+        a = self.new_foo()
+        j = a.to_json()
+        self.assertEqual(j, {'s': 'a', 'lst': ['x'], 'o': {'s': 'b', 'o': {'s': 'c'}}, 'lo': [{'s': 'd'}]})
+        self.assertTrue(a.to_json() is j)
+
+        # Reading immutable values and nested models keeps the cache
+        self.assertEqual(a.s, 'a')
+        self.assertEqual(a['s'], 'a')
+        self.assertEqual(a.o.s, 'b')
+        self.assertTrue(a.to_json() is j)
+
+        # keep_datetime bypasses the cache
+        self.assertFalse(a.to_json(keep_datetime=True) is j)
+
+
+    def test_invalidation(self):
+        def check(f, expected):
+            a = self.new_foo()
+            j = a.to_json()
+            f(a)
+            self.assertFalse(a.to_json() is j)
+            self.assertEqual(a.to_json(), expected)
+
+        j = self.new_foo().to_json()
+
+        check(lambda a: setattr(a, 's', 'z'), dict(j, s='z'))
+        check(lambda a: a.__setitem__('s', 'z'), dict(j, s='z'))
+        check(lambda a: delattr(a, 's'), {k: v for k, v in j.items() if k != 's'})
+        check(lambda a: a.__delitem__('s'), {k: v for k, v in j.items() if k != 's'})
+        check(lambda a: a.update_from_dict({'s': 'z'}), dict(j, s='z'))
+
+        # Lists modified in place
+        check(lambda a: a.lst.append('y'), dict(j, lst=['x', 'y']))
+        check(lambda a: a['lst'].append('y'), dict(j, lst=['x', 'y']))
+
+        # Nested models, at any depth
+        check(lambda a: setattr(a.o, 's', 'z'), dict(j, o={'s': 'z', 'o': {'s': 'c'}}))
+        check(lambda a: setattr(a.o.o, 's', 'z'), dict(j, o={'s': 'b', 'o': {'s': 'z'}}))
+        check(lambda a: setattr(a.lo[0], 's', 'z'), dict(j, lo=[{'s': 'z'}]))
+
+
+    def test_nested_model_held_by_several_models(self):
+        Foo, Bar = self.api.model.Foo, self.api.model.Bar
+        b = Bar(s='b')
+        b.to_json()
+        f1, f2 = Foo(o=b), Foo(lo=[b])
+        j1, j2 = f1.to_json(), f2.to_json()
+
+        b.s = 'z'
+        self.assertEqual(b.to_json(), {'s': 'z'})
+        self.assertEqual(f1.to_json(), {'o': {'s': 'z'}})
+        self.assertEqual(f2.to_json(), {'lo': [{'s': 'z'}]})
+        self.assertFalse(f1.to_json() is j1)
+        self.assertFalse(f2.to_json() is j2)
+
+
+    def test_lazy_and_clones(self):
+        Foo = self.api.model.Foo
+        j = self.new_foo().to_json()
+
+        a = Foo.from_json(j, lazy=True)
+        self.assertEqual(a.to_json(), j)
+        a.o.o.s = 'z'
+        self.assertEqual(a.to_json()['o'], {'s': 'b', 'o': {'s': 'z'}})
+
+        a = self.new_foo()
+        a.to_json()
+        b = a.clone(copy_on_write=True)
+        b.o.s = 'z'
+        self.assertEqual(a.to_json(), j)
+        self.assertEqual(b.to_json()['o']['s'], 'z')
+        a.o.s = 'y'
+        self.assertEqual(a.to_json()['o']['s'], 'y')
+
+
+    def test_deepcopy_drops_the_cache(self):
+        a = self.new_foo()
+        a.to_json()
+        a.o.to_json()
+        b = deepcopy(a)
+        self.assertFalse('__json' in b.__dict__)
+        self.assertEqual(b, a)
+        b.o.s = 'z'
+        self.assertEqual(b.to_json()['o']['s'], 'z')
+        self.assertEqual(a.to_json()['o']['s'], 'b')
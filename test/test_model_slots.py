@@ -0,0 +1,155 @@
+import unittest
+from datetime import datetime
+from pymacaron_core.swagger.api import API
+from pymacaron_core.models import PyMacaronModel
+
+
+#
+# Swagger spec
+#
+
+yaml_str = """
+swagger: '2.0'
+info:
+  version: '0.0.1'
+host: some.server.com
+schemes:
+  - http
+produces:
+  - application/json
+definitions:
+
+  Foo:
+    type: object
+    properties:
+      s:
+        type: string
+      dt:
+        type: string
+        format: date-time
+      o:
+        $ref: '#/definitions/Bar'
+      lo:
+        type: array
+        items:
+          $ref: '#/definitions/Bar'
+
+  Bar:
+    type: object
+    x-parent: pymacaron_core.test.FunnyDad
+    properties:
+      s:
+        type: string
+
+  Strict:
+    type: object
+    additionalProperties: false
+    properties:
+      s:
+        type: string
+
+  Clash:
+    type: object
+    properties:
+      clone:
+        type: string
+"""
+
+#
+# Tests
+#
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        # The reference api, storing properties in bravado instances, is loaded
+        # first since the last loaded model classes are the ones used to
+        # unmarshal nested models
+        self.ref = API('reference', yaml_str=yaml_str)
+        self.api = API('somename', yaml_str=yaml_str, slots=True)
+
+
+    def test_slots(self):
+        Foo = self.api.model.Foo
+        self.assertTrue('s' in Foo.__slots__)
+
+        f = Foo(s='abc')
+        self.assertFalse(hasattr(f, '__bravado_instance'))
+        self.assertTrue(isinstance(f, PyMacaronModel))
+        self.assertEqual(f.s, 'abc')
+        self.assertEqual(f['s'], 'abc')
+        self.assertEqual(f.o, None)
+        self.assertTrue(hasattr(f, 'o'))
+        self.assertFalse(hasattr(f, 'local'))
+
+        f.s = 'def'
+        self.assertEqual(f.s, 'def')
+        del f.s
+        self.assertEqual(f.s, None)
+        f['s'] = 'ghi'
+        self.assertEqual(f.s, 'ghi')
+        del f['s']
+        self.assertEqual(f.s, None)
+
+        # Local attributes still work
+        f.local = 'bob'
+        self.assertEqual(f.local, 'bob')
+        del f.local
+        with self.assertRaises(Exception) as context:
+            f.local
+        self.assertTrue("Model 'Foo' has no attribute local" in str(context.exception))
+        with self.assertRaises(Exception) as context:
+            f['local'] = 1
+        self.assertTrue("Model 'Foo' has no attribute local" in str(context.exception))
+
+        # Parent classes are still inherited
+        self.assertEqual(self.api.model.Bar().lol(), 'lol')
+
+
+    def test_same_behavior_as_bravado_storage(self):
+        def build(api):
+            return api.model.Foo(
+                s='abc',
+                dt=datetime(2020, 1, 2, 3, 4, 5),
+                o=api.model.Bar(s='1'),
+                lo=[api.model.Bar(s='2'), api.model.Bar()],
+                extra=12,
+            )
+
+        f = build(self.api)
+        r = build(self.ref)
+        self.assertEqual(f.to_json(), r.to_json())
+        self.assertEqual(f, build(self.api))
+        self.assertNotEqual(f, r)
+        self.assertEqual(repr(f), repr(r))
+        self.assertEqual(f.to_bravado()._as_dict(), r.to_bravado()._as_dict())
+
+        j = r.to_json()
+        f = self.api.model.Foo.from_json(j)
+        self.assertTrue(isinstance(f.o, self.api.model.Bar))
+        self.assertTrue(isinstance(f.lo[0], self.api.model.Bar))
+        self.assertEqual(f.to_json(), j)
+        self.assertEqual(f.to_json()['extra'], 12)
+
+        f = self.api.model.Foo.from_bravado(r.to_bravado())
+        self.assertEqual(f.to_json(), j)
+        self.assertEqual(f.clone().to_json(), j)
+        g = f.clone(copy_on_write=True)
+        self.assertEqual(g.to_json(), j)
+        self.assertFalse(g.o is f.o)
+
+        f.update_from_dict({'s': None, 'other': 'x'})
+        r.update_from_dict({'s': None, 'other': 'x'})
+        self.assertEqual(f.to_json(), r.to_json())
+
+
+    def test_additional_properties_false(self):
+        with self.assertRaises(AttributeError):
+            self.api.model.Strict(s='a', t='b')
+
+
+    def test_fallback_to_bravado_storage(self):
+        # Properties that would shadow PyMacaronModel methods can't be slots
+        Clash = self.api.model.Clash
+        self.assertFalse(hasattr(Clash, '__slots__'))
+        self.assertTrue(hasattr(Clash(), '__bravado_instance'))
@@ -0,0 +1,216 @@
+import os
+import imp
+import time
+import asyncio
+from mock import patch
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger import asyncclient
+from pymacaron_core.swagger.responsecache import ResponseCache
+from pymacaron_core.swagger.responsecache import parse_cache_control
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = utils.start_scripted_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.stop_scripted_server(cls.server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+
+    def new_api(self, yaml_str=None, **kwargs):
+        return API('somename', yaml_str=yaml_str or self.yaml_query_param, host='127.0.0.1', port=self.server.server_address[1], **kwargs)
+
+    def with_cache(self, options):
+        return self.yaml_query_param.replace(
+            'x-bind-client: do_test',
+            'x-bind-client: do_test\n      x-client-cache: %s' % options,
+        )
+
+
+    def test_cache_with_ttl(self):
+        api = self.new_api(yaml_str=self.with_cache('{ttl: 0.2}'))
+
+        r1 = api.client.do_test(arg1='this', arg2='that')
+        r2 = api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+        self.assertEqual(r2.to_json(), {'foo': 'a', 'bar': 'b'})
+
+        # Callers get their own copies
+        self.assertIsNot(r1, r2)
+        r1.foo = 'modified'
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+
+        # Other parameters are other entries
+        api.client.do_test(arg1='this', arg2='other')
+        api.client.do_test(arg1='this', arg2='that', request_headers={'Authorization': 'Bearer 123'})
+        self.assertEqual(len(utils.ScriptedHandler.requests), 3)
+
+        # Until they expire
+        time.sleep(0.2)
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 4)
+
+        stats = api.get_cache_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 4)
+        self.assertEqual(stats['entries'], 3)
+
+
+    def test_cache_control_and_etag(self):
+        api = self.new_api(client_cache=True)
+
+        # Responses without max-age or ETag are not cached
+        api.client.do_test(arg1='this', arg2='that')
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [
+            (0, 200, {'foo': 'v1'}, {'Cache-Control': 'max-age=0', 'ETag': '"v1"'}),
+            (0, 304, None, {'Cache-Control': 'max-age=60'}),
+        ]
+        self.assertEqual(api.client.do_test(arg1='a', arg2='b').foo, 'v1')
+        self.assertEqual(api.client.do_test(arg1='a', arg2='b').foo, 'v1')
+        self.assertEqual(api.client.do_test(arg1='a', arg2='b').foo, 'v1')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+        self.assertNotIn('If-None-Match', utils.ScriptedHandler.requests[0][2])
+        self.assertEqual(utils.ScriptedHandler.requests[1][2]['If-None-Match'], '"v1"')
+        self.assertEqual(api.get_cache_stats()['revalidations'], 1)
+
+        # no-store responses are never cached
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0, 200, {'foo': 'v1'}, {'Cache-Control': 'no-store', 'ETag': '"v1"'})]
+        api.client.do_test(arg1='c', arg2='d')
+        api.client.do_test(arg1='c', arg2='d')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        # Nor are errors
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0, 500, {'error': 'boom'}, {'Cache-Control': 'max-age=60'})]
+        with self.assertRaises(Exception):
+            api.client.do_test(arg1='e', arg2='f')
+        self.assertEqual(api.client.do_test(arg1='e', arg2='f').foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        self.assertEqual(parse_cache_control('public, max-age=30, stale-while-revalidate="10"'), {'public': None, 'max-age': 30, 'stale-while-revalidate': 10})
+
+
+    def test_stale_while_revalidate(self):
+        api = self.new_api(yaml_str=self.with_cache('{ttl: 0.3, stale_while_revalidate: 10}'))
+        utils.ScriptedHandler.scripted = [(0, 200, {'foo': 'v1'}), (0.2, 200, {'foo': 'v2'})]
+
+        self.assertEqual(api.client.do_test(arg1='a', arg2='b').foo, 'v1')
+        time.sleep(0.3)
+
+        # Stale results are returned while refreshed in the background
+        t0 = time.time()
+        self.assertEqual(api.client.do_test(arg1='a', arg2='b').foo, 'v1')
+        self.assertEqual(api.client.do_test(arg1='a', arg2='b').foo, 'v1')
+        self.assertLess(time.time() - t0, 0.1)
+
+        time.sleep(0.25)
+        self.assertEqual(api.client.do_test(arg1='a', arg2='b').foo, 'v2')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+        self.assertEqual(api.get_cache_stats()['stale_hits'], 2)
+
+
+    def test_cache_keys(self):
+        api = self.new_api(client_cache={'ttl': 60})
+
+        # Calls with other request headers, such as other credentials, get
+        # other results
+        for token in ('123', '456', '123'):
+            api.client.do_test(arg1='a', arg2='b', request_headers={'X-Api-Key': token})
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        # But the call ID and call path are not part of the key
+        api.client.do_test(arg1='a', arg2='b', request_headers={'X-Api-Key': '123', 'PymCallID': 'abc'})
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        # Nor is lazy unmarshalling shared with eager unmarshalling
+        api.client.do_test(arg1='a', arg2='b', request_headers={'X-Api-Key': '123'}, lazy=True)
+        api.client.do_test(arg1='a', arg2='b', request_headers={'X-Api-Key': '123'}, lazy=True)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 3)
+
+        # Endpoints may key on some headers only
+        api = self.new_api(yaml_str=self.with_cache('{ttl: 60, vary: [Authorization]}'))
+        for key in ('123', '456'):
+            api.client.do_test(arg1='a', arg2='b', request_headers={'X-Api-Key': key})
+        api.client.do_test(arg1='a', arg2='b', request_headers={'Authorization': 'Bearer 123'})
+        self.assertEqual(len(utils.ScriptedHandler.requests), 5)
+
+
+    def test_one_cache_per_api(self):
+        # Callers generated by several threads at once share the api's cache
+        api = self.new_api(client_cache={'ttl': 60})
+        endpoints = []
+        api.api_spec.call_on_each_endpoint(endpoints.append)
+        api.api_spec.response_cache = None
+        slow_cache = utils.slowed(ResponseCache)
+        with patch('pymacaron_core.swagger.spec.ResponseCache', side_effect=slow_cache) as patched:
+            results, errors = utils.run_threads(lambda: api.api_spec.get_endpoint_cache(endpoints[0]).cache)
+        self.assertEqual(errors, [])
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertIs(results[0], api.api_spec.response_cache)
+
+
+    def test_lru_eviction_and_options(self):
+        api = self.new_api(client_cache={'ttl': 60, 'max_entries': 2})
+        for i in range(3):
+            api.client.do_test(arg1='a', arg2=str(i))
+        api.client.do_test(arg1='a', arg2='0')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 4)
+        stats = api.get_cache_stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['evictions'], 2)
+
+        api.clear_client_cache()
+        api.client.do_test(arg1='a', arg2='2')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 5)
+
+        # Endpoints may opt out
+        api = self.new_api(yaml_str=self.with_cache('false'), client_cache={'ttl': 60})
+        api.client.do_test(arg1='a', arg2='b')
+        api.client.do_test(arg1='a', arg2='b')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 7)
+        self.assertEqual(api.get_cache_stats(), None)
+
+        # Only GET calls are cached
+        api = self.new_api(yaml_str=self.yaml_body_param, client_cache={'ttl': 60})
+        api.client.do_test(api.model.Param(arg1='a'))
+        api.client.do_test(api.model.Param(arg1='a'))
+        self.assertEqual(len(utils.ScriptedHandler.requests), 9)
+
+
+    def test_async_client_cache(self):
+        if not asyncclient.aiohttp:
+            self.skipTest("aiohttp is not installed")
+
+        api = self.new_api(client_cache={'ttl': 60})
+
+        async def calls():
+            try:
+                r1 = await api.async_client.do_test(arg1='a', arg2='b')
+                r2 = await api.async_client.do_test(arg1='a', arg2='b')
+                return r1, r2
+            finally:
+                await api.close_async_client()
+
+        r1, r2 = asyncio.run(calls())
+        self.assertEqual(r2.foo, 'a')
+        self.assertIsNot(r1, r2)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+        # Sync and async clients share the cache
+        api.client.do_test(arg1='a', arg2='b')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
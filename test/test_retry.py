@@ -0,0 +1,297 @@
+import os
+import imp
+import time
+import asyncio
+import threading
+from unittest.mock import patch
+from pymacaron_core.exceptions import PyMacaronCoreException
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger import asyncclient
+from pymacaron_core.swagger.retry import RetryPolicy, RetryBudget, CircuitBreaker, CircuitOpenError
+from pymacaron_core.swagger.retry import parse_retry_after, reset_circuit_breakers
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = utils.start_scripted_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.stop_scripted_server(cls.server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+        reset_circuit_breakers()
+
+    def sleeps(self):
+        # Record the sleeps of the client, not of the server's threads
+        delays = []
+        sleep = time.sleep
+
+        def fake_sleep(delay):
+            if threading.current_thread() is threading.main_thread():
+                delays.append(delay)
+            else:
+                sleep(delay)
+
+        return patch('pymacaron_core.swagger.client.time.sleep', side_effect=fake_sleep), delays
+
+    def new_api(self, yaml_str=None, **kwargs):
+        return API('somename', yaml_str=yaml_str or self.yaml_query_param, host='127.0.0.1', port=self.server.server_address[1], **kwargs)
+
+
+    def test_retry_statuses_with_backoff(self):
+        api = self.new_api(retry_policy={'backoff_base': 0.01, 'backoff_max': 0.01})
+
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'}), (0, 429, {'error': 'slow down'})]
+        patcher, delays = self.sleeps()
+        with patcher:
+            res = api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 3)
+        self.assertEqual(len(delays), 2)
+        for d in delays:
+            self.assertTrue(0 <= d <= 0.01)
+
+        stats = api.get_retry_stats()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['attempts'], 3)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['failures'], 1)
+
+        # Other errors are not retried, nor calls that reached max_attempts
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0, 500, {'error': 'boom'})]
+        with self.assertRaises(PyMacaronCoreException) as e:
+            api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(e.exception.status_code, 500)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'})] * 2
+        with self.assertRaises(PyMacaronCoreException) as e:
+            api.client.do_test(arg1='this', arg2='that', max_attempts=2)
+        self.assertEqual(e.exception.status_code, 503)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+
+    def test_retry_after(self):
+        api = self.new_api(yaml_str=self.yaml_body_param, retry_policy={'max_retry_after': 5})
+
+        # Even POSTs are retried, after the delay asked for
+        utils.ScriptedHandler.scripted = [(0, 429, {'error': 'slow down'}, {'Retry-After': '2'})]
+        patcher, delays = self.sleeps()
+        with patcher:
+            res = api.client.do_test(api.model.Param(arg1='a'))
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(delays, [2])
+        self.assertEqual(api.get_retry_stats()['retries_after'], 1)
+
+        # Unless it is too long
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'}, {'Retry-After': '60'})]
+        with self.assertRaises(PyMacaronCoreException):
+            api.client.do_test(api.model.Param(arg1='a'))
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+        self.assertEqual(parse_retry_after('3'), 3)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertEqual(parse_retry_after('soon'), None)
+        self.assertEqual(parse_retry_after(None), None)
+
+
+    def test_read_timeouts(self):
+        api = self.new_api(retry_policy={'backoff_base': 0})
+
+        utils.ScriptedHandler.scripted = [(0.5, 200, {'foo': 'slow'})]
+        res = api.client.do_test(arg1='this', arg2='that', read_timeout=0.2)
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+        # POSTs are not retried on read timeouts
+        api = self.new_api(yaml_str=self.yaml_body_param, retry_policy={'backoff_base': 0})
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.scripted = [(0.5, 200, {'foo': 'slow'})]
+        with self.assertRaises(Exception):
+            api.client.do_test(api.model.Param(arg1='a'), read_timeout=0.2)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+
+    def test_retry_budget(self):
+        budget = RetryBudget(ratio=0.5, burst=2)
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+        api = self.new_api(retry_policy={'backoff_base': 0, 'retry_budget': 0.1, 'retry_budget_burst': 1, 'failure_threshold': None})
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'})] * 4
+        for i in range(2):
+            with self.assertRaises(PyMacaronCoreException):
+                api.client.do_test(arg1='this', arg2='that')
+
+        # Only the first attempt of the first call was retried
+        self.assertEqual(len(utils.ScriptedHandler.requests), 3)
+        stats = api.get_retry_stats()
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['retries_denied'], 2)
+
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+        breaker.record(False)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        api = self.new_api(retry_policy={'max_attempts': 1, 'failure_threshold': 2, 'reset_timeout': 0.1})
+        utils.ScriptedHandler.scripted = [(0, 500, {'error': 'boom'})] * 2
+        for i in range(2):
+            with self.assertRaises(PyMacaronCoreException):
+                api.client.do_test(arg1='this', arg2='that')
+
+        # The host is not called while the circuit is open
+        with self.assertRaises(CircuitOpenError) as e:
+            api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(e.exception.status_code, 503)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+        self.assertEqual(api.get_retry_stats()['circuit_open'], 1)
+
+        # Until a trial call succeeds
+        time.sleep(0.1)
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+
+
+    def test_circuit_breaker_cancelled_trial(self):
+        # A half-open breaker whose trial call never ends lets another one
+        # through after reset_timeout
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        breaker.record(False)
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+        if not asyncclient.aiohttp:
+            self.skipTest("aiohttp is not installed")
+
+        # A cancelled trial call is a failed one
+        api = self.new_api(retry_policy={'max_attempts': 1, 'failure_threshold': 1, 'reset_timeout': 0.2})
+        breaker = api.api_spec.retry_policy.get_circuit_breaker("%s:%s" % (api.api_spec.host, api.api_spec.port))
+        utils.ScriptedHandler.scripted = [(0, 500, {'error': 'boom'}), (0.5, 200, {'foo': 'slow'})]
+
+        async def call(timeout=None):
+            return await asyncio.wait_for(api.async_client.do_test(arg1='this', arg2='that'), timeout)
+
+        async def run():
+            try:
+                with self.assertRaises(PyMacaronCoreException):
+                    await call()
+                self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+                await asyncio.sleep(0.2)
+                with self.assertRaises(asyncio.TimeoutError):
+                    await call(0.1)
+                self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+                with self.assertRaises(CircuitOpenError):
+                    await call()
+
+                # And the breaker recovers with the next trial call
+                await asyncio.sleep(0.2)
+                return await call()
+            finally:
+                await api.close_async_client()
+
+        self.assertEqual(asyncio.run(run()).foo, 'a')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+    def test_endpoint_retry_policy(self):
+        yaml_str = self.yaml_query_param.replace(
+            'x-bind-client: do_test',
+            'x-bind-client: do_test\n      x-retry:\n        max_attempts: 2\n        backoff_base: 0',
+        )
+
+        # Overrides the api's policy, sharing its budget and counters
+        policy = RetryPolicy(max_attempts=5, backoff_base=0)
+        api = self.new_api(yaml_str=yaml_str, retry_policy=policy)
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'})] * 3
+        with self.assertRaises(PyMacaronCoreException):
+            api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+        self.assertEqual(policy.stats()['retries'], 1)
+
+        # Policies sharing counters update them under the same lock
+        derived = policy.derive(max_attempts=2)
+        calls = policy.stats()['calls']
+        t = threading.Thread(target=derived.start_call)
+        with policy._lock:
+            t.start()
+            t.join(0.1)
+            self.assertTrue(t.is_alive())
+        t.join()
+        self.assertEqual(policy.stats()['calls'], calls + 1)
+
+        # Or applies to that endpoint only
+        api = self.new_api(yaml_str=yaml_str)
+        utils.ScriptedHandler.reset()
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'})]
+        self.assertEqual(api.client.do_test(arg1='this', arg2='that').foo, 'a')
+        self.assertEqual(api.get_retry_stats()['retries'], 1)
+
+        # Callers generated by several threads at once share one policy
+        endpoints = []
+        api.api_spec.call_on_each_endpoint(endpoints.append)
+        api.api_spec._endpoint_retry_policies.clear()
+        slow_derive = utils.slowed(RetryPolicy.derive)
+        with patch.object(RetryPolicy, 'derive', autospec=True, side_effect=slow_derive) as patched:
+            results, errors = utils.run_threads(lambda: api.api_spec.get_retry_policy(endpoints[0]))
+        self.assertEqual(errors, [])
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+
+
+    def test_no_retry_policy(self):
+        api = self.new_api()
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'})]
+        with self.assertRaises(PyMacaronCoreException):
+            api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+        self.assertEqual(api.get_retry_stats(), None)
+
+
+    def test_async_client_retries(self):
+        if not asyncclient.aiohttp:
+            self.skipTest("aiohttp is not installed")
+
+        api = self.new_api(retry_policy={'backoff_base': 0})
+        utils.ScriptedHandler.scripted = [(0, 503, {'error': 'busy'}), (0.5, 200, {'foo': 'slow'})]
+
+        async def call():
+            try:
+                return await api.async_client.do_test(arg1='this', arg2='that', read_timeout=0.2)
+            finally:
+                await api.close_async_client()
+
+        res = asyncio.run(call())
+        self.assertEqual(res.foo, 'a')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 3)
+        self.assertEqual(api.get_retry_stats()['retries'], 2)
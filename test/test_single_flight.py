@@ -0,0 +1,141 @@
+import os
+import imp
+import asyncio
+from mock import patch
+from pymacaron_core.exceptions import PyMacaronCoreException
+from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger import asyncclient
+from pymacaron_core.swagger.fanout import gather
+from pymacaron_core.swagger.singleflight import SingleFlight
+
+
+utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
+
+
+class Test(utils.PymTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = utils.start_scripted_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.stop_scripted_server(cls.server)
+
+    def setUp(self):
+        super(Test, self).setUp()
+        utils.ScriptedHandler.reset()
+
+    def new_api(self, yaml_str=None, **kwargs):
+        return API('somename', yaml_str=yaml_str or self.yaml_query_param, host='127.0.0.1', port=self.server.server_address[1], **kwargs)
+
+
+    def test_coalesce_identical_calls(self):
+        api = self.new_api(coalesce=True)
+        utils.ScriptedHandler.delay = 0.2
+
+        results = gather(*[lambda: api.client.do_test(arg1='this', arg2='that') for _ in range(5)])
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+        self.assertEqual([r.foo for r in results], ['a'] * 5)
+
+        # Each caller gets its own copy
+        self.assertEqual(len(set(id(r) for r in results)), 5)
+        results[0].foo = 'modified'
+        self.assertEqual(results[1].foo, 'a')
+
+        stats = api.get_coalesce_stats()
+        self.assertEqual(stats['calls'], 5)
+        self.assertEqual(stats['coalesced'], 4)
+        self.assertEqual(stats['in_flight'], 0)
+
+        # Calls with other parameters or headers are not coalesced
+        utils.ScriptedHandler.requests = []
+        gather(
+            lambda: api.client.do_test(arg1='this', arg2='that'),
+            lambda: api.client.do_test(arg1='this', arg2='other'),
+            lambda: api.client.do_test(arg1='this', arg2='that', request_headers={'Authorization': 'Bearer 123'}),
+        )
+        self.assertEqual(len(utils.ScriptedHandler.requests), 3)
+
+        # Nor are calls made one after the other
+        utils.ScriptedHandler.requests = []
+        utils.ScriptedHandler.delay = 0
+        api.client.do_test(arg1='this', arg2='that')
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 2)
+
+
+    def test_coalesced_errors(self):
+        api = self.new_api(coalesce=True)
+        utils.ScriptedHandler.scripted = [(0.2, 500, {'error': 'boom'})]
+
+        results = gather(*[lambda: api.client.do_test(arg1='this', arg2='that') for _ in range(3)], return_exceptions=True)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+        for r in results:
+            self.assertTrue(isinstance(r, PyMacaronCoreException))
+            self.assertEqual(r.status_code, 500)
+
+
+    def test_coalesce_options(self):
+        # Endpoints may opt in or out
+        yaml_str = self.yaml_query_param.replace('x-bind-client: do_test', 'x-bind-client: do_test\n      x-coalesce: %s')
+        utils.ScriptedHandler.delay = 0.2
+
+        api = self.new_api(yaml_str=yaml_str % 'true')
+        gather(*[lambda: api.client.do_test(arg1='this', arg2='that') for _ in range(3)])
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+        api = self.new_api(yaml_str=yaml_str % 'false', coalesce=True)
+        gather(*[lambda: api.client.do_test(arg1='this', arg2='that') for _ in range(3)])
+        self.assertEqual(len(utils.ScriptedHandler.requests), 4)
+        self.assertEqual(api.get_coalesce_stats(), None)
+
+        # POSTs are never coalesced
+        api = self.new_api(yaml_str=self.yaml_body_param, coalesce=True)
+        gather(*[lambda: api.client.do_test(api.model.Param(arg1='a')) for _ in range(3)])
+        self.assertEqual(len(utils.ScriptedHandler.requests), 7)
+
+
+    def test_coalesce_with_client_cache(self):
+        api = self.new_api(coalesce=True, client_cache={'ttl': 60})
+        utils.ScriptedHandler.delay = 0.2
+        results = gather(*[lambda: api.client.do_test(arg1='this', arg2='that') for _ in range(3)])
+        self.assertEqual([r.foo for r in results], ['a'] * 3)
+        api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+
+
+    def test_one_single_flight_per_api(self):
+        # Callers generated by several threads at once share the api's
+        # SingleFlight, or identical calls would not be coalesced
+        api = self.new_api(coalesce=True)
+        endpoints = []
+        api.api_spec.call_on_each_endpoint(endpoints.append)
+        api.api_spec.single_flight = None
+        slow_single_flight = utils.slowed(SingleFlight)
+        with patch('pymacaron_core.swagger.spec.SingleFlight', side_effect=slow_single_flight) as patched:
+            results, errors = utils.run_threads(lambda: api.api_spec.get_single_flight(endpoints[0]))
+        self.assertEqual(errors, [])
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertIs(results[0], api.api_spec.single_flight)
+
+
+    def test_async_coalesce(self):
+        if not asyncclient.aiohttp:
+            self.skipTest("aiohttp is not installed")
+
+        api = self.new_api(coalesce=True)
+        utils.ScriptedHandler.delay = 0.2
+
+        async def calls():
+            try:
+                return await asyncio.gather(*[api.async_client.do_test(arg1='this', arg2='that') for _ in range(4)])
+            finally:
+                await api.close_async_client()
+
+        results = asyncio.run(calls())
+        self.assertEqual([r.foo for r in results], ['a'] * 4)
+        self.assertEqual(len(set(id(r) for r in results)), 4)
+        self.assertEqual(len(utils.ScriptedHandler.requests), 1)
+        self.assertEqual(api.get_coalesce_stats()['coalesced'], 3)
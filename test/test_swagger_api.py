@@ -1,5 +1,14 @@
+import os
+import sys
 import pprint
+import subprocess
+import tempfile
+import threading
+import time
+from mock import patch
 from pymacaron_core.swagger.api import API
+from pymacaron_core.swagger import speccache
+from pymacaron_core.models import get_model
 
 
 class Handlers():
@@ -137,3 +146,121 @@ def test_api_clients():
     assert hasattr(api.client, 'do_test')
     assert hasattr(api.client, 'do_more_test')
     assert api.client.do_test != api.client.do_more_test
+
+
+def test_api_spec_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold = API('somename', yaml_str=yaml_str, spec_cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 1
+
+        # A warm start neither parses yaml nor resolves refs
+        with patch('pymacaron_core.swagger.speccache.load_yaml') as load_yaml, patch('pymacaron_core.swagger.spec.Spec.from_dict') as from_dict:
+            warm = API('somename', yaml_str=yaml_str, spec_cache_dir=cache_dir)
+            assert not load_yaml.called
+            assert not from_dict.called
+
+        assert warm.api_spec.swagger_dict == cold.api_spec.swagger_dict
+        assert sorted(warm.api_spec.definitions.keys()) == sorted(cold.api_spec.definitions.keys())
+        assert warm.api_spec.spec.api_url == cold.api_spec.spec.api_url
+        assert sorted(warm.api_spec.spec.resources.keys()) == sorted(cold.api_spec.spec.resources.keys())
+        assert hasattr(warm.client, 'do_test')
+
+        r = warm.model.Result.from_json({'foo': 'a'})
+        assert r.foo == 'a'
+        assert r.to_json() == {'foo': 'a'}
+        warm.api_spec.validate('Result', {'foo': 'a'})
+
+        # Changing the spec changes the cache key
+        API('somename', yaml_str=yaml_str.replace("'0.0.1'", "'0.0.2'"), spec_cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 2
+
+        # Unreadable cache files are ignored
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), 'wb') as f:
+                f.write(b'garbage')
+        api = API('somename', yaml_str=yaml_str, spec_cache_dir=cache_dir)
+        assert api.get_version() == '0.0.1'
+
+
+def test_api_lazy_load():
+    with patch('pymacaron_core.swagger.speccache.load_yaml', wraps=speccache.load_yaml) as load_yaml:
+        api = API('somename', yaml_str=yaml_str.replace('  Error:', '  LazyError:'), lazy_load=True)
+        assert not load_yaml.called
+        assert not api.client.__dict__.get('do_test')
+
+        # Loading the spec generates no model class and no client caller
+        assert api.get_version() == '0.0.1'
+        assert load_yaml.call_count == 1
+        assert sorted(api.api_spec.model_classes.keys()) == []
+
+    r = api.model.Result(foo='a')
+    assert r.to_json() == {'foo': 'a'}
+    assert sorted(api.api_spec.model_classes.keys()) == ['Result']
+    assert get_model('Result') is api.model.Result
+    assert not hasattr(api.model, 'Foo')
+
+    assert api.client.do_test
+    assert 'do_test' in api.client.__dict__
+    assert 'do_more_test' not in api.client.__dict__
+    assert not hasattr(api.client, 'do_foo')
+
+    api.preload()
+    assert sorted(api.api_spec.model_classes.keys()) == ['LazyError', 'Param', 'Result']
+    assert 'do_more_test' in api.client.__dict__
+
+
+def test_api_lazy_load_get_model():
+    # Looking up a model of an api not loaded yet loads it
+    api = API('somename', yaml_str=yaml_str.replace('  Error:', '  OtherLazyError:'), lazy_load=True)
+    assert not api._api_spec
+    cls = get_model('OtherLazyError')
+    assert api.model.OtherLazyError is cls
+    assert sorted(api.api_spec.model_classes.keys()) == ['OtherLazyError']
+
+
+def test_api_lazy_load_threads():
+    # Threads accessing models of an api not loaded yet at once load its spec
+    # once and all get the same classes
+    def slow_load_yaml(s):
+        time.sleep(0.05)
+        return load_yaml(s)
+
+    def run_threads(f, n=8):
+        barrier = threading.Barrier(n)
+        results, errors = [], []
+
+        def run():
+            barrier.wait()
+            try:
+                results.append(f())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    load_yaml = speccache.load_yaml
+    with patch('pymacaron_core.swagger.speccache.load_yaml', side_effect=slow_load_yaml) as patched:
+        API('somename', yaml_str=yaml_str.replace('  Error:', '  ThreadedError:'), lazy_load=True)
+        results, errors = run_threads(lambda: get_model('ThreadedError'))
+        assert errors == []
+        assert len(set(results)) == 1
+        assert patched.call_count == 1
+
+        api = API('somename', yaml_str=yaml_str.replace('  Error:', '  OtherThreadedError:'), lazy_load=True)
+        results, errors = run_threads(lambda: api.model.OtherThreadedError)
+        assert errors == []
+        assert len(set(results)) == 1
+        assert results[0] is get_model('OtherThreadedError')
+        assert patched.call_count == 2
+
+
+def test_import_without_flask():
+    # Client-only processes do not import flask, nor aiohttp unless they use
+    # async clients
+    code = "import sys; import pymacaron_core.swagger.apipool; assert 'flask' not in sys.modules; assert 'aiohttp' not in sys.modules"
+    subprocess.check_call([sys.executable, '-c', code])
@@ -4,9 +4,11 @@ import pprint
 import json
 import responses
 from mock import patch, MagicMock
-from pymacaron_core.swagger.client import _format_flask_url
+from pymacaron_core.swagger.urltemplate import UrlTemplate
 from pymacaron_core.exceptions import PyMacaronCoreException, ValidationError
 from pymacaron_core.models import get_model
+from pymacaron_core.models import PyMacaronModel
+from pymacaron_core.swagger.api import API
 
 
 utils = imp.load_source('common', os.path.join(os.path.dirname(__file__), 'utils.py'))
@@ -34,10 +36,54 @@ class Test(utils.PymTest):
 
         print("response: " + pprint.pformat(res))
         self.assertEqual(type(res).__name__, 'Result')
+        self.assertTrue(isinstance(res, PyMacaronModel))
         self.assertEqual(res.foo, 'a')
         self.assertEqual(res.bar, 'b')
 
 
+    @responses.activate
+    def test_client_lazy(self):
+        handler, spec = self.generate_client_and_spec(self.yaml_query_param)
+
+        responses.add(
+            responses.GET, "http://some.server.com:80/v1/some/path",
+            body=json.dumps({"foo": "a", "bar": "b"}),
+            status=200,
+            content_type="application/json"
+        )
+        responses.add(
+            responses.GET, "http://some.server.com:80/v1/some/path",
+            body=json.dumps({"foo": 1}),
+            status=200,
+            content_type="application/json"
+        )
+
+        res = handler(arg1='this', arg2='that', lazy=True)
+        self.assertEqual(type(res).__name__, 'Result')
+        self.assertEqual(res.to_json(), {"foo": "a", "bar": "b"})
+
+        # The top level of the response is still validated
+        with self.assertRaises(ValidationError):
+            handler(arg1='this', arg2='that', lazy=True)
+
+
+    @responses.activate
+    def test_client_lazy_load(self):
+        api = API('somename', yaml_str=self.yaml_query_param, lazy_load=True)
+
+        responses.add(
+            responses.GET, "http://some.server.com:80/v1/some/path",
+            body=json.dumps({"foo": "a", "bar": "b"}),
+            status=200,
+            content_type="application/json"
+        )
+
+        res = api.client.do_test(arg1='this', arg2='that')
+        self.assertEqual(type(res).__name__, 'Result')
+        self.assertEqual(res.to_json(), {"foo": "a", "bar": "b"})
+        self.assertEqual(sorted(api.api_spec.model_classes.keys()), ['Result'])
+
+
     @patch('pymacaron_core.swagger.client.requests')
     def test_requests_parameters_with_query_param(self, requests):
         requests.get = MagicMock()
@@ -48,10 +94,10 @@ class Test(utils.PymTest):
         # self.assertEqual("Expected 1 caller, got 0", str(e.exception))
 
         requests.get.assert_called_once_with(
-            'http://some.server.com:80/v1/some/path',
+            'http://some.server.com:80/v1/some/path?arg1=this&arg2=that',
             data=None,
             headers={'Content-Type': 'application/json'},
-            params={'arg1': 'this', 'arg2': 'that'},
+            params=None,
             timeout=(10, 10),
             verify=True
         )
@@ -104,41 +150,97 @@ class Test(utils.PymTest):
         )
 
 
+    @patch('pymacaron_core.swagger.client.requests')
+    def test_requests_parameters_with_body_param__json_codec(self, requests):
+        handler, spec = self.generate_client_and_spec(self.yaml_body_param, json_codec='json')
+        model_class = get_model('Param')
+        param = model_class(arg1='a', arg2='é')
+
+        with self.assertRaises(PyMacaronCoreException):
+            handler(param)
+
+        # The body is sent as utf-8 encoded bytes
+        requests.post.assert_called_once_with(
+            'http://some.server.com:80/v1/some/path',
+            data='{"arg1":"a","arg2":"é"}'.encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            params=None,
+            timeout=(10, 10),
+            verify=True
+        )
+
+
+    @responses.activate
+    def test_client_with_body_param__json_codec(self):
+        handler, spec = self.generate_client_and_spec(self.yaml_body_param, json_codec='auto')
+
+        responses.add(
+            responses.POST,
+            "http://some.server.com:80/v1/some/path",
+            body=json.dumps({"foo": "a", "bar": "é"}),
+            status=200,
+            content_type="application/json"
+        )
+
+        res = handler(get_model('Param')(arg1='a', arg2='b'))
+        self.assertEqual(type(res).__name__, 'Result')
+        self.assertEqual(res.bar, 'é')
+        self.assertEqual(json.loads(responses.calls[0].request.body), {"arg1": "a", "arg2": "b"})
+
+
 # def test_client_with_auth_required():
 #     pass
 
 
-    def test__format_flask_url(self):
+    def test_url_template(self):
         ref = {
             'item_id': '1234',
             'path': 'abcd',
         }
 
-        data = ref.copy()
-        u = _format_flask_url(
-            "/v1/seller/<item_id>/<path>/foo",
-            data
-        )
-        self.assertEqual(u, "/v1/seller/1234/abcd/foo", u)
-        self.assertEqual(len(list(data.keys())), 0)
+        t = UrlTemplate("/v1/seller/<item_id>/<path>/foo")
+        self.assertEqual(t.format(ref), "/v1/seller/1234/abcd/foo")
 
-        data = ref.copy()
-        u = _format_flask_url(
-            "/v1/seller/<item_id>/<path>/foo/<item_id>",
-            data,
-        )
-        self.assertEqual(u, "/v1/seller/1234/abcd/foo/1234", u)
-        self.assertEqual(len(list(data.keys())), 0)
+        t = UrlTemplate("/v1/seller/<item_id>/<path>/foo/<item_id>")
+        self.assertEqual(t.format(ref), "/v1/seller/1234/abcd/foo/1234")
+
+        # Path parameters are percent-encoded
+        self.assertEqual(t.format({'item_id': 'a/b c', 'path': 'é'}), "/v1/seller/a%2Fb%20c/%C3%A9/foo/a%2Fb%20c")
+
+        # Missing and unknown parameters are rejected
+        t = UrlTemplate("/v1/seller/<item_id>/foo")
+        with self.assertRaises(ValidationError) as e:
+            t.format(ref)
+        self.assertTrue("Unknown parameter(s) path" in str(e.exception))
+        with self.assertRaises(ValidationError) as e:
+            t.format({})
+        self.assertEqual("Missing some arguments to format url: /v1/seller/<item_id>/foo", str(e.exception))
+        with self.assertRaises(ValidationError):
+            t.format({'item_id': None})
 
-        data = ref.copy()
-        u = _format_flask_url(
-            "/v1/seller/<item_id>/foo",
-            data,
-        )
-        self.assertEqual(u, "/v1/seller/1234/foo", u)
-        self.assertEqual(len(list(data.keys())), 1)
-        self.assertEqual(data['path'], 'abcd')
 
+    def test_url_template_query(self):
+        _, spec = self.generate_client_and_spec(self.yaml_path_query_param)
+        params = []
+        spec.call_on_each_endpoint(lambda e: params.extend(e.operation.params.values()))
+
+        t = UrlTemplate("http://some.server.com:80/v1/some/<foo>/path", params)
+        self.assertEqual(t.format({'foo': 1, 'bar': 2}), "http://some.server.com:80/v1/some/1/path?bar=2")
+
+        # Query parameters are encoded as requests does
+        self.assertEqual(t.format({'bar': 'a b&c=é', 'foo': 1}), "http://some.server.com:80/v1/some/1/path?bar=a+b%26c%3D%C3%A9")
+        self.assertEqual(t.format({'foo': 1, 'bar': [1, True]}), "http://some.server.com:80/v1/some/1/path?bar=1&bar=True")
+
+        # Or returned apart from the url, to be encoded by requests
+        self.assertEqual(t.format_with_params({'foo': 1, 'bar': [1, True]}), ("http://some.server.com:80/v1/some/1/path", {'bar': [1, True]}))
+
+        # Required query parameters may not be missing
+        with self.assertRaises(ValidationError):
+            t.format({'foo': 1})
+        with self.assertRaises(ValidationError):
+            t.format_with_params({'foo': 1})
+        with self.assertRaises(ValidationError):
+            t.format({'foo': 1, 'bar': None})
 
 
     @responses.activate
@@ -160,6 +262,21 @@ class Test(utils.PymTest):
         self.assertEqual(res.bar, 'b')
 
 
+    @patch('pymacaron_core.swagger.client.requests')
+    def test_requests_parameters_unknown_or_missing(self, requests):
+        handler, _ = self.generate_client_and_spec(self.yaml_query_param)
+
+        with self.assertRaises(ValidationError) as e:
+            handler(arg1='this', arg2='that', arg3='other')
+        self.assertTrue('Unknown parameter(s) arg3' in str(e.exception))
+
+        with self.assertRaises(ValidationError) as e:
+            handler(arg1='this')
+        self.assertTrue("Missing required query parameter 'arg2'" in str(e.exception))
+
+        requests.get.assert_not_called()
+
+
     @patch('pymacaron_core.swagger.client.requests')
     def test_requests_parameters_with_path_params(self, requests):
         handler, spec = self.generate_client_and_spec(self.yaml_path_param)
@@ -226,10 +343,10 @@ class Test(utils.PymTest):
             handler(foo=123, bar=456)
 
         requests.get.assert_called_once_with(
-            'http://some.server.com:80/v1/some/123/path',
+            'http://some.server.com:80/v1/some/123/path?bar=456',
             data=None,
             headers={'Content-Type': 'application/json'},
-            params={'bar': 456},
+            params=None,
             timeout=(10, 10),
             verify=True)
 
@@ -308,10 +425,10 @@ class Test(utils.PymTest):
             handler(read_timeout=50, foo='123', bar='456')
 
         requests.get.assert_called_once_with(
-            'http://some.server.com:80/v1/some/123/path',
+            'http://some.server.com:80/v1/some/123/path?bar=456',
             data=None,
             headers={'Content-Type': 'application/json'},
-            params={'bar': '456'},
+            params=None,
             timeout=(10, 50),
             verify=True)
 
@@ -324,10 +441,10 @@ class Test(utils.PymTest):
             handler(connect_timeout=50, foo='123', bar='456')
 
         requests.get.assert_called_once_with(
-            'http://some.server.com:80/v1/some/123/path',
+            'http://some.server.com:80/v1/some/123/path?bar=456',
             data=None,
             headers={'Content-Type': 'application/json'},
-            params={'bar': '456'},
+            params=None,
             timeout=(50, 10),
             verify=True)
 
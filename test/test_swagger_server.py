@@ -113,6 +113,70 @@ class Test(utils.PymTest):
                 {'token': "Method pymacaron_core.test.return_token did not return a class instance but a <class 'dict'>"}
             )
 
+    @patch('pymacaron_core.test.return_token')
+    def test_swagger_server_array_response(self, func):
+        func.__name__ = 'return_token'
+
+        app, spec = self.generate_server_app(self.yaml_array)
+
+        SessionToken = get_model('SessionToken')
+
+        # Arrays streamed in one or several batches, the last one full or not
+        for count, debug in ((5000, False), (1234, False), (5000, True), (1234, True)):
+            app.debug = debug
+            tokens = [SessionToken(token=str(i)) for i in range(count)]
+
+            # A list is returned in a buffered response
+            func.return_value = tokens
+            with app.test_client() as c:
+                r = c.get('/v1/array')
+                self.assertEqual(r.status_code, 200)
+                self.assertTrue('Content-Length' in r.headers)
+                buffered = r.data
+                j = json.loads(buffered.decode('utf-8'))
+                self.assertEqual(len(j), count)
+                self.assertEqual(j[12], {'token': '12'})
+
+            # A generator is streamed, with the same content
+            func.return_value = (t for t in tokens)
+            with app.test_client() as c:
+                r = c.get('/v1/array')
+                self.assertEqual(r.status_code, 200)
+                self.assertFalse('Content-Length' in r.headers)
+                self.assertEqual(r.mimetype, 'application/json')
+                self.assertEqual(r.data, buffered)
+
+            # Including when empty
+            for result in ([], iter([])):
+                func.return_value = result
+                with app.test_client() as c:
+                    r = c.get('/v1/array')
+                    self.assertEqual(r.status_code, 200)
+                    self.assertEqual(r.data, b'[]\n')
+
+
+    @patch('pymacaron_core.test.return_token')
+    def test_swagger_server_array_response__json_codec(self, func):
+        func.__name__ = 'return_token'
+
+        app, spec = self.generate_server_app(self.yaml_array, json_codec='auto')
+
+        SessionToken = get_model('SessionToken')
+
+        for count in (5000, 1234, 1, 0):
+            tokens = [SessionToken(token=str(i)) for i in range(count)]
+            expected = [{'token': str(i)} for i in range(count)]
+
+            # Lists and generators are encoded by the codec, with the same content
+            for result in (tokens, (t for t in tokens)):
+                func.return_value = result
+                with app.test_client() as c:
+                    r = c.get('/v1/array')
+                    self.assertEqual(r.status_code, 200)
+                    self.assertEqual(r.mimetype, 'application/json')
+                    self.assertEqual(r.data, spec.codec.dumps(expected))
+
+
 # TODO: enable this test when server-side validation is enabled
 #
 #    c = get_model('Credentials')
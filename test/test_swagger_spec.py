@@ -526,3 +526,32 @@ definitions:
             self.assertTrue("'123' is not of type 'object'" in str(e))
         else:
             assert 0
+
+
+    def test_models_to_json__json_to_models(self):
+        swagger_dict = yaml.load(Tests.yaml_complex_model, Loader=yaml.FullLoader)
+        spec = ApiSpec(swagger_dict)
+        spec.load_models()
+
+        js = [
+            {'token': 'abcd', 'bar': {'a': 1, 'b': '2016-08-26'}},
+            {'token': 'efgh'},
+        ]
+
+        spec.validate_many('Foo', js)
+        ms = spec.json_to_models('Foo', js)
+        self.assertEqual([m.token for m in ms], ['abcd', 'efgh'])
+        self.assertEqual(ms[0].bar.__class__.__name__, 'Bar')
+        self.assertEqual(ms[0].bar.b, date(2016, 8, 26))
+
+        self.assertEqual(spec.models_to_json(ms), js)
+        self.assertEqual(spec.models_to_json(iter(ms)), js)
+        self.assertEqual(spec.models_to_json([]), [])
+
+        # Any invalid item fails validation
+        try:
+            spec.validate_many('Foo', js + [{'bar': {}}])
+        except Exception as e:
+            self.assertTrue("'a' is a required property" in str(e))
+        else:
+            assert 0
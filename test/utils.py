@@ -1,5 +1,10 @@
+import json
+import time
+import threading
 import unittest
 import yaml
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from flask import Flask
 from pymacaron_core.swagger.spec import ApiSpec
 from pymacaron_core.swagger.api import default_error_callback
@@ -7,12 +12,118 @@ from pymacaron_core.swagger.client import generate_client_callers
 from pymacaron_core.swagger.server import spawn_server_api
 
 
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Return the scripted (delay, status, body[, headers]) responses in order, then
+    {"foo": "a", "bar": "b"}, and record all requests and the highest number
+    of requests handled at once"""
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    scripted = []
+    requests = []
+    delay = 0
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls):
+        cls.scripted = []
+        cls.requests = []
+        cls.delay = 0
+        cls.in_flight = 0
+        cls.max_in_flight = 0
+
+    def respond(self):
+        cls = ScriptedHandler
+        length = int(self.headers.get('Content-Length', 0))
+        with cls.lock:
+            cls.requests.append((self.command, self.path, dict(self.headers), self.rfile.read(length)))
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            delay, status, body, headers = cls.delay, 200, {'foo': 'a', 'bar': 'b'}, {}
+            if cls.scripted:
+                scripted = cls.scripted.pop(0)
+                delay, status, body = scripted[:3]
+                if len(scripted) > 3:
+                    headers = scripted[3]
+
+        time.sleep(delay)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        # Bodies of None, as for 304 responses, are not sent
+        body = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = respond
+    do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_scripted_server():
+    """Serve ScriptedHandler on a random port of localhost, in a thread"""
+    server = ThreadingServer(('127.0.0.1', 0), ScriptedHandler)
+    t = threading.Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    return server
+
+
+def stop_scripted_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+def run_threads(f, n=8):
+    """Call f from n threads at once, and return the list of their results and
+    the list of the exceptions they raised"""
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def run():
+        barrier.wait()
+        try:
+            results.append(f())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def slowed(f, delay=0.05):
+    """Return f, taking delay seconds longer, so that threads calling it at once
+    overlap"""
+    def slow(*args, **kwargs):
+        time.sleep(delay)
+        return f(*args, **kwargs)
+    return slow
+
+
 class PymTest(unittest.TestCase):
 
-    def generate_client_and_spec(self, yaml_str, callback=default_error_callback, local=False):
+    def generate_client_and_spec(self, yaml_str, callback=default_error_callback, local=False, json_codec=None):
 
         swagger_dict = yaml.load(yaml_str, Loader=yaml.FullLoader)
-        spec = ApiSpec(swagger_dict)
+        spec = ApiSpec(swagger_dict, json_codec=json_codec)
         spec.load_models()
         callers_dict = generate_client_callers(
             spec,
@@ -31,9 +142,9 @@ class PymTest(unittest.TestCase):
         return handler, spec
 
 
-    def generate_server_app(self, yaml_str, callback=default_error_callback):
+    def generate_server_app(self, yaml_str, callback=default_error_callback, json_codec=None):
         swagger_dict = yaml.load(yaml_str, Loader=yaml.FullLoader)
-        spec = ApiSpec(swagger_dict)
+        spec = ApiSpec(swagger_dict, json_codec=json_codec)
         spec.load_models()
         app = Flask('test')
         spawn_server_api('somename', app, spec, callback, None)
@@ -378,6 +489,25 @@ paths:
             $ref: '#/definitions/SessionToken'
 """
 
+    yaml_array = yaml_base + """
+paths:
+  /v1/array:
+    get:
+      summary: blabla
+      description: blabla
+      produces:
+        - application/json
+      x-bind-server: pymacaron_core.test.return_token
+      x-auth-required: false
+      responses:
+        200:
+          description: A list of session tokens
+          schema:
+            type: array
+            items:
+              $ref: '#/definitions/SessionToken'
+"""
+
     yaml_in_body = yaml_base + """
 paths:
   /v1/in/body: